@@ -3,6 +3,9 @@ ASGI config for TestAppsDjango project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The server-sent events feed /api/reports/{id}/events/ requires an ASGI server,
+e.g. ``uvicorn TestAppsDjango.asgi:application``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -88,6 +88,32 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Используется для кэширования структуры шаблонов отчётов.
+# Локальная память подходит для одного процесса; при нескольких воркерах
+# нужен общий бэкенд (Redis/Memcached), иначе версии шаблонов разойдутся.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'testappsdjango',
+    }
+}
+
+# Брокер событий для SSE-ленты отчётов (/api/reports/{id}/events/).
+# InProcessBroker работает в пределах одного процесса; при нескольких
+# воркерах ASGI нужен бэкенд с тем же интерфейсом поверх общего брокера
+REPORT_EVENTS_BACKEND = 'report.events.InProcessBroker'
+
+# Добавление ячеек новых строк/столбцов шаблона в неутверждённые отчёты:
+# SyncBackend — сразу после фиксации транзакции, ThreadBackend — в фоновом потоке
+REPORT_PROPAGATION_BACKEND = 'report.propagation.SyncBackend'
+
+# Своды талонов (talon.rollup) обычно обновляются командой refresh_ticket_rollups
+# по расписанию; True — пересчитывать период сразу после сохранения талона
+TALON_ROLLUP_REFRESH_ON_SAVE = False
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -23,6 +23,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('report.api.urls')),
     path('api/', include('report_template.api.urls')),
+    path('api/', include('talon.api.urls')),
 ]
 
 if settings.DEBUG:
@@ -2,9 +2,30 @@ from django.contrib import admin
 from .models import Report, ReportData
 
 
+class SelectRelatedFieldListFilter(admin.RelatedFieldListFilter):
+    """
+    Фильтр по связанной модели, который загружает варианты одним запросом:
+    __str__ вариантов обращается к связанным объектам, поэтому они
+    подгружаются через select_related (см. label_related).
+    """
+    label_related = ()
+
+    def field_choices(self, field, request, model_admin):
+        queryset = field.related_model._default_manager.select_related(*self.label_related)
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return [(obj.pk, str(obj)) for obj in queryset]
+
+    @classmethod
+    def with_related(cls, *label_related):
+        return type(cls.__name__, (cls,), {'label_related': label_related})
+
+
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
     list_display = ("template", "user", "date", "status", "created_at", "updated_at")
+    list_select_related = ("template", "user")
     search_fields = ("template__title", "user__username")
     date_hierarchy = "date"
 
@@ -28,5 +49,24 @@ class ReportAdmin(admin.ModelAdmin):
 @admin.register(ReportData)
 class ReportDataAdmin(admin.ModelAdmin):
     list_display = ("report", "row", "column", "value")
-    list_filter = ("report", "row__table", "column__table")
+    # Названия отчёта, строки и столбца собираются из шаблона и групп
+    list_select_related = ("report__template", "row__group", "column__group")
+    list_filter = (
+        ("report", SelectRelatedFieldListFilter.with_related("template")),
+        ("row__table", SelectRelatedFieldListFilter.with_related("report")),
+        ("column__table", SelectRelatedFieldListFilter.with_related("report")),
+    )
     search_fields = ("report__template__title", "row__title", "column__title")
+
+    # Связанные объекты, нужные для подписей в выпадающих списках формы
+    form_label_related = {
+        "report": ("template",),
+        "row": ("group",),
+        "column": ("group",),
+    }
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        related = self.form_label_related.get(db_field.name)
+        if related:
+            kwargs["queryset"] = db_field.related_model._default_manager.select_related(*related)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
@@ -0,0 +1,56 @@
+from django.db.models import Avg, Count, Max, Min, Q, Sum
+
+from report.models import ReportData
+
+
+def aggregate_report_data(template_id, date_from=None, date_to=None, status=None):
+    """
+    Сводит значения ячеек по всем отчётам шаблона одним сгруппированным
+    запросом: SUM/AVG/MIN/MAX/COUNT по каждой паре (строка, столбец).
+    Агрегируется числовая колонка numeric_value; непустые значения,
+    которые не удалось привести к числу, считаются отдельно как нечисловые.
+    """
+    data = ReportData.objects.filter(report__template_id=template_id)
+    if date_from:
+        data = data.filter(report__date__gte=date_from)
+    if date_to:
+        data = data.filter(report__date__lte=date_to)
+    if status:
+        data = data.filter(report__status=status)
+
+    non_numeric = Q(numeric_value__isnull=True) & ~Q(value='') & Q(value__isnull=False)
+
+    groups = (
+        data.values('row_id', 'column_id')
+        .annotate(
+            sum=Sum('numeric_value'),
+            avg=Avg('numeric_value'),
+            min=Min('numeric_value'),
+            max=Max('numeric_value'),
+            count=Count('numeric_value'),
+            non_numeric=Count('id', filter=non_numeric),
+        )
+        .order_by('row_id', 'column_id')
+    )
+
+    cells = []
+    non_numeric_cells = []
+    for group in groups:
+        if group['count']:
+            cells.append({
+                'row': group['row_id'],
+                'column': group['column_id'],
+                'sum': group['sum'],
+                'avg': group['avg'],
+                'min': group['min'],
+                'max': group['max'],
+                'count': group['count'],
+            })
+        if group['non_numeric']:
+            non_numeric_cells.append({
+                'row': group['row_id'],
+                'column': group['column_id'],
+                'count': group['non_numeric'],
+            })
+
+    return {'cells': cells, 'non_numeric': non_numeric_cells}
@@ -0,0 +1,71 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+INVALID_CURSOR_ERROR = "Некорректный курсор."
+
+
+class ReportKeysetPagination(BasePagination):
+    """
+    Пагинация списка отчётов по ключу (date, id), новые отчёты первыми:
+    следующая страница начинается строго после последнего отчёта предыдущей,
+    поэтому много отчётов за одну дату не приводят к OFFSET, а добавление
+    отчётов между запросами не сдвигает страницы.
+    Ответ: {"next", "results"}; переход по ссылке next (?cursor=...).
+    """
+    ordering = ('-date', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+
+    def get_page_size(self, request):
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw and raw.isdigit() and int(raw) > 0:
+            return min(int(raw), self.max_page_size)
+        return self.page_size
+
+    def encode_cursor(self, report):
+        key = f"{report.date.isoformat()}.{report.pk}"
+        return base64.urlsafe_b64encode(key.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            key = base64.urlsafe_b64decode(cursor.encode()).decode()
+            raw_date, raw_pk = key.split('.')
+            date, pk = parse_date(raw_date), int(raw_pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(INVALID_CURSOR_ERROR)
+        if date is None:
+            raise NotFound(INVALID_CURSOR_ERROR)
+        return date, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            date, pk = self.decode_cursor(cursor)
+            # Ведущая граница date <= date даёт поиск по индексу (date, id)
+            # с позиции курсора; одного OR планировщику недостаточно
+            queryset = queryset.filter(date__lte=date).filter(Q(date__lt=date) | Q(date=date, id__lt=pk))
+
+        reports = list(queryset.order_by(*self.ordering)[:page_size + 1])
+        self.next_cursor = self.encode_cursor(reports[page_size - 1]) if len(reports) > page_size else None
+        return reports[:page_size]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
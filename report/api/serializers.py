@@ -3,14 +3,43 @@ from report.models import Report, ReportData
 
 
 class ReportSerializer(serializers.ModelSerializer):
+    """
+    Необязательный аргумент fields ограничивает набор полей в ответе
+    (используется для ?fields= в списке отчётов).
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Report
         fields = ['id', 'template', 'date', 'status', 'user', 'created_at', 'updated_at']
         read_only_fields = ['user', 'created_at', 'updated_at']
 
 
-
 class ReportDataSerializer(serializers.ModelSerializer):
     class Meta:
         model = ReportData
-        fields = ['id', 'report', 'row', 'column', 'value']
+        fields = ['id', 'report', 'row', 'column', 'value', 'numeric_value', 'version', 'updated_at']
+        read_only_fields = ['numeric_value', 'version', 'updated_at']
+
+
+class ReportDataBatchItemSerializer(serializers.Serializer):
+    """
+    Элемент пакетного обновления ячеек: {row, column, value[, version]}.
+    Если version передана, ячейка обновится только при совпадении версии.
+    """
+    row = serializers.IntegerField()
+    column = serializers.IntegerField()
+    value = serializers.CharField(max_length=255, allow_blank=True, allow_null=True)
+    version = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+
+
+class ReportCloneSerializer(serializers.Serializer):
+    """
+    Параметры копирования отчёта: дата нового отчёта.
+    """
+    date = serializers.DateField()
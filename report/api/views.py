@@ -1,10 +1,51 @@
+from django.db import transaction
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, AllowAny
 
-from report.models import Report, ReportData
-from report.api.serializers import ReportSerializer, ReportDataSerializer
+from report.events import publish_cells
+from report.export import iter_report_csv, write_report_xlsx
+from report.models import Report, ReportData, parse_numeric
+from report.utils import (
+    build_report_matrix,
+    update_cells,
+    CellVersionConflict,
+    decode_cursor,
+    safe_cursor
+)
+from report.api.pagination import ReportKeysetPagination
+from report.api.renderers import CSVRenderer, XLSXRenderer
+from report.api.serializers import (
+    ReportSerializer,
+    ReportDataSerializer,
+    ReportDataBatchItemSerializer,
+    ReportCloneSerializer
+)
+
+READ_ONLY_REPORT_ERROR = "Редактирование запрещено – отчёт уже отправлен на утверждение или утвержден."
+VERSION_CONFLICT_ERROR = "Данные изменены другим пользователем. Обновите отчёт и повторите сохранение."
+
+
+def version_conflict_response(cells, deleted=()):
+    """
+    Ответ 409 с актуальными значениями и версиями конфликтующих ячеек.
+    deleted — (row, column) ячеек, удалённых после чтения: для них
+    value и version равны None, а deleted — True.
+    """
+    return Response({
+        "error": VERSION_CONFLICT_ERROR,
+        "conflicts": [
+            {"row": cell.row_id, "column": cell.column_id, "value": cell.value, "version": cell.version}
+            for cell in cells
+        ] + [
+            {"row": row_id, "column": col_id, "value": None, "version": None, "deleted": True}
+            for row_id, col_id in deleted
+        ]
+    }, status=409)
 
 
 class ReportViewSet(viewsets.ModelViewSet):
@@ -15,6 +56,64 @@ class ReportViewSet(viewsets.ModelViewSet):
     queryset = Report.objects.all()
     serializer_class = ReportSerializer
     permission_classes = [AllowAny]  # Разрешаем доступ всем
+    pagination_class = ReportKeysetPagination
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Выгрузка отдаёт файл в обход рендерера; всё, что дошло до рендерера
+        # CSV/XLSX (ошибки 404, 403 и т.п.) или не прошло согласование
+        # формата, отдаётся JSON-ом
+        renderer = getattr(request, 'accepted_renderer', None)
+        file_renderers = (CSVRenderer, XLSXRenderer)
+        if isinstance(response, Response) and (renderer is None or isinstance(renderer, file_renderers)):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список отчётов с пагинацией по ключу (date, id): {"next", "results"}.
+        Следующая страница — по ссылке next (?cursor=...), размер — ?page_size=.
+        Фильтры: ?template=&status=&date_from=&date_to=.
+        ?fields=id,date,status — вернуть только перечисленные поля.
+        """
+        queryset = self.get_queryset()
+        params = request.query_params
+
+        template = params.get('template')
+        if template:
+            if not template.isdigit():
+                return Response({"error": "Некорректный идентификатор шаблона."}, status=400)
+            queryset = queryset.filter(template_id=template)
+
+        status = params.get('status')
+        if status:
+            if status not in dict(Report.STATUS_CHOICES):
+                return Response({"error": f"Неизвестный статус: {status}."}, status=400)
+            queryset = queryset.filter(status=status)
+
+        for param, lookup in (('date_from', 'date__gte'), ('date_to', 'date__lte')):
+            raw = params.get(param)
+            if raw:
+                try:
+                    date = parse_date(raw)
+                except ValueError:
+                    date = None
+                if date is None:
+                    return Response({"error": f"Некорректная дата в параметре {param}."}, status=400)
+                queryset = queryset.filter(**{lookup: date})
+
+        fields = None
+        if params.get('fields'):
+            fields = [name.strip() for name in params['fields'].split(',') if name.strip()]
+            unknown = set(fields) - set(ReportSerializer.Meta.fields)
+            if unknown:
+                return Response({"error": f"Неизвестные поля: {', '.join(sorted(unknown))}."}, status=400)
+            # id и date нужны для курсора пагинации
+            queryset = queryset.only('id', 'date', *fields)
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True, fields=fields)
+        return self.get_paginated_response(serializer.data)
 
     def perform_create(self, serializer):
         """
@@ -28,10 +127,190 @@ class ReportViewSet(viewsets.ModelViewSet):
         """
         Дополнительный эндпоинт для получения всех ячеек (ReportData)
         для конкретного отчета. URL: /api/reports/{id}/data/
+
+        С параметром ?since=<cursor> возвращаются только ячейки, изменённые
+        после курсора, и новый курсор: {"cells": [...], "cursor": "..."}.
+        Для первой загрузки передаётся ?since=0. Курсор отстаёт от текущего
+        момента на CURSOR_SAFETY_WINDOW, поэтому недавно изменённые ячейки
+        могут прийти повторно — клиент сверяет их по версии.
+
+        ?value_min=&value_max= — только ячейки с числовым значением
+        в диапазоне (включительно); отбор идёт по индексу (report, numeric_value).
+        """
+        report = self.get_object()
+        data = report.data.all()
+        for param, lookup in (('value_min', 'numeric_value__gte'), ('value_max', 'numeric_value__lte')):
+            raw = request.query_params.get(param)
+            if raw:
+                bound = parse_numeric(raw)
+                if bound is None:
+                    return Response({"error": f"Некорректное число в параметре {param}."}, status=400)
+                data = data.filter(**{lookup: bound})
+
+        since = request.query_params.get('since')
+        if since is None:
+            serializer = ReportDataSerializer(data, many=True)
+            return Response(serializer.data)
+
+        try:
+            since = decode_cursor(since)
+        except (ValueError, OverflowError):
+            return Response({"error": "Некорректный курсор."}, status=400)
+
+        cells = list(data.filter(updated_at__gt=since).order_by('updated_at', 'id'))
+        cursor = safe_cursor(cells[-1].updated_at if cells else since, since)
+        return Response({
+            "cells": ReportDataSerializer(cells, many=True).data,
+            "cursor": cursor,
+        })
+
+    @action(detail=True, methods=['post'], url_path='clone')
+    def clone(self, request, pk=None):
+        """
+        Создание нового отчёта на основе существующего. URL: /api/reports/{id}/clone/
+        Тело запроса: {"date": "YYYY-MM-DD"}.
+        Значения ячеек копируются из исходного отчёта одной операцией в базе.
+        """
+        source = self.get_object()
+        params = ReportCloneSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+
+        report, counts = source.clone(params.validated_data['date'])
+        return Response({**ReportSerializer(report).data, **counts}, status=201)
+
+    @action(detail=True, methods=['get'], url_path='matrix')
+    def matrix(self, request, pk=None):
+        """
+        Данные отчёта в виде матриц по таблицам шаблона. URL: /api/reports/{id}/matrix/
+        Для каждой таблицы возвращаются упорядоченные id строк и столбцов
+        и двумерный массив значений values[i][j].
+        Параметр ?table=<id> ограничивает ответ одной таблицей,
+        ?versions=true добавляет массив версий ячеек для оптимистичной блокировки.
+        """
+        report = self.get_object()
+        table_id = request.query_params.get('table')
+        if table_id is not None:
+            try:
+                table_id = int(table_id)
+            except ValueError:
+                return Response({"error": "Параметр table должен быть числом."}, status=400)
+        with_versions = request.query_params.get('versions', '').lower() in ['true', '1']
+        return Response({
+            "report": report.pk,
+            "tables": build_report_matrix(report, table_id=table_id, with_versions=with_versions),
+        })
+
+    @action(detail=True, methods=['get'], url_path='export',
+            renderer_classes=[CSVRenderer, XLSXRenderer])
+    def export(self, request, pk=None):
+        """
+        Выгрузка заполненного отчёта. URL: /api/reports/{id}/export/?format=csv|xlsx
+        CSV отдаётся потоково; XLSX собирается в write-only режиме во временный файл.
+        Данные читаются из базы порциями, поэтому память не зависит от размера отчёта.
+        """
+        report = self.get_object()
+        filename = f"report_{report.pk}_{report.date}"
+
+        if request.accepted_renderer.format == 'xlsx':
+            try:
+                output = write_report_xlsx(report)
+            except ImportError:
+                return JsonResponse(
+                    {"error": "Для выгрузки в XLSX требуется пакет openpyxl."},
+                    status=501
+                )
+            return FileResponse(
+                output,
+                as_attachment=True,
+                filename=f"{filename}.xlsx",
+                content_type=XLSXRenderer.media_type
+            )
+
+        response = StreamingHttpResponse(
+            iter_report_csv(report),
+            content_type='text/csv; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+        return response
+
+    @action(detail=True, methods=['post'], url_path='data/batch')
+    def data_batch(self, request, pk=None):
+        """
+        Пакетное обновление ячеек отчёта. URL: /api/reports/{id}/data/batch/
+        Тело запроса: список объектов {"row": ..., "column": ..., "value": ...}.
+        Все элементы проверяются заранее; если хотя бы один невалиден,
+        ничего не сохраняется и возвращается список ошибок по элементам.
         """
         report = self.get_object()
-        serializer = ReportDataSerializer(report.data.all(), many=True)
-        return Response(serializer.data)
+        if report.status != 'draft':
+            return Response({"error": READ_ONLY_REPORT_ERROR}, status=403)
+
+        if not isinstance(request.data, list):
+            return Response({"error": "Ожидается список ячеек."}, status=400)
+
+        items = ReportDataBatchItemSerializer(data=request.data, many=True)
+        items.is_valid()
+        errors = [
+            {"index": index, **item_errors}
+            for index, item_errors in enumerate(items.errors or [])
+            if item_errors
+        ]
+        if errors:
+            return Response({"errors": errors}, status=400)
+
+        # Последнее значение для одной и той же ячейки побеждает
+        values = {
+            (item['row'], item['column']): (item['value'], item.get('version'))
+            for item in items.validated_data
+        }
+        row_ids = {row_id for row_id, _ in values}
+        col_ids = {col_id for _, col_id in values}
+        cells = {
+            (cell.row_id, cell.column_id): cell
+            for cell in report.data.filter(row_id__in=row_ids, column_id__in=col_ids)
+        }
+
+        for index, item in enumerate(items.validated_data):
+            if (item['row'], item['column']) not in cells:
+                errors.append({
+                    "index": index,
+                    "error": f"Ячейка ({item['row']}, {item['column']}) не найдена в отчёте."
+                })
+        if errors:
+            return Response({"errors": errors}, status=400)
+
+        updates = [
+            (cells[key].pk, value, version)
+            for key, (value, version) in values.items()
+        ]
+        try:
+            with transaction.atomic():
+                update_cells(updates)
+        except CellVersionConflict:
+            # Конфликт — ячейка изменена (версия не совпала) или удалена
+            current = ReportData.objects.in_bulk([pk for pk, _, _ in updates])
+            return version_conflict_response(
+                [
+                    current[pk] for pk, _, version in updates
+                    if pk in current and version is not None and current[pk].version != version
+                ],
+                deleted=[key for key in values if cells[key].pk not in current]
+            )
+
+        saved = list(ReportData.objects.filter(
+            pk__in=[pk for pk, _, _ in updates]
+        ).values_list('row_id', 'column_id', 'value', 'version'))
+        # update_cells пишет в обход save(), поэтому публикуем изменения явно
+        publish_cells(report.pk, saved)
+
+        return Response({
+            "updated": len(updates),
+            "errors": [],
+            "cells": [
+                {"row": row_id, "column": col_id, "version": version}
+                for row_id, col_id, _, version in saved
+            ]
+        })
 
 
 class ReportDataViewSet(viewsets.ModelViewSet):
@@ -50,14 +329,31 @@ class ReportDataViewSet(viewsets.ModelViewSet):
             instance = self.get_object()
             # Если статус отчёта не "черновик", редактирование запрещено
             if instance.report.status != 'draft':
-                return Response(
-                    {"error": "Редактирование запрещено – отчёт уже отправлен на утверждение или утвержден."},
-                    status=403
-                )
+                return Response({"error": READ_ONLY_REPORT_ERROR}, status=403)
             serializer = self.get_serializer(instance, data=request.data, partial=True)
             serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data)
+
+            # Необязательная ожидаемая версия ячейки: запись выполнится,
+            # только если с момента чтения ячейку никто не изменил
+            expected = request.data.get('version')
+            if expected is not None:
+                expected = int(expected)
+            value = serializer.validated_data.get('value', instance.value)
+            try:
+                with transaction.atomic():
+                    update_cells([(instance.pk, value, expected)])
+            except CellVersionConflict:
+                try:
+                    instance.refresh_from_db()
+                except ReportData.DoesNotExist:
+                    return version_conflict_response([], deleted=[(instance.row_id, instance.column_id)])
+                return version_conflict_response([instance])
+
+            instance.refresh_from_db()
+            publish_cells(instance.report_id, [
+                (instance.row_id, instance.column_id, instance.value, instance.version)
+            ])
+            return Response(self.get_serializer(instance).data)
         except Exception as e:
             return Response({"error": str(e)}, status=400)
 
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'report.events.InProcessBroker'
+
+# Сколько событий может накопиться у одного подписчика; при переполнении
+# подписчик получает событие resync и должен перечитать отчёт целиком
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+RESYNC = {'event': 'resync', 'data': {}}
+
+
+def report_channel(report_id):
+    return f"report:{report_id}"
+
+
+class Subscription:
+    """
+    Подписка на канал: очередь событий, привязанная к циклу событий подписчика.
+    """
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, message):
+        # Вызывается в цикле событий подписчика
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self, timeout=None):
+        """
+        Следующее событие или None, если за timeout секунд событий не было.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Pub/sub в памяти процесса. Публиковать можно из любого потока
+    (синхронные view и сигналы), подписчики живут в цикле событий ASGI.
+    Подходит для одного процесса; для нескольких воркеров нужен бэкенд
+    поверх общего брокера (например, Redis pub/sub) с тем же интерфейсом.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # Цикл событий подписчика уже закрыт
+                self.unsubscribe(subscription)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    Брокер событий, заданный настройкой REPORT_EVENTS_BACKEND
+    (по умолчанию InProcessBroker).
+    """
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = getattr(settings, 'REPORT_EVENTS_BACKEND', DEFAULT_BACKEND)
+                _broker = import_string(backend)()
+    return _broker
+
+
+def publish_report_event(report_id, event, data):
+    """
+    Публикует событие отчёта после фиксации текущей транзакции,
+    чтобы подписчики не увидели изменений, которые затем откатятся.
+    """
+    message = {'event': event, 'data': data}
+    transaction.on_commit(lambda: get_broker().publish(report_channel(report_id), message))
+
+
+def publish_cells(report_id, cells):
+    """
+    Публикует изменения ячеек, записанных в обход save()
+    (update_cells, bulk-операции), для которых post_save не срабатывает.
+    cells: итерируемое (row_id, column_id, value, version).
+    """
+    for row_id, column_id, value, version in cells:
+        publish_report_event(report_id, 'cell', {
+            'row': row_id, 'column': column_id, 'value': value, 'version': version
+        })
@@ -0,0 +1,135 @@
+import csv
+import re
+import tempfile
+
+from report.models import ReportData
+from report_template.models import RowGroup, RowTemplate, ColumnGroup, ColumnTemplate
+from report_template.utils import group_tree, display_order
+
+# Сколько ячеек читать из базы за один раз при выгрузке
+EXPORT_CHUNK_SIZE = 5000
+
+# Недопустимые символы в названии листа Excel
+SHEET_TITLE_RE = re.compile(r'[\[\]:*?/\\]')
+
+
+class Echo:
+    """
+    Псевдо-буфер для csv.writer: write() просто возвращает строку,
+    чтобы её можно было отдать в StreamingHttpResponse.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _header_lines(stub_width, col_paths, col_titles):
+    """
+    Многоуровневая шапка: по строке на каждый уровень групп столбцов
+    (название группы ставится в первый столбец её диапазона), затем названия столбцов.
+    """
+    depth = max((len(p) for p in col_paths), default=0)
+    lines = []
+    for level in range(depth):
+        line = [''] * stub_width
+        previous = None
+        for p in col_paths:
+            current = tuple(p[:level + 1]) if len(p) > level else None
+            line.append(p[level] if current and current != previous else '')
+            previous = current
+        lines.append(line)
+    stub = [f"Группа {level + 1}" for level in range(stub_width - 1)] + ["Строка"]
+    lines.append(stub + col_titles)
+    return lines
+
+
+def iter_table_grids(report, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Для каждой таблицы шаблона отдаёт (table, lines), где lines — генератор
+    строк выгрузки: шапка из иерархии групп столбцов, затем строки отчёта
+    с путём групп строк и значениями ячеек.
+    Значения читаются потоково через iterator(), поэтому память не растёт
+    с размером отчёта.
+    """
+    for table in report.template.tables.all():
+        yield table, _iter_table_lines(report, table, chunk_size)
+
+
+def _iter_table_lines(report, table, chunk_size):
+    row_tree = group_tree(
+        RowGroup.objects.filter(table=table).values_list('id', 'parent_group_id', 'order', 'title')
+    )
+    col_tree = group_tree(
+        ColumnGroup.objects.filter(table=table).values_list('id', 'parent_group_id', 'order', 'title')
+    )
+    rows = display_order(
+        RowTemplate.objects.filter(table=table).values_list('id', 'group_id', 'order', 'title'),
+        row_tree
+    )
+    columns = display_order(
+        ColumnTemplate.objects.filter(table=table).values_list('id', 'group_id', 'order', 'title'),
+        col_tree
+    )
+
+    col_pos = {col_id: j for j, (col_id, _, _) in enumerate(columns)}
+    stub_width = max((len(path) for _, path, _ in rows), default=0) + 1
+
+    yield from _header_lines(
+        stub_width,
+        [path for _, path, _ in columns],
+        [title for _, _, title in columns]
+    )
+
+    # Ячейки читаются пачками строк так, чтобы в памяти было не больше
+    # chunk_size значений одновременно
+    rows_per_chunk = max(1, chunk_size // max(1, len(columns)))
+    for start in range(0, len(rows), rows_per_chunk):
+        chunk = rows[start:start + rows_per_chunk]
+        values = {row_id: [''] * len(columns) for row_id, _, _ in chunk}
+        cells = ReportData.objects.filter(
+            report=report, row_id__in=list(values)
+        ).values_list('row_id', 'column_id', 'value').iterator(chunk_size=chunk_size)
+        for row_id, col_id, value in cells:
+            j = col_pos.get(col_id)
+            if j is not None and value is not None:
+                values[row_id][j] = value
+
+        for row_id, path, title in chunk:
+            stub = path + [''] * (stub_width - 1 - len(path)) + [title]
+            yield stub + values[row_id]
+
+
+def iter_report_csv(report, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Потоковая выгрузка отчёта в CSV (разделитель «;», UTF-8 с BOM для Excel).
+    Таблицы идут одна за другой, каждая начинается со строки с названием.
+    """
+    writer = csv.writer(Echo(), delimiter=';')
+    yield '\ufeff'
+    for table, lines in iter_table_grids(report, chunk_size=chunk_size):
+        yield writer.writerow([table.title])
+        for line in lines:
+            yield writer.writerow(line)
+        yield writer.writerow([])
+
+
+def write_report_xlsx(report, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Выгрузка отчёта в XLSX: по листу на таблицу.
+    Используется write-only режим openpyxl, который сбрасывает строки
+    во временные файлы, поэтому память не зависит от размера отчёта.
+    Возвращает временный файл, установленный на начало.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for i, (table, lines) in enumerate(iter_table_grids(report, chunk_size=chunk_size), start=1):
+        sheet_title = SHEET_TITLE_RE.sub(' ', f"{i}. {table.title}")[:31]
+        sheet = workbook.create_sheet(title=sheet_title)
+        for line in lines:
+            sheet.append(line)
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
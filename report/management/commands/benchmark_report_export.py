@@ -0,0 +1,74 @@
+import datetime
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from report.export import iter_report_csv, write_report_xlsx
+from report.models import Report
+from report_template.models import ReportTemplate, TableTemplate, RowTemplate, ColumnTemplate
+
+
+class Command(BaseCommand):
+    help = (
+        "Замер памяти и времени выгрузки большого отчёта (по умолчанию 1000×500 = 500 000 ячеек). "
+        "Тестовые данные создаются в транзакции, которая откатывается после замера."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--columns', type=int, default=500)
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument(
+            '--max-memory-mb', type=float, default=64,
+            help="Допустимый пик памяти Python во время выгрузки, МБ"
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            report = self._seed(options['rows'], options['columns'])
+            cells = report.data.count()
+            self.stdout.write(f"Создан отчёт на {cells} ячеек, выгрузка в {options['format']}...")
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            size = 0
+            if options['format'] == 'csv':
+                for chunk in iter_report_csv(report):
+                    size += len(chunk)
+            else:
+                with write_report_xlsx(report) as output:
+                    output.seek(0, 2)
+                    size = output.tell()
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            transaction.set_rollback(True)
+
+        peak_mb = peak / 1024 / 1024
+        self.stdout.write(
+            f"Время: {elapsed:.2f} с, объём: {size / 1024 / 1024:.1f} МБ, "
+            f"пик памяти: {peak_mb:.1f} МБ"
+        )
+        if peak_mb > options['max_memory_mb']:
+            raise CommandError(
+                f"Пик памяти {peak_mb:.1f} МБ превышает порог {options['max_memory_mb']} МБ"
+            )
+        self.stdout.write(self.style.SUCCESS("Пик памяти в пределах порога"))
+
+    def _seed(self, n_rows, n_columns):
+        template = ReportTemplate.objects.create(title="Бенчмарк выгрузки")
+        table = TableTemplate.objects.create(report=template, title="Таблица")
+        RowTemplate.objects.bulk_create(
+            [RowTemplate(table=table, title=f"Строка {i}", order=i) for i in range(1, n_rows + 1)],
+            batch_size=1000
+        )
+        ColumnTemplate.objects.bulk_create(
+            [ColumnTemplate(table=table, title=f"Столбец {j}", order=j) for j in range(1, n_columns + 1)],
+            batch_size=1000
+        )
+        report = Report.objects.create(template=template, date=datetime.date.today())
+        report.create_or_update_data()
+        return report
@@ -0,0 +1,142 @@
+import datetime
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+
+from report.models import Report, ReportData
+from report_template.models import ReportTemplate, TableTemplate, RowTemplate, ColumnTemplate
+
+# Индексы из плана (см. Meta модели Report). Покрывающий уникальный индекс
+# ячеек на PostgreSQL (миграция 0007) не снимается: это ограничение уникальности
+PLAN = [
+    (Report, models.Index(fields=['template', 'date'], name='report_template_date_idx')),
+    (Report, models.Index(fields=['status'], name='report_status_idx')),
+]
+
+# Индексы, которые были до плана: отдельные FK-индексы
+LEGACY = [
+    (Report, models.Index(fields=['template'], name='bench_report_template_idx')),
+    (ReportData, models.Index(fields=['report'], name='bench_reportdata_report_idx')),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнение планов запросов и времени выполнения для горячих выборок "
+        "Report/ReportData с индексами из плана и без них (как было до плана). "
+        "Работает во временной тестовой базе, которая удаляется по окончании; "
+        "рабочая база не затрагивается."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reports', type=int, default=20000,
+                            help="Сколько отчётов создать (без данных)")
+        parser.add_argument('--reports-with-data', type=int, default=200,
+                            help="Сколько из них заполнить ячейками")
+        parser.add_argument('--rows', type=int, default=50)
+        parser.add_argument('--columns', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20,
+                            help="Сколько раз выполнять каждый запрос для замера")
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        # Индексы снимаются и создаются заново, поэтому замер идёт
+        # во временной базе, как в тестах, а не в рабочей
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self._benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _benchmark(self, options):
+        template = self._seed(options)
+        queries = self._queries(template)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("=== С индексами из плана ==="))
+        after = self._measure(queries)
+
+        with connection.schema_editor() as schema_editor:
+            for model, index in PLAN:
+                schema_editor.remove_index(model, index)
+            for model, index in LEGACY:
+                schema_editor.add_index(model, index)
+        self.stdout.write(self.style.MIGRATE_HEADING("=== Без индексов из плана ==="))
+        before = self._measure(queries)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("=== Итог, медиана в мс (до -> после) ==="))
+        for label in queries:
+            self.stdout.write(f"{label}: {before[label]:.3f} -> {after[label]:.3f}")
+
+    def _seed(self, options):
+        self.stdout.write("Создание тестовых данных...")
+        template = ReportTemplate.objects.create(title="Бенчмарк индексов")
+        table = TableTemplate.objects.create(report=template, title="Таблица")
+        RowTemplate.objects.bulk_create(
+            [RowTemplate(table=table, title=f"Строка {i}", order=i) for i in range(1, options['rows'] + 1)]
+        )
+        ColumnTemplate.objects.bulk_create(
+            [ColumnTemplate(table=table, title=f"Столбец {j}", order=j) for j in range(1, options['columns'] + 1)]
+        )
+
+        rnd = random.Random(0)
+        start = datetime.date(2020, 1, 1)
+        statuses = ['draft'] * 10 + ['approved'] * 9 + ['for_approval']
+        Report.objects.bulk_create(
+            [
+                Report(
+                    template=template,
+                    date=start + datetime.timedelta(days=rnd.randrange(365 * 5)),
+                    status=rnd.choice(statuses)
+                )
+                for _ in range(options['reports'])
+            ],
+            batch_size=1000
+        )
+        for report in Report.objects.filter(template=template)[:options['reports_with_data']]:
+            report.create_or_update_data()
+
+        self.stdout.write(
+            f"Отчётов: {Report.objects.filter(template=template).count()}, "
+            f"ячеек: {ReportData.objects.filter(report__template=template).count()}"
+        )
+        return template
+
+    def _queries(self, template):
+        report = Report.objects.filter(template=template, data__isnull=False).first()
+        table = template.tables.first()
+        row = table.rows.last()
+        column = table.columns.last()
+        return {
+            "Ячейка по (report, row, column)": lambda: ReportData.objects.filter(
+                report=report, row=row, column=column
+            ).values_list('value', flat=True),
+            "Все ячейки отчёта": lambda: ReportData.objects.filter(
+                report=report
+            ).values_list('row_id', 'column_id', 'value'),
+            "Отчёты шаблона за квартал": lambda: Report.objects.filter(
+                template=template, date__range=(datetime.date(2022, 1, 1), datetime.date(2022, 3, 31))
+            ).order_by('date'),
+            # Во временной базе есть только отчёты, созданные для замера
+            "Отчёты на утверждении": lambda: Report.objects.filter(status='for_approval'),
+            "Админка: ячейки таблицы (первые 100)": lambda: ReportData.objects.filter(
+                row__table=table
+            ).values_list('id', flat=True)[:100],
+        }
+
+    def _measure(self, queries):
+        results = {}
+        for label, make_qs in queries.items():
+            self.stdout.write(self.style.SQL_KEYWORD(label))
+            self.stdout.write(make_qs().explain())
+            timings = []
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                list(make_qs())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[label] = statistics.median(timings)
+            self.stdout.write(f"медиана: {results[label]:.3f} мс\n")
+        return results
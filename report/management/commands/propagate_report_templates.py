@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from report.propagation import propagate_new_items
+from report_template.models import TableTemplate, RowTemplate
+
+
+class Command(BaseCommand):
+    help = (
+        "Дополняет неутверждённые отчёты недостающими ячейками по текущей структуре шаблонов "
+        "(например, если фоновое распространение не было выполнено)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('template_ids', nargs='*', type=int,
+                            help="Шаблоны отчётов (по умолчанию — все)")
+
+    def handle(self, *args, **options):
+        tables = TableTemplate.objects.all()
+        if options['template_ids']:
+            tables = tables.filter(report_id__in=options['template_ids'])
+
+        rows_by_table = {}
+        for row_id, table_id in RowTemplate.objects.filter(table__in=tables).values_list('id', 'table_id'):
+            rows_by_table.setdefault(table_id, []).append(row_id)
+
+        started = time.perf_counter()
+        inserted = 0
+        for table_id, row_ids in rows_by_table.items():
+            inserted += propagate_new_items(table_id, row_ids=row_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"Добавлено ячеек: {inserted} за {time.perf_counter() - started:.2f} с"
+        ))
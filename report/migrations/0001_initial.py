@@ -0,0 +1,49 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('report_template', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Report',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата отчёта')),
+                ('status', models.CharField(choices=[('draft', 'Черновик'), ('for_approval', 'Для утверждения'), ('approved', 'Утвержден')], default='draft', max_length=20, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='report_template.reporttemplate', verbose_name='Шаблон отчёта')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Отчёт',
+                'verbose_name_plural': 'Отчёты',
+            },
+        ),
+        migrations.CreateModel(
+            name='ReportData',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(blank=True, default=0, max_length=255, null=True, verbose_name='Значение')),
+                ('column', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='report_template.columntemplate', verbose_name='Столбец (шаблон)')),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='data', to='report.report', verbose_name='Отчёт')),
+                ('row', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='report_template.rowtemplate', verbose_name='Строка (шаблон)')),
+            ],
+            options={
+                'verbose_name': 'Данные отчёта',
+                'verbose_name_plural': 'Данные отчёта',
+                'unique_together': {('report', 'row', 'column')},
+            },
+        ),
+    ]
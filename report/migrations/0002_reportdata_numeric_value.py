@@ -0,0 +1,60 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:12
+
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def parse_numeric(value):
+    # Копия report.models.parse_numeric на момент миграции
+    if value is None:
+        return None
+    text = str(value).strip().replace(',', '.')
+    if not text:
+        return None
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        return None
+    if not number.is_finite() or number.adjusted() >= 14:
+        return None
+    return number.quantize(Decimal('0.000001'))
+
+
+def backfill_numeric_value(apps, schema_editor):
+    """
+    Заполняет numeric_value для существующих ячеек пачками по BATCH_SIZE,
+    двигаясь по первичному ключу, чтобы не держать всю таблицу в памяти.
+    """
+    ReportData = apps.get_model('report', 'ReportData')
+    last_pk = 0
+    while True:
+        batch = list(
+            ReportData.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .only('pk', 'value')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for cell in batch:
+            cell.numeric_value = parse_numeric(cell.value)
+        ReportData.objects.bulk_update(batch, ['numeric_value'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportdata',
+            name='numeric_value',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=20, null=True, verbose_name='Числовое значение'),
+        ),
+        migrations.RunPython(backfill_numeric_value, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+COVERING_INDEX = 'report_data_cell_covering_idx'
+
+
+def create_covering_index(apps, schema_editor):
+    # Покрывающий индекс поддерживается только PostgreSQL (INCLUDE)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {COVERING_INDEX} '
+        'ON report_reportdata (report_id, row_id, column_id) INCLUDE (value)'
+    )
+
+
+def drop_covering_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {COVERING_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0002_reportdata_numeric_value'),
+        ('report_template', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # Сначала создаются новые индексы, затем удаляются ставшие избыточными,
+    # чтобы поиск ячеек и отчётов не оставался без индекса
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['template', 'date'], name='report_template_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['status'], name='report_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reportdata',
+            constraint=models.UniqueConstraint(fields=('report', 'row', 'column'), name='report_data_unique_cell'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='reportdata',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='report',
+            name='template',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='report_template.reporttemplate', verbose_name='Шаблон отчёта'),
+        ),
+        migrations.AlterField(
+            model_name='reportdata',
+            name='report',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='data', to='report.report', verbose_name='Отчёт'),
+        ),
+        migrations.RunPython(create_covering_index, drop_covering_index),
+    ]
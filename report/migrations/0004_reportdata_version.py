@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0003_report_data_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportdata',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='Версия'),
+        ),
+    ]
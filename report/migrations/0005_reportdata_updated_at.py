@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0004_reportdata_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportdata',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Изменено'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='reportdata',
+            index=models.Index(fields=['report', 'updated_at'], name='report_data_updated_idx'),
+        ),
+    ]
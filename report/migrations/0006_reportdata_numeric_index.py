@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0005_reportdata_updated_at'),
+        ('report_template', '0002_group_paths'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reportdata',
+            index=models.Index(fields=['report', 'numeric_value'], name='report_data_numeric_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+COVERING_INDEX = 'report_data_cell_covering_idx'
+CONSTRAINT = 'report_data_unique_cell'
+
+
+def make_unique_cell_covering(apps, schema_editor):
+    """
+    На PostgreSQL уникальное ограничение (report, row, column) само становится
+    покрывающим (INCLUDE (value)), а отдельный покрывающий индекс из 0003
+    по тем же колонкам удаляется: на таблице ячеек остаётся один индекс вместо двух.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'ALTER TABLE report_reportdata DROP CONSTRAINT {CONSTRAINT}, '
+        f'ADD CONSTRAINT {CONSTRAINT} UNIQUE (report_id, row_id, column_id) INCLUDE (value)'
+    )
+    schema_editor.execute(f'DROP INDEX IF EXISTS {COVERING_INDEX}')
+
+
+def restore_covering_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {COVERING_INDEX} '
+        'ON report_reportdata (report_id, row_id, column_id) INCLUDE (value)'
+    )
+    schema_editor.execute(
+        f'ALTER TABLE report_reportdata DROP CONSTRAINT {CONSTRAINT}, '
+        f'ADD CONSTRAINT {CONSTRAINT} UNIQUE (report_id, row_id, column_id)'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0006_reportdata_numeric_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(make_unique_cell_covering, restore_covering_index),
+    ]
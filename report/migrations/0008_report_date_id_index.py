@@ -0,0 +1,20 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0007_covering_unique_cell'),
+        ('report_template', '0002_group_paths'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['date', 'id'], name='report_date_id_idx'),
+        ),
+    ]
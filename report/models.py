@@ -1,11 +1,44 @@
-from django.db import models
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, models, transaction
+from django.db.models.constants import OnConflict
 from django.conf import settings
+from django.utils import timezone
+from report.events import publish_report_event
 from report_template.models import (
     ReportTemplate,
     RowTemplate,
     ColumnTemplate
 )
 
+# Размер пачки для массовой вставки/обновления ячеек отчёта
+BULK_BATCH_SIZE = 1000
+
+# Точность числового представления значения ячейки
+NUMERIC_MAX_DIGITS = 20
+NUMERIC_DECIMAL_PLACES = 6
+
+
+def parse_numeric(value):
+    """
+    Приводит текстовое значение ячейки к Decimal.
+    Допускается запятая как десятичный разделитель и пробелы по краям.
+    Для пустых, нечисловых и не помещающихся в NUMERIC_MAX_DIGITS значений возвращает None.
+    """
+    if value is None:
+        return None
+    text = str(value).strip().replace(',', '.')
+    if not text:
+        return None
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        return None
+    # Целая часть должна помещаться в NUMERIC_MAX_DIGITS - NUMERIC_DECIMAL_PLACES знаков
+    if not number.is_finite() or number.adjusted() >= NUMERIC_MAX_DIGITS - NUMERIC_DECIMAL_PLACES:
+        return None
+    return number.quantize(Decimal(1).scaleb(-NUMERIC_DECIMAL_PLACES))
+
 
 class Report(models.Model):
     STATUS_CHOICES = [
@@ -20,9 +53,11 @@ class Report(models.Model):
         blank=True,
         verbose_name="Пользователь"
     )
+    # Отдельный индекс по template не нужен: его покрывает индекс (template, date)
     template = models.ForeignKey(
         ReportTemplate,
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name="Шаблон отчёта"
     )
     date = models.DateField(verbose_name="Дата отчёта")
@@ -41,23 +76,95 @@ class Report(models.Model):
     class Meta:
         verbose_name = "Отчёт"
         verbose_name_plural = "Отчёты"
+        indexes = [
+            # Список отчётов шаблона за период
+            models.Index(fields=['template', 'date'], name='report_template_date_idx'),
+            # Отбор отчётов по статусу (например, ожидающих утверждения)
+            models.Index(fields=['status'], name='report_status_idx'),
+            # Ключ пагинации списка отчётов (см. ReportKeysetPagination)
+            models.Index(fields=['date', 'id'], name='report_date_id_idx'),
+        ]
 
-    def create_or_update_data(self):
+    def create_or_update_data(self, batch_size=BULK_BATCH_SIZE):
         """
         Создаёт (или дополняет) ReportData для всех строк/столбцов в выбранном шаблоне.
+
+        Существующие пары (row, column) отчёта загружаются одним запросом,
+        недостающие ячейки вычисляются в памяти и вставляются пачками
+        (insert_missing_cells) в одной транзакции.
+        Возвращает словарь {'created': ..., 'kept': ...}.
+        """
+        rows_by_table = {}
+        for row_id, table_id in RowTemplate.objects.filter(
+                table__report_id=self.template_id
+        ).values_list('id', 'table_id'):
+            rows_by_table.setdefault(table_id, []).append(row_id)
+
+        cols_by_table = {}
+        for col_id, table_id in ColumnTemplate.objects.filter(
+                table__report_id=self.template_id
+        ).values_list('id', 'table_id'):
+            cols_by_table.setdefault(table_id, []).append(col_id)
+
+        with transaction.atomic():
+            existing = set(self.data.values_list('row_id', 'column_id'))
+            missing = [
+                ReportData(report=self, row_id=row_id, column_id=col_id, value=0, numeric_value=0)
+                for table_id, row_ids in rows_by_table.items()
+                for row_id in row_ids
+                for col_id in cols_by_table.get(table_id, [])
+                if (row_id, col_id) not in existing
+            ]
+            # Ячейки, вставленные параллельно (распространение новых строк
+            # шаблона), пропускаются и не попадают в created
+            created = insert_missing_cells(missing, batch_size=batch_size) if missing else 0
+
+            if created and existing:
+                # Структура уже заполненного отчёта изменилась: вставка
+                # не вызывает post_save, поэтому подписчикам нужен полный перечит
+                publish_report_event(self.pk, 'resync', {})
+
+        return {'created': created, 'kept': len(existing)}
+
+    def clone(self, date, user=None):
+        """
+        Создаёт новый отчёт-черновик того же шаблона на дату date
+        со значениями, скопированными из текущего отчёта.
+        Ячейки копируются одним INSERT ... SELECT на стороне базы;
+        строки/столбцы, добавленные в шаблон после создания исходного отчёта,
+        дозаполняются через create_or_update_data.
+        Возвращает (новый отчёт, {'copied': ..., 'created': ...}).
         """
-        for table_tpl in self.template.tables.all():
-            row_qs = table_tpl.rows.all()
-            col_qs = table_tpl.columns.all()
-            for row_tpl in row_qs:
-                for col_tpl in col_qs:
-                    ReportData.objects.get_or_create(
-                        report=self,
-                        row=row_tpl,
-                        column=col_tpl,
-                        defaults={'value': 0}
-                    )
+        with transaction.atomic():
+            new_report = Report.objects.create(
+                template_id=self.template_id,
+                date=date,
+                user=user
+            )
 
+            opts = ReportData._meta
+            qn = connection.ops.quote_name
+
+            def column(name):
+                return qn(opts.get_field(name).column)
+
+            # Поля, значения которых копируются из исходного отчёта как есть
+            copied_columns = ', '.join(column(name) for name in ('row', 'column', 'value', 'numeric_value'))
+            updated_at = opts.get_field('updated_at').get_db_prep_value(timezone.now(), connection)
+            with connection.cursor() as cursor:
+                # Версии скопированных ячеек начинаются заново с 1
+                cursor.execute(
+                    f"INSERT INTO {qn(opts.db_table)} "
+                    f"({column('report')}, {copied_columns}, {column('version')}, {column('updated_at')}) "
+                    f"SELECT %s, {copied_columns}, 1, %s FROM {qn(opts.db_table)} "
+                    f"WHERE {column('report')} = %s",
+                    [new_report.pk, updated_at, self.pk]
+                )
+                copied = cursor.rowcount
+
+            created = new_report.create_or_update_data()['created']
+
+        return new_report, {'copied': copied, 'created': created}
 
 
 class ReportData(models.Model):
@@ -65,10 +172,13 @@ class ReportData(models.Model):
     Хранит значение, введённое пользователем (или системой) для пересечения
     RowTemplate и ColumnTemplate в рамках конкретного Report.
     """
+    # Отдельный индекс по report не нужен: report — первая колонка
+    # уникального индекса (report, row, column)
     report = models.ForeignKey(
         Report,
         on_delete=models.CASCADE,
         related_name="data",
+        db_index=False,
         verbose_name="Отчёт"
     )
     row = models.ForeignKey(
@@ -89,11 +199,80 @@ class ReportData(models.Model):
         default=0,
         verbose_name="Значение"
     )
+    # Числовое представление value для агрегаций и фильтров по диапазону;
+    # None, если значение не является числом
+    numeric_value = models.DecimalField(
+        max_digits=NUMERIC_MAX_DIGITS,
+        decimal_places=NUMERIC_DECIMAL_PLACES,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Числовое значение"
+    )
+    # Счётчик изменений ячейки для оптимистичной блокировки:
+    # запись выполняется только если версия не изменилась с момента чтения
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        verbose_name="Версия"
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Изменено")
 
     def __str__(self):
         return f"{self.report} / R:{self.row} / C:{self.column} => {self.value}"
 
+    def save(self, *args, **kwargs):
+        self.numeric_value = parse_numeric(self.value)
+        if not self._state.adding:
+            self.version += 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'value' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'numeric_value', 'version', 'updated_at'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Данные отчёта"
         verbose_name_plural = "Данные отчёта"
-        unique_together = (("report", "row", "column"),)
+        indexes = [
+            # Выборка ячеек отчёта, изменённых после курсора (?since=)
+            models.Index(fields=['report', 'updated_at'], name='report_data_updated_idx'),
+            # Отбор ячеек отчёта по диапазону числового значения
+            models.Index(fields=['report', 'numeric_value'], name='report_data_numeric_idx'),
+        ]
+        constraints = [
+            # Уникальный индекс обслуживает поиск ячейки по (report, row, column)
+            # и выборку всех ячеек отчёта. На PostgreSQL миграция 0007 делает
+            # его покрывающим (INCLUDE (value))
+            models.UniqueConstraint(
+                fields=['report', 'row', 'column'],
+                name='report_data_unique_cell'
+            ),
+        ]
+
+
+def insert_missing_cells(cells, batch_size=BULK_BATCH_SIZE):
+    """
+    Вставляет ячейки ReportData многострочными INSERT, пропуская уже
+    существующие (в том числе вставленные параллельной транзакцией).
+    В отличие от bulk_create(ignore_conflicts=True) возвращает число
+    действительно вставленных строк. post_save не вызывается.
+    """
+    opts = ReportData._meta
+    fields = [field for field in opts.concrete_fields if not field.primary_key]
+    qn = connection.ops.quote_name
+    insert = connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)
+    on_conflict = connection.ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None)
+    columns = ', '.join(qn(field.column) for field in fields)
+    row_sql = f"({', '.join(['%s'] * len(fields))})"
+    batch_size = max(1, min(batch_size, connection.ops.bulk_batch_size(fields, cells)))
+
+    inserted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(cells), batch_size):
+            batch = cells[start:start + batch_size]
+            cursor.execute(
+                f"{insert} {qn(opts.db_table)} ({columns}) VALUES {', '.join([row_sql] * len(batch))} {on_conflict}",
+                [field.get_db_prep_save(field.pre_save(cell, True), connection) for cell in batch for field in fields]
+            )
+            inserted += cursor.rowcount
+    return inserted
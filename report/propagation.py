@@ -0,0 +1,168 @@
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from report.events import publish_report_event
+from report.models import Report, ReportData
+from report_template.models import TableTemplate, RowTemplate, ColumnTemplate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'report.propagation.SyncBackend'
+
+# Статусы, отчёты в которых не дополняются новыми ячейками
+FROZEN_STATUSES = ('approved',)
+
+# Сколько id новых строк/столбцов подставлять в один INSERT
+IDS_BATCH_SIZE = 500
+
+
+def propagate_new_items(table_id, row_ids=(), column_ids=()):
+    """
+    Добавляет ячейки для новых строк/столбцов таблицы во все неутверждённые
+    отчёты её шаблона. Для строк и для столбцов выполняется по одному
+    INSERT ... SELECT, который строит декартово произведение
+    (отчёты × строки × столбцы) на стороне базы и пропускает уже
+    существующие ячейки (в том числе вставленные параллельно).
+    Возвращает число вставленных ячеек.
+    """
+    if not row_ids and not column_ids:
+        return 0
+
+    template_id = TableTemplate.objects.filter(pk=table_id).values_list('report_id', flat=True).first()
+    if template_id is None:
+        return 0
+
+    qn = connection.ops.quote_name
+
+    def column(model, name):
+        return qn(model._meta.get_field(name).column)
+
+    data_columns = ', '.join(
+        column(ReportData, name)
+        for name in ('report', 'row', 'column', 'value', 'numeric_value', 'version', 'updated_at')
+    )
+    updated_at = ReportData._meta.get_field('updated_at').get_db_prep_value(timezone.now(), connection)
+    frozen = ', '.join(['%s'] * len(FROZEN_STATUSES))
+    # NOT EXISTS не видит ячейки, которые параллельно вставляет ещё не
+    # зафиксированный create_or_update_data; такие конфликты по уникальной
+    # паре (report, row, column) пропускаются, а не обрывают вставку
+    insert = connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)
+    on_conflict = connection.ops.on_conflict_suffix_sql(
+        [ReportData._meta.get_field(name) for name in ('report', 'row', 'column')],
+        OnConflict.IGNORE, None, None
+    )
+    sql = (
+        f"{insert} {qn(ReportData._meta.db_table)} ({data_columns}) "
+        f"SELECT r.{column(Report, 'id')}, rt.{column(RowTemplate, 'id')}, ct.{column(ColumnTemplate, 'id')}, "
+        f"'0', 0, 1, %s "
+        f"FROM {qn(Report._meta.db_table)} r, {qn(RowTemplate._meta.db_table)} rt, "
+        f"{qn(ColumnTemplate._meta.db_table)} ct "
+        f"WHERE r.{column(Report, 'template')} = %s AND r.{column(Report, 'status')} NOT IN ({frozen}) "
+        f"AND rt.{column(RowTemplate, 'table')} = %s AND ct.{column(ColumnTemplate, 'table')} = %s "
+        f"AND {{items}}.{column(RowTemplate, 'id')} IN ({{placeholders}}) "
+        f"AND NOT EXISTS (SELECT 1 FROM {qn(ReportData._meta.db_table)} d "
+        f"WHERE d.{column(ReportData, 'report')} = r.{column(Report, 'id')} "
+        f"AND d.{column(ReportData, 'row')} = rt.{column(RowTemplate, 'id')} "
+        f"AND d.{column(ReportData, 'column')} = ct.{column(ColumnTemplate, 'id')}) "
+        f"{on_conflict}"
+    )
+
+    inserted = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for items, ids in (('rt', list(row_ids)), ('ct', list(column_ids))):
+            for start in range(0, len(ids), IDS_BATCH_SIZE):
+                batch = ids[start:start + IDS_BATCH_SIZE]
+                cursor.execute(
+                    sql.format(items=items, placeholders=', '.join(['%s'] * len(batch))),
+                    [updated_at, template_id, *FROZEN_STATUSES, table_id, table_id, *batch]
+                )
+                inserted += cursor.rowcount
+
+        if inserted:
+            # Ячейки вставлены в обход save(): подписчики ленты перечитывают отчёт
+            for report_id in Report.objects.filter(template_id=template_id).exclude(
+                    status__in=FROZEN_STATUSES).values_list('id', flat=True):
+                publish_report_event(report_id, 'resync', {})
+
+    return inserted
+
+
+class SyncBackend:
+    """
+    Выполняет распространение сразу, в текущем потоке.
+    """
+
+    def enqueue(self, table_id, row_ids=(), column_ids=()):
+        propagate_new_items(table_id, row_ids, column_ids)
+
+
+class ThreadBackend:
+    """
+    Выполняет распространение в фоновом потоке процесса: запрос,
+    добавивший строку или столбец, не ждёт вставки ячеек во все отчёты.
+    Для отдельного воркера (Celery, RQ и т.п.) достаточно бэкенда
+    с тем же методом enqueue, который ставит задачу propagate_new_items.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def enqueue(self, table_id, row_ids=(), column_ids=()):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='report-propagation', daemon=True)
+                self._thread.start()
+        self._queue.put((table_id, list(row_ids), list(column_ids)))
+
+    def join(self):
+        """
+        Ожидает выполнения всех поставленных задач.
+        """
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                propagate_new_items(*job)
+            except Exception:
+                logger.exception("Ошибка распространения изменений шаблона: %s", job)
+            finally:
+                connection.close()
+                self._queue.task_done()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Бэкенд, заданный настройкой REPORT_PROPAGATION_BACKEND
+    (по умолчанию SyncBackend).
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend = getattr(settings, 'REPORT_PROPAGATION_BACKEND', DEFAULT_BACKEND)
+                _backend = import_string(backend)()
+    return _backend
+
+
+def schedule_propagation(table_id, row_ids=(), column_ids=()):
+    """
+    Ставит распространение новых строк/столбцов после фиксации транзакции,
+    в которой они созданы.
+    """
+    row_ids, column_ids = list(row_ids), list(column_ids)
+    transaction.on_commit(lambda: get_backend().enqueue(table_id, row_ids, column_ids))
@@ -0,0 +1,55 @@
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from report.events import publish_cells, publish_report_event
+from report.models import Report, ReportData
+from report.propagation import schedule_propagation
+from report_template.models import RowTemplate, ColumnTemplate, items_bulk_created
+
+
+@receiver(post_init, sender=Report)
+def remember_report_status(sender, instance, **kwargs):
+    # Статус на момент загрузки, чтобы публиковать только смену статуса.
+    # Через __dict__, чтобы не загружать отложенное поле (only/defer)
+    instance._loaded_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Report)
+def report_saved(sender, instance, created, **kwargs):
+    if created or instance.status != instance._loaded_status:
+        publish_report_event(instance.pk, 'status', {
+            'status': instance.status,
+            'previous': None if created else instance._loaded_status,
+        })
+    instance._loaded_status = instance.status
+
+
+@receiver(post_save, sender=ReportData)
+def report_data_saved(sender, instance, **kwargs):
+    publish_cells(instance.report_id, [
+        (instance.row_id, instance.column_id, instance.value, instance.version)
+    ])
+
+
+# Новые строки и столбцы шаблона добавляются в неутверждённые отчёты
+@receiver(post_save, sender=RowTemplate)
+def row_template_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        schedule_propagation(instance.table_id, row_ids=[instance.pk])
+
+
+@receiver(post_save, sender=ColumnTemplate)
+def column_template_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        schedule_propagation(instance.table_id, column_ids=[instance.pk])
+
+
+@receiver(items_bulk_created, sender=RowTemplate)
+@receiver(items_bulk_created, sender=ColumnTemplate)
+def template_items_bulk_created(sender, objs, **kwargs):
+    ids_by_table = {}
+    for obj in objs:
+        ids_by_table.setdefault(obj.table_id, []).append(obj.pk)
+    key = 'row_ids' if sender is RowTemplate else 'column_ids'
+    for table_id, ids in ids_by_table.items():
+        schedule_propagation(table_id, **{key: ids})
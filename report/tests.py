@@ -1,3 +1,702 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import importlib
+import io
+import json
+import threading
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from report.events import InProcessBroker, RESYNC
+from report.propagation import propagate_new_items
+from report.models import Report, ReportData, insert_missing_cells, parse_numeric
+from report.utils import (
+    update_cells,
+    CellVersionConflict,
+    CURSOR_SAFETY_WINDOW,
+    encode_cursor,
+    decode_cursor
+)
+from report_template.models import (
+    ReportTemplate,
+    TableTemplate,
+    RowGroup,
+    RowTemplate,
+    ColumnGroup,
+    ColumnTemplate
+)
+
+
+def create_filled_reports(title, reports=2, rows=10, columns=10):
+    """
+    Шаблон с одной таблицей (строки и столбцы в группах) и reports
+    заполненными отчётами по rows x columns ячеек.
+    """
+    template = ReportTemplate.objects.create(title=title)
+    table = TableTemplate.objects.create(report=template, title=f"Таблица {title}")
+    row_group = RowGroup.objects.create(table=table, title="Группа строк")
+    col_group = ColumnGroup.objects.create(table=table, title="Группа столбцов")
+    RowTemplate.objects.bulk_create([
+        RowTemplate(table=table, group=row_group, title=f"Строка {i}", order=i) for i in range(rows)
+    ])
+    ColumnTemplate.objects.bulk_create([
+        ColumnTemplate(table=table, group=col_group, title=f"Столбец {j}", order=j) for j in range(columns)
+    ])
+    for day in range(1, reports + 1):
+        Report.objects.create(template=template, date=datetime.date(2024, 1, day)).create_or_update_data()
+    return template
+
+
+class ReportAdminQueryTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_changelist_query_count_does_not_depend_on_data(self):
+        create_filled_reports("Первый", reports=1)
+        # Первый запрос заполняет кэш ContentType
+        self.count_queries('/admin/report/reportdata/')
+        data_queries = self.count_queries('/admin/report/reportdata/')
+        report_queries = self.count_queries('/admin/report/report/')
+
+        # Полная страница ячеек (100 строк) и больше отчётов, шаблонов и таблиц
+        create_filled_reports("Второй", reports=5)
+        create_filled_reports("Третий", reports=5)
+        self.assertGreater(ReportData.objects.count(), 100)
+
+        self.assertEqual(self.count_queries('/admin/report/reportdata/'), data_queries)
+        self.assertEqual(self.count_queries('/admin/report/report/'), report_queries)
+
+    def test_change_form_query_count_does_not_depend_on_data(self):
+        create_filled_reports("Первый", reports=1)
+        cell = ReportData.objects.first()
+        # Первый запрос заполняет кэш ContentType
+        self.count_queries(f'/admin/report/reportdata/{cell.pk}/change/')
+        queries = self.count_queries(f'/admin/report/reportdata/{cell.pk}/change/')
+
+        create_filled_reports("Второй", reports=5)
+        self.assertEqual(self.count_queries(f'/admin/report/reportdata/{cell.pk}/change/'), queries)
+
+
+class TemplatePropagationTests(TestCase):
+    def test_new_column_is_added_to_open_reports_in_one_statement(self):
+        template = create_filled_reports("Шаблон", reports=3, rows=4, columns=2)
+        approved = Report.objects.filter(template=template).first()
+        Report.objects.filter(pk=approved.pk).update(status='approved')
+        table = template.tables.get()
+
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                column = ColumnTemplate.objects.create(table=table, title="Новый столбец")
+        inserts = [
+            q for q in context.captured_queries
+            if q['sql'].startswith('INSERT') and ' "report_reportdata" (' in q['sql']
+        ]
+        self.assertEqual(len(inserts), 1)
+
+        self.assertEqual(ReportData.objects.filter(column=column).count(), 2 * 4)
+        self.assertFalse(ReportData.objects.filter(column=column, report=approved).exists())
+
+    @skipUnless(connection.vendor == 'sqlite', "Параллельная вставка имитируется триггером SQLite")
+    def test_cell_inserted_concurrently_is_skipped(self):
+        template = create_filled_reports("Шаблон", reports=1, rows=1, columns=1)
+        report = Report.objects.get(template=template)
+        table = template.tables.get()
+        column = ColumnTemplate.objects.create(table=table, title="Новый столбец")
+        row_id = table.rows.get().pk
+        # Ячейку вставляет «другая транзакция» уже после проверки NOT EXISTS:
+        # триггер добавляет её непосредственно перед вставкой той же ячейки
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMP TRIGGER concurrent_cell BEFORE INSERT ON report_reportdata "
+                "WHEN NEW.value = '0' BEGIN "
+                "INSERT INTO report_reportdata (report_id, row_id, column_id, value, numeric_value, version, updated_at) "
+                "VALUES (NEW.report_id, NEW.row_id, NEW.column_id, '5', 5, 1, NEW.updated_at); END"
+            )
+        self.addCleanup(lambda: connection.cursor().execute("DROP TRIGGER IF EXISTS concurrent_cell"))
+
+        self.assertEqual(propagate_new_items(table.pk, column_ids=[column.pk]), 0)
+        self.assertEqual(ReportData.objects.get(report=report, row_id=row_id, column=column).value, '5')
+
+    def test_bulk_created_rows_are_propagated(self):
+        template = create_filled_reports("Шаблон", reports=2, rows=1, columns=3)
+        table = template.tables.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            RowTemplate.objects.bulk_create_ordered(
+                [RowTemplate(table=table, title=f"Новая строка {i}") for i in range(5)]
+            )
+        self.assertEqual(ReportData.objects.count(), 2 * 6 * 3)
+
+
+class ReportDataCreationTests(TestCase):
+    def create_template(self, title, rows, columns):
+        template = ReportTemplate.objects.create(title=title)
+        table = TableTemplate.objects.create(report=template, title="Таблица")
+        RowTemplate.objects.bulk_create([RowTemplate(table=table, title=f"Строка {i}") for i in range(rows)])
+        ColumnTemplate.objects.bulk_create([ColumnTemplate(table=table, title=f"Столбец {j}") for j in range(columns)])
+        return template
+
+    def count_creation_queries(self, template):
+        report = Report.objects.create(template=template, date=datetime.date(2024, 1, 1))
+        with CaptureQueriesContext(connection) as context:
+            result = report.create_or_update_data()
+        return len(context), result
+
+    def test_query_count_does_not_depend_on_template_size(self):
+        # Обе структуры помещаются в одну пачку вставки
+        small_queries, small = self.count_creation_queries(self.create_template("Малый", 2, 2))
+        large_queries, large = self.count_creation_queries(self.create_template("Большой", 10, 10))
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual((small['created'], large['created']), (4, 100))
+
+    def test_created_counts_only_inserted_cells(self):
+        report = Report.objects.create(template=self.create_template("Шаблон", 2, 3), date=datetime.date(2024, 1, 1))
+        self.assertEqual(report.create_or_update_data(), {'created': 6, 'kept': 0})
+        self.assertEqual(report.create_or_update_data(), {'created': 0, 'kept': 6})
+
+        report.data.first().delete()
+        self.assertEqual(report.create_or_update_data(), {'created': 1, 'kept': 5})
+
+    def test_cells_inserted_concurrently_are_not_counted(self):
+        report = Report.objects.create(template=self.create_template("Шаблон", 2, 3), date=datetime.date(2024, 1, 1))
+
+        def insert_after_concurrent_writer(cells, batch_size):
+            # Параллельная транзакция успела вставить две ячейки из недостающих
+            for cell in cells[:2]:
+                ReportData.objects.create(report=report, row_id=cell.row_id, column_id=cell.column_id, value="5")
+            return insert_missing_cells(cells, batch_size=batch_size)
+
+        with mock.patch('report.models.insert_missing_cells', side_effect=insert_after_concurrent_writer):
+            self.assertEqual(report.create_or_update_data(), {'created': 4, 'kept': 0})
+        self.assertEqual(report.data.count(), 6)
+        self.assertEqual(report.data.filter(value="5").count(), 2)
+
+
+class ReportDataBatchTests(TestCase):
+    def setUp(self):
+        self.template = create_filled_reports("Шаблон", reports=1, rows=10, columns=10)
+        self.report = Report.objects.get(template=self.template)
+        self.url = f'/api/reports/{self.report.pk}/data/batch/'
+        self.cells = list(self.report.data.order_by('row_id', 'column_id'))
+
+    def post(self, items):
+        return self.client.post(self.url, items, content_type='application/json')
+
+    def items(self, cells, value="5"):
+        return [{"row": cell.row_id, "column": cell.column_id, "value": value} for cell in cells]
+
+    def test_updates_cells(self):
+        response = self.post(self.items(self.cells[:2], value="7,5"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], 2)
+        cell = ReportData.objects.get(pk=self.cells[0].pk)
+        self.assertEqual((cell.value, cell.numeric_value, cell.version), ("7,5", Decimal("7.5"), 2))
+
+    def test_not_draft_report_is_read_only(self):
+        Report.objects.filter(pk=self.report.pk).update(status='approved')
+        self.assertEqual(self.post(self.items(self.cells[:1])).status_code, 403)
+
+    def test_body_must_be_list(self):
+        response = self.post({"row": self.cells[0].row_id, "column": self.cells[0].column_id, "value": "1"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_item_errors_are_reported_by_index(self):
+        response = self.post([*self.items(self.cells[:1]), {"row": "x", "value": "1"}])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual([error['index'] for error in errors], [1])
+        self.assertIn('column', errors[0])
+        self.assertEqual(ReportData.objects.get(pk=self.cells[0].pk).version, 1)
+
+    def test_unknown_cell_rejects_whole_batch(self):
+        response = self.post([*self.items(self.cells[:1]), {"row": 0, "column": 0, "value": "1"}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['index'], 1)
+        self.assertEqual(ReportData.objects.get(pk=self.cells[0].pk).value, "0")
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.post(self.items(self.cells[:5])).status_code, 200)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.post(self.items(self.cells)).status_code, 200)
+        self.assertEqual(len(small), len(large))
+
+
+class ReportMatrixTests(TestCase):
+    def setUp(self):
+        self.template = ReportTemplate.objects.create(title="Шаблон")
+        self.table = TableTemplate.objects.create(report=self.template, title="Первая")
+        group = RowGroup.objects.create(table=self.table, title="Группа", order=0)
+        # order нумеруется внутри группы: строка без группы с order=0 идёт после группы
+        self.grouped = [
+            RowTemplate.objects.create(table=self.table, group=group, title=f"В группе {i}", order=i) for i in range(2)
+        ]
+        self.loose = RowTemplate.objects.create(table=self.table, title="Без группы", order=0)
+        self.column = ColumnTemplate.objects.create(table=self.table, title="Столбец")
+        other = TableTemplate.objects.create(report=self.template, title="Вторая")
+        RowTemplate.objects.create(table=other, title="Строка")
+        ColumnTemplate.objects.create(table=other, title="Столбец")
+
+        self.report = Report.objects.create(template=self.template, date=datetime.date(2024, 1, 1))
+        self.report.create_or_update_data()
+        ReportData.objects.filter(report=self.report, row=self.loose).update(value="42")
+
+    def test_rows_follow_display_order(self):
+        response = self.client.get(f'/api/reports/{self.report.pk}/matrix/')
+        self.assertEqual(response.status_code, 200)
+        first = response.json()['tables'][0]
+        self.assertEqual(first['rows'], [*(row.pk for row in self.grouped), self.loose.pk])
+        self.assertEqual(first['values'], [["0"], ["0"], ["42"]])
+        self.assertNotIn('versions', first)
+
+        layout = self.client.get(f'/api/report_templates/{self.template.pk}/layout/').json()
+        self.assertEqual(first['rows'], [row['id'] for row in layout['tables'][0]['rows']])
+
+    def test_table_filter_and_versions(self):
+        response = self.client.get(
+            f'/api/reports/{self.report.pk}/matrix/', {'table': self.table.pk, 'versions': 'true'}
+        )
+        tables = response.json()['tables']
+        self.assertEqual([table['id'] for table in tables], [self.table.pk])
+        self.assertEqual(tables[0]['versions'], [[1], [1], [1]])
+        self.assertEqual(self.client.get(f'/api/reports/{self.report.pk}/matrix/', {'table': 'x'}).status_code, 400)
+
+
+class ReportExportTests(TestCase):
+    def setUp(self):
+        create_filled_reports("Шаблон", reports=1, rows=2, columns=2)
+        self.report = Report.objects.get()
+        ReportData.objects.filter(report=self.report).update(value="7")
+        self.url = f'/api/reports/{self.report.pk}/export/'
+
+    def test_csv_has_grouped_header(self):
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0], "Таблица Шаблон")
+        # Строка групп столбцов над строкой названий столбцов
+        self.assertEqual(lines[1], ";;Группа столбцов;")
+        self.assertEqual(lines[2].split(';')[2:], ["Столбец 0", "Столбец 1"])
+        self.assertEqual(lines[3:5], ["Группа строк;Строка 0;7;7", "Группа строк;Строка 1;7;7"])
+
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get(self.url, {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 200)
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        sheet = workbook.worksheets[0]
+        self.assertEqual(sheet.title, "1. Таблица Шаблон")
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(rows[0][2], "Группа столбцов")
+        self.assertEqual(rows[2], ("Группа строк", "Строка 0", "7", "7"))
+        workbook.close()
+
+    def test_errors_are_json(self):
+        for params in ({'format': 'csv'}, {'format': 'xlsx'}):
+            response = self.client.get('/api/reports/999999/export/', params)
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertIn('detail', response.json())
+        self.assertEqual(self.client.get(self.url, {'format': 'pdf'})['Content-Type'], 'application/json')
+
+
+class TemplateAggregateTests(TestCase):
+    def setUp(self):
+        self.template = create_filled_reports("Шаблон", reports=3, rows=1, columns=2)
+        self.reports = list(Report.objects.filter(template=self.template).order_by('date'))
+        self.url = f'/api/report_templates/{self.template.pk}/aggregate/'
+        for report, values in zip(self.reports, (["1", "x"], ["2,5", ""], ["4", "нет"])):
+            for cell, value in zip(report.data.order_by('column_id'), values):
+                cell.value = value
+                cell.save()
+        Report.objects.filter(pk=self.reports[2].pk).update(status='approved')
+        self.columns = list(ColumnTemplate.objects.filter(table__report=self.template).order_by('id'))
+
+    def test_sums_and_non_numeric_in_one_grouped_query(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        grouped = [q for q in context.captured_queries if 'GROUP BY' in q['sql']]
+        self.assertEqual(len(grouped), 1)
+        self.assertEqual(len(context), 2)  # шаблон и сводный запрос
+
+        cells = response.json()['cells']
+        self.assertEqual(len(cells), 1)
+        self.assertEqual(cells[0]['column'], self.columns[0].pk)
+        self.assertEqual((Decimal(str(cells[0]['sum'])), cells[0]['count']), (Decimal("7.5"), 3))
+        self.assertEqual(
+            response.json()['non_numeric'], [{'row': cells[0]['row'], 'column': self.columns[1].pk, 'count': 2}]
+        )
+
+    def test_date_and_status_filters(self):
+        response = self.client.get(self.url, {'date_from': '2024-01-02', 'status': 'draft'})
+        cells = response.json()['cells']
+        self.assertEqual((Decimal(str(cells[0]['sum'])), cells[0]['count']), (Decimal("2.5"), 1))
+        self.assertEqual(response.json()['non_numeric'], [])
+
+        response = self.client.get(self.url, {'date_to': '2024-01-01'})
+        self.assertEqual(response.json()['cells'][0]['count'], 1)
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get(self.url, {'date_from': '2024-13-01'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'date_to': 'вчера'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'status': 'deleted'}).status_code, 400)
+
+
+class NumericValueTests(TestCase):
+    def test_parse_numeric(self):
+        self.assertEqual(parse_numeric(" 12,5 "), Decimal("12.500000"))
+        self.assertEqual(parse_numeric(0), Decimal("0"))
+        self.assertEqual(parse_numeric("-3.1234567"), Decimal("-3.123457"))
+        for value in (None, "", "   ", "abc", "NaN", "Infinity", "1e20"):
+            self.assertIsNone(parse_numeric(value), value)
+
+    def test_backfill_in_batches(self):
+        create_filled_reports("Шаблон", reports=1, rows=3, columns=3)
+        ReportData.objects.filter(row__order=0).update(value="1,5")
+        ReportData.objects.filter(row__order=1).update(value="текст")
+        ReportData.objects.update(numeric_value=None)
+
+        migration = importlib.import_module('report.migrations.0002_reportdata_numeric_value')
+        with mock.patch.object(migration, 'BATCH_SIZE', 2):
+            migration.backfill_numeric_value(apps, None)
+
+        values = dict(ReportData.objects.values_list('row__order', 'numeric_value').distinct())
+        self.assertEqual(values, {0: Decimal("1.5"), 1: None, 2: Decimal("0")})
+
+    def test_data_range_filter(self):
+        create_filled_reports("Шаблон", reports=1, rows=1, columns=3)
+        report = Report.objects.get()
+        for cell, value in zip(report.data.order_by('column_id'), ("5", "15", "x")):
+            cell.value = value
+            cell.save()
+
+        url = f'/api/reports/{report.pk}/data/'
+        self.assertEqual([cell['value'] for cell in self.client.get(url, {'value_min': '10'}).json()], ["15"])
+        self.assertEqual(
+            [cell['value'] for cell in self.client.get(url, {'value_min': '1', 'value_max': '15,0'}).json()],
+            ["5", "15"]
+        )
+        self.assertEqual(self.client.get(url, {'value_max': 'много'}).status_code, 400)
+
+
+class ReportCloneTests(TestCase):
+    def test_clone_copies_values_and_fills_new_items(self):
+        template = create_filled_reports("Шаблон", reports=1, rows=2, columns=2)
+        source = Report.objects.get()
+        cell = source.data.order_by('id').first()
+        cell.value = "12,5"
+        cell.save()
+        self.assertEqual(cell.version, 2)
+
+        table = template.tables.get()
+        # Строка добавлена после создания исходного отчёта; ячейки
+        # в исходный отчёт не распространяются (on_commit не выполняется)
+        row = RowTemplate.objects.create(table=table, title="Новая строка")
+        self.assertFalse(source.data.filter(row=row).exists())
+
+        response = self.client.post(
+            f'/api/reports/{source.pk}/clone/', {'date': '2024-02-01'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['copied'], response.json()['created']), (4, 2))
+
+        clone = Report.objects.get(pk=response.json()['id'])
+        self.assertEqual((clone.date, clone.status), (datetime.date(2024, 2, 1), 'draft'))
+        copied = clone.data.get(row_id=cell.row_id, column_id=cell.column_id)
+        self.assertEqual((copied.value, copied.numeric_value, copied.version), ("12,5", Decimal("12.5"), 1))
+        self.assertEqual(clone.data.count(), 6)
+        self.assertEqual(set(clone.data.values_list('version', flat=True)), {1})
+        self.assertEqual(source.data.count(), 4)
+
+    def test_clone_validates_date(self):
+        source = Report.objects.get(template=create_filled_reports("Шаблон", reports=1, rows=1, columns=1))
+        response = self.client.post(f'/api/reports/{source.pk}/clone/', {}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CellVersionTests(TestCase):
+    def setUp(self):
+        self.report = Report.objects.get(template=create_filled_reports("Шаблон", reports=1, rows=2, columns=2))
+        self.cells = list(self.report.data.order_by('row_id', 'column_id'))
+
+    def patch(self, cell, body):
+        return self.client.patch(
+            f'/api/reports/{self.report.pk}/data/{cell.row_id}/{cell.column_id}/',
+            body, content_type='application/json'
+        )
+
+    def test_write_bumps_version_and_numeric_value(self):
+        cell = self.cells[0]
+        response = self.patch(cell, {"value": "3,25", "version": 1})
+        self.assertEqual(response.status_code, 200)
+        updated = ReportData.objects.get(pk=cell.pk)
+        self.assertEqual((updated.value, updated.numeric_value, updated.version), ("3,25", Decimal("3.25"), 2))
+        self.assertGreater(updated.updated_at, cell.updated_at)
+
+    def test_write_without_version_is_unconditional(self):
+        cell = self.cells[0]
+        ReportData.objects.filter(pk=cell.pk).update(version=5)
+        response = self.patch(cell, {"value": "9"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ReportData.objects.get(pk=cell.pk).version, 6)
+
+    def test_stale_version_returns_current_value(self):
+        cell = self.cells[0]
+        self.assertEqual(self.patch(cell, {"value": "1", "version": 1}).status_code, 200)
+
+        response = self.patch(cell, {"value": "2", "version": 1})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            response.json()['conflicts'],
+            [{"row": cell.row_id, "column": cell.column_id, "value": "1", "version": 2}]
+        )
+        self.assertEqual(ReportData.objects.get(pk=cell.pk).value, "1")
+
+    def test_batch_conflict_returns_only_stale_cells(self):
+        ReportData.objects.filter(pk=self.cells[1].pk).update(value="8", version=3)
+        items = [
+            {"row": cell.row_id, "column": cell.column_id, "value": "5", "version": 1}
+            for cell in self.cells[:2]
+        ]
+        response = self.client.post(
+            f'/api/reports/{self.report.pk}/data/batch/', items, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            [(c['row'], c['value'], c['version']) for c in response.json()['conflicts']],
+            [(self.cells[1].row_id, "8", 3)]
+        )
+        self.assertEqual(ReportData.objects.get(pk=self.cells[0].pk).version, 1)
+
+    def test_conflict_in_later_chunk_rolls_back_earlier_chunks(self):
+        first, second = self.cells[:2]
+        ReportData.objects.filter(pk=second.pk).update(version=2)
+        with self.assertRaises(CellVersionConflict):
+            with transaction.atomic():
+                update_cells([(first.pk, "1", 1), (second.pk, "1", 1)], batch_size=1)
+
+        first.refresh_from_db()
+        self.assertEqual((first.value, first.version), ("0", 1))
+
+
+class ReportDataSinceTests(TestCase):
+    def setUp(self):
+        self.report = Report.objects.get(template=create_filled_reports("Шаблон", reports=1, rows=2, columns=2))
+        self.url = f'/api/reports/{self.report.pk}/data/'
+
+    def since(self, cursor):
+        return self.client.get(self.url, {'since': cursor})
+
+    def test_initial_load_and_recent_changes(self):
+        response = self.since(0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['cells']), 4)
+        # Ячейки только что созданы: курсор не заходит в окно незафиксированных записей
+        cursor = decode_cursor(response.json()['cursor'])
+        self.assertLessEqual(cursor, timezone.now() - CURSOR_SAFETY_WINDOW)
+
+        # Недавние ячейки приходят повторно, пока не выйдут из окна
+        self.assertEqual(len(self.since(response.json()['cursor']).json()['cells']), 4)
+
+    def test_cursor_advances_past_old_changes(self):
+        old = timezone.now() - CURSOR_SAFETY_WINDOW * 2
+        self.report.data.update(updated_at=old)
+        changed = self.report.data.order_by('id').first()
+        ReportData.objects.filter(pk=changed.pk).update(updated_at=old + datetime.timedelta(seconds=1))
+
+        response = self.since(encode_cursor(old))
+        self.assertEqual([cell['id'] for cell in response.json()['cells']], [changed.pk])
+        self.assertEqual(response.json()['cursor'], encode_cursor(old + datetime.timedelta(seconds=1)))
+
+        # Новых изменений нет: курсор не сдвигается и не откатывается назад
+        response = self.since(response.json()['cursor'])
+        self.assertEqual(response.json()['cells'], [])
+        self.assertEqual(response.json()['cursor'], encode_cursor(old + datetime.timedelta(seconds=1)))
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.since('x').status_code, 400)
+
+
+class ReportEventsTests(TransactionTestCase):
+    async def read_event(self, stream):
+        return (await asyncio.wait_for(anext(stream), timeout=5)).decode()
+
+    async def test_stream_sends_ready_and_status(self):
+        template = await sync_to_async(create_filled_reports)("Шаблон", reports=1, rows=1, columns=1)
+        report = await Report.objects.aget(template=template)
+
+        response = await AsyncClient().get(f'/api/reports/{report.pk}/events/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await self.read_event(stream), "retry: 3000\n\n")
+            self.assertTrue((await self.read_event(stream)).startswith("event: ready\ndata: {\"cursor\": "))
+
+            report.status = 'for_approval'
+            await report.asave(update_fields=['status'])
+            self.assertEqual(
+                await self.read_event(stream),
+                'event: status\ndata: {"status": "for_approval", "previous": "draft"}\n\n'
+            )
+        finally:
+            await stream.aclose()
+
+    async def test_post_is_not_allowed(self):
+        response = await AsyncClient().post('/api/reports/1/events/')
+        self.assertEqual(response.status_code, 405)
+
+    async def test_unknown_report(self):
+        response = await AsyncClient().get('/api/reports/0/events/')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', json.loads(response.content))
+
+
+class EventBrokerTests(SimpleTestCase):
+    async def test_publish_delivers_to_channel_subscribers(self):
+        broker = InProcessBroker()
+        subscription = broker.subscribe('report:1')
+        other = broker.subscribe('report:2')
+        broker.publish('report:1', {'event': 'cell', 'data': {'value': "1"}})
+
+        self.assertEqual(await subscription.get(timeout=1), {'event': 'cell', 'data': {'value': "1"}})
+        self.assertIsNone(await other.get(timeout=0.01))
+        subscription.close()
+        other.close()
+        self.assertEqual(dict(broker._subscriptions), {})
+
+    async def test_overflow_is_replaced_with_resync(self):
+        broker = InProcessBroker()
+        with mock.patch('report.events.SUBSCRIBER_QUEUE_SIZE', 2):
+            subscription = broker.subscribe('report:1')
+        for value in range(3):
+            broker.publish('report:1', {'event': 'cell', 'data': {'value': value}})
+
+        # Накопленные события отброшены: клиент перечитает отчёт целиком
+        self.assertEqual(await subscription.get(timeout=1), RESYNC)
+        self.assertIsNone(await subscription.get(timeout=0.01))
+        subscription.close()
+
+
+class ReportListTests(TestCase):
+    def setUp(self):
+        self.template = ReportTemplate.objects.create(title="Шаблон")
+        same_day = datetime.date(2024, 3, 1)
+        Report.objects.bulk_create(
+            [Report(template=self.template, date=same_day) for _ in range(50)]
+            + [
+                Report(template=self.template, date=same_day + datetime.timedelta(days=i), status='approved')
+                for i in range(-5, 6) if i
+            ]
+        )
+        self.expected = list(Report.objects.order_by('-date', '-id').values_list('id', flat=True))
+
+    def pages(self, url):
+        ids = []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [report['id'] for report in response.json()['results']]
+            url = response.json()['next']
+        return ids
+
+    def test_pages_through_reports_with_equal_dates(self):
+        self.assertEqual(self.pages('/api/reports/?page_size=7'), self.expected)
+
+    def test_filters_are_kept_between_pages(self):
+        ids = self.pages('/api/reports/?page_size=2&status=approved&date_from=2024-03-02')
+        self.assertEqual(
+            ids,
+            list(Report.objects.filter(status='approved', date__gte=datetime.date(2024, 3, 2))
+                 .order_by('-date', '-id').values_list('id', flat=True))
+        )
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(self.client.get('/api/reports/?date_from=x').status_code, 400)
+        self.assertEqual(self.client.get('/api/reports/?status=x').status_code, 400)
+
+    def test_fields_limit_response(self):
+        response = self.client.get('/api/reports/?fields=id,status&page_size=60')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'status'})
+        self.assertIsNone(response.json()['next'])
+        self.assertEqual(self.client.get('/api/reports/?fields=id,secret').status_code, 400)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/reports/?cursor=bm9wZQ').status_code, 404)
+
+    @skipUnless(connection.vendor == 'sqlite', "План запроса проверяется для SQLite")
+    def test_next_page_seeks_in_index(self):
+        url = self.client.get('/api/reports/?page_size=7').json()['next']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        with connection.cursor() as db:
+            db.execute(f"EXPLAIN QUERY PLAN {queries[0]['sql']}")
+            plan = ' '.join(str(row[-1]) for row in db.fetchall())
+        self.assertIn("SEARCH report_report USING INDEX report_date_id_idx", plan)
+        self.assertNotIn("SCAN report_report", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class DeletedCellConflictTests(TransactionTestCase):
+    def setUp(self):
+        self.report = Report.objects.get(template=create_filled_reports("Шаблон", reports=1, rows=1, columns=2))
+        self.cells = list(self.report.data.order_by('column_id'))
+
+    def delete_concurrently(self, cell):
+        """
+        update_cells, перед которым ячейку удаляет другое соединение
+        (удаление зафиксировано, откат запроса его не отменяет).
+        """
+        def delete():
+            try:
+                ReportData.objects.filter(pk=cell.pk).delete()
+            finally:
+                connection.close()
+
+        def update(updates, *args, **kwargs):
+            thread = threading.Thread(target=delete)
+            thread.start()
+            thread.join()
+            return update_cells(updates, *args, **kwargs)
+        return mock.patch('report.api.views.update_cells', side_effect=update)
+
+    def test_batch_reports_deleted_cell(self):
+        deleted, kept = self.cells
+        items = [{"row": cell.row_id, "column": cell.column_id, "value": "5"} for cell in self.cells]
+        with self.delete_concurrently(deleted):
+            response = self.client.post(
+                f'/api/reports/{self.report.pk}/data/batch/', items, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['conflicts'], [
+            {"row": deleted.row_id, "column": deleted.column_id, "value": None, "version": None, "deleted": True}
+        ])
+        self.assertEqual(ReportData.objects.get(pk=kept.pk).version, 1)
+
+    def test_single_update_reports_deleted_cell(self):
+        cell = self.cells[0]
+        with self.delete_concurrently(cell):
+            response = self.client.patch(
+                f'/api/reports/{self.report.pk}/data/{cell.row_id}/{cell.column_id}/',
+                {"value": "5"}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['conflicts'][0]['deleted'], True)
@@ -0,0 +1,167 @@
+import datetime
+
+from django.db.models import Case, CharField, DecimalField, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+
+from report.models import (
+    ReportData,
+    BULK_BATCH_SIZE,
+    NUMERIC_MAX_DIGITS,
+    NUMERIC_DECIMAL_PLACES,
+    parse_numeric
+)
+from report_template.models import TableTemplate, RowGroup, RowTemplate, ColumnGroup, ColumnTemplate
+from report_template.utils import group_tree, display_order
+
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# Насколько курсор отстаёт от текущего момента: updated_at ставится приложением
+# до фиксации транзакции, и ячейка с меньшим updated_at может стать видимой
+# уже после того, как курсор её «прошёл». Ячейки из этого окна приходят
+# повторно, клиент отбрасывает уже известные по версии
+CURSOR_SAFETY_WINDOW = datetime.timedelta(seconds=5)
+
+
+def encode_cursor(moment):
+    """
+    Курсор синхронизации — число микросекунд с начала эпохи (UTC).
+    """
+    return str((moment - EPOCH) // datetime.timedelta(microseconds=1))
+
+
+def decode_cursor(cursor):
+    """
+    Обратное преобразование курсора; ValueError, если курсор некорректен.
+    """
+    return EPOCH + datetime.timedelta(microseconds=int(cursor))
+
+
+def safe_cursor(latest, since=EPOCH):
+    """
+    Курсор для следующего запроса изменений: не дальше latest и не ближе
+    CURSOR_SAFETY_WINDOW к текущему моменту, но и не раньше since,
+    чтобы курсор клиента не откатывался назад.
+    """
+    return encode_cursor(max(since, min(latest, timezone.now() - CURSOR_SAFETY_WINDOW)))
+
+
+def build_report_matrix(report, table_id=None, with_versions=False):
+    """
+    Собирает данные отчёта в виде плотных матриц по таблицам шаблона:
+    упорядоченные id строк, id столбцов и двумерный массив значений.
+    Строки и столбцы идут в порядке вывода (как в /layout/ и выгрузке).
+    Значения читаются одним запросом values_list; отсутствующие ячейки — None.
+    with_versions=True добавляет такой же массив версий ячеек.
+    """
+    tables = TableTemplate.objects.filter(report_id=report.template_id)
+    if table_id is not None:
+        tables = tables.filter(pk=table_id)
+    tables = list(tables.values_list('id', 'title'))
+    table_ids = [pk for pk, _ in tables]
+
+    def ordered_ids(group_model, item_model):
+        # Тот же порядок вывода, что в раскладке шаблона и выгрузке:
+        # order нумеруется внутри группы, поэтому плоская сортировка не годится
+        tree = group_tree(
+            group_model.objects.filter(table_id__in=table_ids).values_list('id', 'parent_group_id', 'order', 'title')
+        )
+        items_by_table = {pk: [] for pk in table_ids}
+        for tbl_id, *item in item_model.objects.filter(
+                table_id__in=table_ids
+        ).values_list('table_id', 'id', 'group_id', 'order', 'title'):
+            items_by_table[tbl_id].append(item)
+        return {
+            tbl_id: [pk for pk, _, _ in display_order(items, tree)]
+            for tbl_id, items in items_by_table.items()
+        }
+
+    rows_by_table = ordered_ids(RowGroup, RowTemplate)
+    cols_by_table = ordered_ids(ColumnGroup, ColumnTemplate)
+
+    # Позиции строк и столбцов внутри своих матриц
+    row_pos = {}
+    for tbl_id, row_ids in rows_by_table.items():
+        row_pos.update({row_id: (tbl_id, i) for i, row_id in enumerate(row_ids)})
+    col_pos = {}
+    for col_ids in cols_by_table.values():
+        col_pos.update({col_id: j for j, col_id in enumerate(col_ids)})
+
+    def empty_matrices():
+        return {
+            tbl_id: [[None] * len(cols_by_table[tbl_id]) for _ in rows_by_table[tbl_id]]
+            for tbl_id in table_ids
+        }
+
+    values = empty_matrices()
+    versions = empty_matrices() if with_versions else None
+    data = ReportData.objects.filter(report=report)
+    if table_id is not None:
+        data = data.filter(row__table_id=table_id)
+    for row_id, col_id, value, version in data.values_list(
+            'row_id', 'column_id', 'value', 'version'
+    ).iterator():
+        if row_id in row_pos and col_id in col_pos:
+            tbl_id, i = row_pos[row_id]
+            values[tbl_id][i][col_pos[col_id]] = value
+            if with_versions:
+                versions[tbl_id][i][col_pos[col_id]] = version
+
+    result = []
+    for tbl_id, title in tables:
+        matrix = {
+            'id': tbl_id,
+            'title': title,
+            'rows': rows_by_table[tbl_id],
+            'columns': cols_by_table[tbl_id],
+            'values': values[tbl_id],
+        }
+        if with_versions:
+            matrix['versions'] = versions[tbl_id]
+        result.append(matrix)
+    return result
+
+
+class CellVersionConflict(Exception):
+    """
+    Хотя бы одна ячейка была изменена другим пользователем
+    после того, как клиент прочитал её версию.
+    """
+
+
+def update_cells(updates, batch_size=BULK_BATCH_SIZE):
+    """
+    Условное обновление значений ячеек без блокировок.
+    updates: список (pk, value, expected_version); expected_version=None
+    означает запись без проверки версии.
+    На каждую пачку выполняется один UPDATE: value и numeric_value задаются через CASE,
+    version увеличивается на 1, updated_at обновляется, а в WHERE версия
+    сравнивается с ожидаемой.
+    Если обновилось меньше строк, чем передано, выбрасывается CellVersionConflict;
+    вызывать нужно внутри transaction.atomic(), чтобы откатить уже записанные пачки.
+    """
+    for start in range(0, len(updates), batch_size):
+        chunk = updates[start:start + batch_size]
+        pks = [pk for pk, _, _ in chunk]
+        expected = [When(pk=pk, then=Value(version)) for pk, _, version in chunk if version is not None]
+
+        updated = ReportData.objects.filter(
+            pk__in=pks,
+            version=Case(*expected, default=F('version'), output_field=PositiveIntegerField()),
+        ).update(
+            value=Case(
+                *[When(pk=pk, then=Value(value)) for pk, value, _ in chunk],
+                output_field=CharField()
+            ),
+            numeric_value=Case(
+                *[When(pk=pk, then=Value(parse_numeric(value))) for pk, value, _ in chunk],
+                output_field=DecimalField(
+                    max_digits=NUMERIC_MAX_DIGITS,
+                    decimal_places=NUMERIC_DECIMAL_PLACES
+                )
+            ),
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+        if updated != len(chunk):
+            raise CellVersionConflict()
@@ -0,0 +1,66 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+
+from report.events import get_broker, report_channel
+from report.models import Report
+from report.utils import safe_cursor
+
+# Интервал комментария-пинга, чтобы прокси не закрывали простаивающее соединение
+HEARTBEAT_SECONDS = 15
+
+# Через сколько миллисекунд клиент EventSource переподключается после обрыва
+RETRY_MS = 3000
+
+
+def sse_message(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)}\n\n"
+
+
+@require_GET
+async def report_events(request, report_id):
+    """
+    Лента изменений отчёта в формате server-sent events.
+    URL: /api/reports/{id}/events/
+
+    События:
+      ready  — {"cursor": ...}: подписка оформлена; изменения, сделанные
+               до этого момента, клиент дочитывает через /data/?since=<cursor>
+               (курсор взят с запасом, часть ячеек может прийти и в ленте);
+      cell   — {"row", "column", "value", "version"}: изменилась ячейка;
+      status — {"status", "previous"}: сменился статус отчёта;
+      resync — клиент отстал или структура отчёта изменилась, нужно
+               перечитать отчёт целиком.
+
+    Работает только под ASGI-сервером (TestAppsDjango.asgi:application):
+    под WSGI бесконечный поток занял бы рабочий процесс.
+    """
+    if not hasattr(request, 'scope'):
+        return JsonResponse({"error": "Лента событий доступна только при запуске под ASGI."}, status=501)
+    if not await Report.objects.filter(pk=report_id).aexists():
+        return JsonResponse({"error": "Отчёт не найден."}, status=404)
+
+    async def stream():
+        # Курсор берётся после подписки, чтобы между ними не потерять изменения
+        subscription = get_broker().subscribe(report_channel(report_id))
+        cursor = safe_cursor(timezone.now())
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            yield sse_message('ready', {'cursor': cursor})
+            while True:
+                message = await subscription.get(timeout=HEARTBEAT_SECONDS)
+                if message is None:
+                    yield ": ping\n\n"
+                else:
+                    yield sse_message(message['event'], message['data'])
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Отключает буферизацию ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -7,6 +7,7 @@ from report_template.models import (
     ColumnGroup,
     ColumnTemplate
 )
+from report_template.utils import attach_group_tree
 
 
 class RowTemplateSerializer(serializers.ModelSerializer):
@@ -60,6 +61,11 @@ class TableTemplateSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'description', 'is_active', 'order',
                   'rows', 'row_groups', 'columns', 'column_groups']
 
+    def to_representation(self, instance):
+        # Подгруппы и строки/столбцы групп берём из дерева, собранного в памяти
+        attach_group_tree(instance)
+        return super().to_representation(instance)
+
 
 class ReportTemplateSerializer(serializers.ModelSerializer):
     tables = TableTemplateSerializer(many=True, read_only=True)
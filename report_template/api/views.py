@@ -1,5 +1,25 @@
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.dateparse import parse_date
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from report.aggregation import aggregate_report_data
+from report.models import Report
+
+from report_template.cache import (
+    get_template_version,
+    get_template_data,
+    set_template_data,
+    get_template_layout,
+    set_template_layout
+)
+from report_template.layout import build_template_layout
 from report_template.models import ReportTemplate
+from report_template.transfer import export_template, import_template, TemplateImportError
+from report_template.utils import template_structure_prefetch
 from .serializers import ReportTemplateSerializer
 
 
@@ -7,12 +27,16 @@ class ReportTemplateViewSet(viewsets.ReadOnlyModelViewSet):
     """
     Эндпоинт для получения списка шаблонов отчётов с полной структурой таблиц.
     Можно фильтровать по активности, используя query параметр ?active=true (или false).
+    Вся структура шаблонов загружается фиксированным числом запросов
+    (по одному на модель), независимо от глубины вложенности групп.
     """
     serializer_class = ReportTemplateSerializer
     queryset = ReportTemplate.objects.all()
 
     def get_queryset(self):
         qs = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            qs = qs.prefetch_related(*template_structure_prefetch())
         active = self.request.query_params.get('active')
         if active is not None:
             if active.lower() in ['true', '1']:
@@ -20,3 +44,117 @@ class ReportTemplateViewSet(viewsets.ReadOnlyModelViewSet):
             elif active.lower() in ['false', '0']:
                 qs = qs.filter(is_active=False)
         return qs
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Структура одного шаблона отдаётся из кэша по версии (см. _versioned_response).
+        """
+        try:
+            pk = int(kwargs[self.lookup_field])
+        except (TypeError, ValueError):
+            raise Http404
+
+        # ?active влияет на состав выборки, поэтому такие запросы не кэшируем
+        cacheable = 'active' not in request.query_params
+        if not cacheable:
+            return super().retrieve(request, *args, **kwargs)
+
+        return self._versioned_response(
+            request, pk, get_template_data, set_template_data,
+            lambda: self.get_serializer(self.get_object()).data
+        )
+
+    def _versioned_response(self, request, pk, load, store, build, tag=''):
+        """
+        Ответ с данными шаблона, закэшированными по версии его структуры.
+        Ответ содержит ETag и Last-Modified; при совпадении If-None-Match
+        (или If-Modified-Since) возвращается 304 без обращения к базе.
+        """
+        version = get_template_version(pk)
+        etag = quote_etag(f"{pk}-{tag}{version}")
+        last_modified = version // 1000
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        data = load(pk, version)
+        if data is None:
+            data = build()
+            store(pk, version, data)
+
+        response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    @action(detail=True, methods=['get'], url_path='layout')
+    def layout(self, request, pk=None):
+        """
+        Раскладка шапки (colspan/rowspan по группам столбцов) и боковика
+        (rowspan по группам строк) для каждой таблицы шаблона.
+        URL: /api/report_templates/{id}/layout/
+        Кэшируется по версии структуры шаблона, как и retrieve.
+        """
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise Http404
+
+        def build():
+            template = self.get_object()
+            return {"template": template.pk, "tables": build_template_layout(template.pk)}
+
+        return self._versioned_response(
+            request, pk, get_template_layout, set_template_layout, build, tag='layout-'
+        )
+
+    @action(detail=True, methods=['get'], url_path='aggregate')
+    def aggregate(self, request, pk=None):
+        """
+        Сводные значения по всем отчётам шаблона.
+        URL: /api/report_templates/{id}/aggregate/?date_from=&date_to=&status=approved
+        Для каждой ячейки (строка, столбец) возвращает sum/avg/min/max/count
+        по числовым значениям; нечисловые значения перечислены отдельно.
+        """
+        template = self.get_object()
+
+        dates = {}
+        for param in ('date_from', 'date_to'):
+            raw = request.query_params.get(param)
+            if raw:
+                try:
+                    dates[param] = parse_date(raw)
+                except ValueError:
+                    dates[param] = None
+                if dates[param] is None:
+                    return Response({"error": f"Некорректная дата в параметре {param}."}, status=400)
+
+        status = request.query_params.get('status')
+        if status and status not in dict(Report.STATUS_CHOICES):
+            return Response({"error": f"Неизвестный статус: {status}."}, status=400)
+
+        result = aggregate_report_data(template.pk, status=status, **dates)
+        return Response({"template": template.pk, **result})
+
+    @action(detail=True, methods=['get'], url_path='export')
+    def export(self, request, pk=None):
+        """
+        Выгрузка шаблона со всей структурой в JSON-документ.
+        URL: /api/report_templates/{id}/export/
+        """
+        template = self.get_object()
+        return Response(export_template(template.pk))
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_document(self, request):
+        """
+        Создание шаблона из документа, полученного через export.
+        URL: /api/report_templates/import/ (необязательно ?title= — новое название).
+        Возвращает id нового шаблона и число созданных элементов.
+        """
+        try:
+            template, counts = import_template(request.data, title=request.query_params.get('title'))
+        except TemplateImportError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response({"id": template.pk, "title": template.title, **counts}, status=201)
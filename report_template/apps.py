@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ReportTemplateConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'report_template'
+
+    def ready(self):
+        # Сброс версии кэша структуры шаблона при изменениях
+        from report_template import signals  # noqa: F401
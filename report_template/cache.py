@@ -0,0 +1,64 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'report_template:{pk}:version'
+DATA_KEY = 'report_template:{pk}:data:{version}'
+LAYOUT_KEY = 'report_template:{pk}:layout:{version}'
+
+# Сериализованная структура хранится до смены версии; старые версии
+# вытесняются самим бэкендом кэша
+DATA_TIMEOUT = 60 * 60 * 24
+
+
+def get_template_version(pk):
+    """
+    Текущая версия структуры шаблона — метка времени в миллисекундах.
+    Если версии в кэше нет (первое обращение или вытеснение),
+    она создаётся заново, что автоматически делает старые данные неактуальными.
+    """
+    key = VERSION_KEY.format(pk=pk)
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_template_version(pk):
+    """
+    Увеличивает версию структуры шаблона после изменения таблиц, групп, строк или столбцов.
+    """
+    key = VERSION_KEY.format(pk=pk)
+    previous = cache.get(key) or 0
+    version = max(int(time.time() * 1000), previous + 1)
+    cache.set(key, version, timeout=None)
+    return version
+
+
+def bump_template_version_on_commit(pk):
+    """
+    Поднимает версию шаблона после фиксации текущей транзакции.
+    Если поднять её раньше, параллельный запрос может прочитать новую
+    версию, собрать структуру из ещё старых строк и закэшировать её
+    под новой версией.
+    """
+    transaction.on_commit(lambda: bump_template_version(pk))
+
+
+def get_template_data(pk, version):
+    return cache.get(DATA_KEY.format(pk=pk, version=version))
+
+
+def set_template_data(pk, version, data):
+    cache.set(DATA_KEY.format(pk=pk, version=version), data, timeout=DATA_TIMEOUT)
+
+
+def get_template_layout(pk, version):
+    return cache.get(LAYOUT_KEY.format(pk=pk, version=version))
+
+
+def set_template_layout(pk, version, layout):
+    cache.set(LAYOUT_KEY.format(pk=pk, version=version), layout, timeout=DATA_TIMEOUT)
@@ -0,0 +1,136 @@
+from report_template.models import (
+    TableTemplate,
+    RowGroup,
+    RowTemplate,
+    ColumnGroup,
+    ColumnTemplate
+)
+
+
+def _children_by_parent(groups, items):
+    """
+    Дочерние узлы каждой группы (None — корень таблицы) в порядке вывода:
+    группы и элементы одного уровня сортируются по order, при равном
+    order группа идёт раньше элемента.
+    groups: (id, parent_group_id, order, title); items: (id, group_id, order, title).
+    Узел — (is_item, id, title).
+    """
+    children = {}
+    for pk, parent_id, order, title in groups:
+        children.setdefault(parent_id, []).append(((order, 0, pk), (False, pk, title)))
+    for pk, group_id, order, title in items:
+        children.setdefault(group_id, []).append(((order, 1, pk), (True, pk, title)))
+    return {parent: [node for _, node in sorted(nodes)] for parent, nodes in children.items()}
+
+
+def _measure(children, parent=None, level=0):
+    """
+    Для каждой группы считает число конечных элементов под ней;
+    возвращает (число элементов, {id группы: число}, максимальная глубина элемента).
+    """
+    total, leaves, depth = 0, {}, -1
+    for is_item, pk, _ in children.get(parent, []):
+        if is_item:
+            total += 1
+            depth = max(depth, level)
+        else:
+            count, sub_leaves, sub_depth = _measure(children, pk, level + 1)
+            leaves.update(sub_leaves)
+            leaves[pk] = count
+            total += count
+            depth = max(depth, sub_depth)
+    return total, leaves, depth
+
+
+def _walk(children, leaves, parent=None, level=0):
+    """
+    Обход дерева в глубину: (уровень, узел) для групп с элементами и самих элементов.
+    """
+    for node in children.get(parent, []):
+        is_item, pk, _ = node
+        if is_item:
+            yield level, node
+        elif leaves[pk]:
+            yield level, node
+            yield from _walk(children, leaves, pk, level + 1)
+
+
+def build_table_layout(table, row_groups, rows, column_groups, columns):
+    """
+    Раскладка шапки и боковика таблицы.
+
+    header — строки шапки, каждая — список ячеек {title, colspan, rowspan}
+    с ключом group или column. Первая строка начинается с угловой ячейки
+    над боковиком. Группа занимает столько столбцов, сколько столбцов под ней,
+    столбец растягивается по высоте до нижней строки шапки.
+    columns — id столбцов в порядке вывода (порядок значений в строке).
+    rows — строки в порядке вывода: {id, stub}, где stub — ячейки боковика,
+    которые начинаются в этой строке (группы с rowspan по числу их строк
+    и название строки с colspan до конца боковика).
+    Группы без строк/столбцов в раскладку не попадают.
+    """
+    col_children = _children_by_parent(column_groups, columns)
+    _, col_leaves, col_depth = _measure(col_children)
+    header_height = col_depth + 1 if columns else 1
+
+    row_children = _children_by_parent(row_groups, rows)
+    _, row_leaves, row_depth = _measure(row_children)
+    stub_width = row_depth + 1 if rows else 1
+
+    header = [[] for _ in range(header_height)]
+    header[0].append({'title': "", 'colspan': stub_width, 'rowspan': header_height})
+    column_ids = []
+    for level, (is_item, pk, title) in _walk(col_children, col_leaves):
+        if is_item:
+            header[level].append({'title': title, 'colspan': 1, 'rowspan': header_height - level, 'column': pk})
+            column_ids.append(pk)
+        else:
+            header[level].append({'title': title, 'colspan': col_leaves[pk], 'rowspan': 1, 'group': pk})
+
+    body = []
+    pending = []
+    for level, (is_item, pk, title) in _walk(row_children, row_leaves):
+        if is_item:
+            pending.append({'title': title, 'colspan': stub_width - level, 'rowspan': 1, 'row': pk})
+            body.append({'id': pk, 'stub': pending})
+            pending = []
+        else:
+            pending.append({'title': title, 'colspan': 1, 'rowspan': row_leaves[pk], 'group': pk})
+
+    return {
+        'id': table.pk,
+        'title': table.title,
+        'stub_width': stub_width,
+        'header': header,
+        'columns': column_ids,
+        'rows': body,
+    }
+
+
+def build_template_layout(template_id):
+    """
+    Раскладка всех таблиц шаблона; структура загружается
+    по одному запросу на модель, независимо от глубины вложенности групп.
+    """
+    def by_table(queryset, *fields):
+        result = {}
+        for table_id, *values in queryset.values_list('table_id', *fields):
+            result.setdefault(table_id, []).append(tuple(values))
+        return result
+
+    scope = {'table__report_id': template_id}
+    row_groups = by_table(RowGroup.objects.filter(**scope).tree(), 'id', 'parent_group_id', 'order', 'title')
+    rows = by_table(RowTemplate.objects.filter(**scope), 'id', 'group_id', 'order', 'title')
+    column_groups = by_table(ColumnGroup.objects.filter(**scope).tree(), 'id', 'parent_group_id', 'order', 'title')
+    columns = by_table(ColumnTemplate.objects.filter(**scope), 'id', 'group_id', 'order', 'title')
+
+    return [
+        build_table_layout(
+            table,
+            row_groups.get(table.pk, []),
+            rows.get(table.pk, []),
+            column_groups.get(table.pk, []),
+            columns.get(table.pk, [])
+        )
+        for table in TableTemplate.objects.filter(report_id=template_id).only('id', 'title', 'order')
+    ]
@@ -0,0 +1,27 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from report_template.models import ReportTemplate
+from report_template.transfer import export_template
+
+
+class Command(BaseCommand):
+    help = "Выгрузка шаблона отчёта со всей структурой в JSON-документ."
+
+    def add_arguments(self, parser):
+        parser.add_argument('template_id', type=int)
+        parser.add_argument('-o', '--output', help="Файл для записи (по умолчанию — stdout)")
+
+    def handle(self, *args, **options):
+        try:
+            document = export_template(options['template_id'])
+        except ReportTemplate.DoesNotExist:
+            raise CommandError(f"Шаблон {options['template_id']} не найден")
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(document, output, ensure_ascii=False)
+            self.stderr.write(f"Шаблон записан в {options['output']}")
+        else:
+            self.stdout.write(json.dumps(document, ensure_ascii=False))
@@ -0,0 +1,39 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from report_template.transfer import import_template, TemplateImportError
+
+
+class Command(BaseCommand):
+    help = (
+        "Загрузка шаблона отчёта из JSON-документа (формат export_report_template). "
+        "Создаёт новый шаблон в одной транзакции."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Путь к JSON-документу")
+        parser.add_argument('--title', help="Название нового шаблона вместо указанного в документе")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8') as source:
+                document = json.load(source)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Не удалось прочитать документ: {e}")
+
+        started = time.perf_counter()
+        try:
+            template, counts = import_template(document, title=options['title'])
+        except TemplateImportError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"Таблиц: {counts['tables']}, групп строк: {counts['row_groups']}, строк: {counts['rows']}, "
+            f"групп столбцов: {counts['column_groups']}, столбцов: {counts['columns']}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Создан шаблон {template.pk} «{template.title}» за {elapsed:.2f} с"
+        ))
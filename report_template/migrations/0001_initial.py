@@ -0,0 +1,114 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255, verbose_name='Название')),
+                ('description', models.TextField(blank=True, null=True, verbose_name='Описание')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активность')),
+            ],
+            options={
+                'verbose_name': 'Шаблон отчета',
+                'verbose_name_plural': 'Шаблоны отчетов',
+            },
+        ),
+        migrations.CreateModel(
+            name='ColumnGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveIntegerField(default=0, verbose_name='Порядок')),
+                ('title', models.CharField(max_length=255, verbose_name='Название группы')),
+                ('parent_group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subgroups', to='report_template.columngroup', verbose_name='Родительская группа')),
+            ],
+            options={
+                'verbose_name': 'Группа столбцов',
+                'verbose_name_plural': 'Группы столбцов',
+                'ordering': ['order'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RowGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveIntegerField(default=0, verbose_name='Порядок')),
+                ('title', models.CharField(max_length=255, verbose_name='Название группы')),
+                ('parent_group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subgroups', to='report_template.rowgroup', verbose_name='Родительская группа')),
+            ],
+            options={
+                'verbose_name': 'Группа строк',
+                'verbose_name_plural': 'Группы строк',
+                'ordering': ['order'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TableTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveIntegerField(default=0, verbose_name='Порядок')),
+                ('title', models.CharField(max_length=255, verbose_name='Название')),
+                ('description', models.TextField(blank=True, null=True, verbose_name='Описание')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активность')),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tables', to='report_template.reporttemplate', verbose_name='Отчет')),
+            ],
+            options={
+                'verbose_name': 'Шаблон таблицы',
+                'verbose_name_plural': 'Шаблоны таблиц',
+                'ordering': ['order'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RowTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveIntegerField(default=0, verbose_name='Порядок')),
+                ('title', models.CharField(max_length=255, verbose_name='Название')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активность')),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rows', to='report_template.rowgroup', verbose_name='Группа')),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='report_template.tabletemplate', verbose_name='Таблица')),
+            ],
+            options={
+                'verbose_name': 'Строка',
+                'verbose_name_plural': 'Строки',
+                'ordering': ['order'],
+            },
+        ),
+        migrations.AddField(
+            model_name='rowgroup',
+            name='table',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='row_groups', to='report_template.tabletemplate', verbose_name='Таблица'),
+        ),
+        migrations.CreateModel(
+            name='ColumnTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveIntegerField(default=0, verbose_name='Порядок')),
+                ('title', models.CharField(max_length=255, verbose_name='Название')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активность')),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='columns', to='report_template.columngroup', verbose_name='Группа')),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='columns', to='report_template.tabletemplate', verbose_name='Таблица')),
+            ],
+            options={
+                'verbose_name': 'Столбец',
+                'verbose_name_plural': 'Столбцы',
+                'ordering': ['order'],
+            },
+        ),
+        migrations.AddField(
+            model_name='columngroup',
+            name='table',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='column_groups', to='report_template.tabletemplate', verbose_name='Таблица'),
+        ),
+    ]
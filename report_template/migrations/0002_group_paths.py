@@ -0,0 +1,61 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:26
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+PATH_STEP = 10
+
+
+def backfill_paths(apps, schema_editor):
+    """
+    Заполняет path/depth существующих групп: связи (id, parent_id)
+    загружаются одним запросом, пути считаются в памяти.
+    """
+    for model_name in ('RowGroup', 'ColumnGroup'):
+        model = apps.get_model('report_template', model_name)
+        parents = dict(model.objects.values_list('id', 'parent_group_id'))
+        paths = {}
+
+        def path_of(pk):
+            if pk not in paths:
+                parent_id = parents[pk]
+                prefix, depth = path_of(parent_id) if parent_id is not None else ('', -1)
+                paths[pk] = (f"{prefix}{pk:0{PATH_STEP}d}/", depth + 1)
+            return paths[pk]
+
+        groups = []
+        for pk in parents:
+            path, depth = path_of(pk)
+            groups.append(model(pk=pk, path=path, depth=depth))
+        model.objects.bulk_update(groups, ['path', 'depth'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report_template', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='columngroup',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Уровень вложенности'),
+        ),
+        migrations.AddField(
+            model_name='columngroup',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255, verbose_name='Путь'),
+        ),
+        migrations.AddField(
+            model_name='rowgroup',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Уровень вложенности'),
+        ),
+        migrations.AddField(
+            model_name='rowgroup',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255, verbose_name='Путь'),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
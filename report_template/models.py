@@ -1,31 +1,337 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Concat, Substr
+from django.dispatch import Signal
 from django.core.exceptions import ValidationError
 
+from report_template.cache import bump_template_version_on_commit
+
+
+# Отправляется после bulk_create_ordered (post_save при массовой вставке
+# не вызывается); аргумент objs — созданные объекты
+items_bulk_created = Signal()
+
+
+# ====== Менеджер с пакетным назначением порядка ====== #
+class OrderedManager(models.Manager):
+    """
+    Менеджер моделей с AutoOrderMixin: пакетная вставка и перенумерация
+    в пределах области нумерации (order_scope) без запроса MAX на каждую запись.
+    Массовые операции не вызывают сигналы, поэтому версия кэша
+    структуры шаблона поднимается здесь явно.
+    """
+
+    def bulk_create_ordered(self, objs, batch_size=None):
+        """
+        bulk_create, который предварительно назначает order объектам с order == 0:
+        максимум order считается одним запросом на все затронутые области,
+        номера раздаются в памяти по порядку следования объектов.
+        """
+        objs = list(objs)
+        if not objs:
+            return objs
+        model = self.model
+        with transaction.atomic(using=self.db):
+            template_ids = model.lock_order_owners({obj.order_owner_id() for obj in objs})
+
+            pending = [obj for obj in objs if obj.order == 0]
+            if pending:
+                attnames = model.order_scope_attnames()
+                max_orders = dict.fromkeys({obj.order_scope_key() for obj in pending}, 0)
+                rows = (
+                    self.filter(**{f"{attnames[0]}__in": {key[0] for key in max_orders}})
+                    .order_by()
+                    .values_list(*attnames)
+                    .annotate(max_order=models.Max('order'))
+                )
+                for *key, max_order in rows:
+                    key = tuple(key)
+                    if key in max_orders:
+                        max_orders[key] = max_order or 0
+                # Явно заданные номера в пачке тоже учитываются
+                for obj in objs:
+                    if obj.order:
+                        key = obj.order_scope_key()
+                        if key in max_orders:
+                            max_orders[key] = max(max_orders[key], obj.order)
+                for obj in pending:
+                    key = obj.order_scope_key()
+                    max_orders[key] += 1
+                    obj.order = max_orders[key]
+
+            created = self.bulk_create(objs, batch_size=batch_size)
+            items_bulk_created.send(sender=model, objs=created)
+
+        for template_id in template_ids:
+            bump_template_version_on_commit(template_id)
+        return created
+
+    def reorder(self, ordered_ids=None, **scope):
+        """
+        Перенумеровывает область (scope — значения полей order_scope,
+        например table=..., group=None) подряд с 1 одним bulk_update.
+        Элементы из ordered_ids идут первыми в указанном порядке,
+        остальные — следом в текущем порядке (order, id).
+        Возвращает число элементов, у которых изменился order.
+        """
+        model = self.model
+        lookup = {}
+        for name in model.order_scope:
+            value = scope[name]
+            lookup[model._meta.get_field(name).attname] = getattr(value, 'pk', value)
+
+        with transaction.atomic(using=self.db):
+            template_ids = model.lock_order_owners({lookup[model.order_scope_attnames()[0]]})
+            items = list(self.filter(**lookup).order_by('order', 'id').only('id', 'order'))
+            if ordered_ids:
+                position = {pk: i for i, pk in enumerate(ordered_ids)}
+                items.sort(key=lambda item: position.get(item.pk, len(position)))
+
+            changed = []
+            for number, item in enumerate(items, start=1):
+                if item.order != number:
+                    item.order = number
+                    changed.append(item)
+            self.bulk_update(changed, ['order'])
+
+        if changed:
+            for template_id in template_ids:
+                bump_template_version_on_commit(template_id)
+        return len(changed)
+
+
 # ====== Миксин для автоназначения порядка ====== #
 class AutoOrderMixin(models.Model):
     """
     Абстрактный миксин для автоматического назначения порядкового номера
     при первом сохранении (когда order=0).
+
+    order_scope — поля, задающие область нумерации; первое из них —
+    владелец области, строка которого блокируется (SELECT ... FOR UPDATE)
+    на время назначения номера, чтобы параллельные вставки в одну область
+    не получили одинаковый order.
+    order_template_field — путь от владельца к id шаблона отчёта.
     """
+    order_scope = ()
+    order_template_field = 'report_id'
+
     order = models.PositiveIntegerField(
         default=0,
         verbose_name="Порядок"
     )
 
+    objects = OrderedManager()
+
     class Meta:
         abstract = True
 
+    @classmethod
+    def order_scope_attnames(cls):
+        return [cls._meta.get_field(name).attname for name in cls.order_scope]
+
+    @classmethod
+    def lock_order_owners(cls, owner_ids):
+        """
+        Блокирует строки владельцев областей (в порядке id, чтобы избежать
+        взаимных блокировок). Возвращает id затронутых шаблонов отчётов.
+        Вызывается внутри транзакции.
+        """
+        owner_model = cls._meta.get_field(cls.order_scope[0]).related_model
+        return set(
+            owner_model._default_manager.select_for_update()
+            .filter(pk__in=owner_ids)
+            .order_by('pk')
+            .values_list(cls.order_template_field, flat=True)
+        )
+
+    def order_owner_id(self):
+        return getattr(self, self.order_scope_attnames()[0])
+
+    def order_scope_key(self):
+        return tuple(getattr(self, attname) for attname in self.order_scope_attnames())
+
     def assign_order(self, filter_kwargs=None):
         """
         Если self.order == 0, ищем max(order) среди объектов,
-        подходящих под filter_kwargs, и ставим order = max+1.
+        подходящих под filter_kwargs (по умолчанию — область order_scope),
+        и ставим order = max+1.
         """
         if self.order == 0:
             if filter_kwargs is None:
-                filter_kwargs = {}
+                filter_kwargs = dict(zip(self.order_scope_attnames(), self.order_scope_key()))
             max_val = self.__class__.objects.filter(**filter_kwargs).aggregate(models.Max('order'))['order__max']
             self.order = (max_val or 0) + 1
 
+    def save(self, *args, **kwargs):
+        if self.order != 0:
+            return super().save(*args, **kwargs)
+        using = kwargs.get('using') or self.__class__.objects.db
+        with transaction.atomic(using=using):
+            self.lock_order_owners([self.order_owner_id()])
+            self.assign_order()
+            super().save(*args, **kwargs)
+
+
+# ====== Материализованный путь групп ====== #
+# Путь группы — id всех её предков и её собственный id, дополненные нулями
+# до PATH_STEP знаков и разделённые «/», например "0000000003/0000000012/".
+# Сортировка по пути даёт обход дерева в глубину, а потомки группы —
+# это группы, путь которых начинается с её пути.
+PATH_STEP = 10
+PATH_MAX_LENGTH = 255
+# Сколько уровней групп помещается в путь (корневые группы — первый уровень)
+MAX_GROUP_DEPTH = PATH_MAX_LENGTH // (PATH_STEP + 1)
+
+
+def group_path_ids(path):
+    return [int(part) for part in path.split('/') if part]
+
+
+class GroupQuerySet(models.QuerySet):
+    def descendants(self, group, include_self=False):
+        """
+        Все потомки группы (на любой глубине) одним запросом.
+        """
+        qs = self.filter(path__startswith=group.path)
+        return qs if include_self else qs.exclude(pk=group.pk)
+
+    def ancestors(self, group, include_self=False):
+        """
+        Предки группы от корня вниз одним запросом.
+        """
+        ids = group_path_ids(group.path)
+        if not include_self:
+            ids = ids[:-1]
+        return self.filter(pk__in=ids).order_by('depth')
+
+    def tree(self):
+        """
+        Группы по уровням: сначала корневые, затем их подгруппы и т.д.,
+        внутри уровня — по order. Родитель всегда идёт раньше потомков.
+        """
+        return self.order_by('depth', 'order', 'id')
+
+
+class GroupManager(OrderedManager.from_queryset(GroupQuerySet)):
+    def bulk_create_ordered(self, objs, batch_size=None):
+        """
+        Дополнительно заполняет path/depth созданных групп одним bulk_update.
+        Родительская группа должна быть сохранена раньше или идти
+        в objs раньше своих подгрупп.
+        """
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create_ordered(objs, batch_size=batch_size)
+
+            parent_field = self.model._meta.get_field('parent_group')
+            known = {}
+            for obj in created:
+                if obj.parent_group_id is not None and parent_field.is_cached(obj):
+                    known[obj.parent_group_id] = (obj.parent_group.path, obj.parent_group.depth)
+            missing = {obj.parent_group_id for obj in created} - set(known) - {obj.pk for obj in created} - {None}
+            if missing:
+                known.update(
+                    (pk, (path, depth))
+                    for pk, path, depth in self.filter(pk__in=missing).values_list('pk', 'path', 'depth')
+                )
+
+            for obj in created:
+                obj.set_path(*known.get(obj.parent_group_id, ('', -1)))
+                if len(obj.path) > PATH_MAX_LENGTH:
+                    # Вставка откатывается вместе с транзакцией
+                    raise ValidationError("Превышена допустимая глубина вложенности групп.")
+                known[obj.pk] = (obj.path, obj.depth)
+            self.bulk_update(created, ['path', 'depth'], batch_size=batch_size)
+        return created
+
+
+class GroupPathMixin(models.Model):
+    """
+    Абстрактный миксин групп с материализованным путём (path) и глубиной (depth).
+    Путь поддерживается при сохранении: для новой группы он дописывается
+    после вставки, при переносе в другую группу пути всех потомков
+    обновляются одним UPDATE.
+    """
+    path = models.CharField(
+        max_length=PATH_MAX_LENGTH,
+        default='',
+        editable=False,
+        db_index=True,
+        verbose_name="Путь"
+    )
+    depth = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Уровень вложенности"
+    )
+
+    objects = GroupManager()
+
+    class Meta:
+        abstract = True
+
+    def set_path(self, parent_path='', parent_depth=-1):
+        self.path = f"{parent_path}{self.pk:0{PATH_STEP}d}/"
+        self.depth = parent_depth + 1
+
+    def stored_paths(self, manager=None):
+        """
+        Пути и глубины группы и её родителя, прочитанные из базы: объекты
+        в памяти могут устареть после переноса их предков.
+        Возвращает ((path, depth) группы, (path, depth) родителя).
+        """
+        manager = manager or self.__class__._default_manager
+        ids = {self.pk, self.parent_group_id} - {None}
+        stored = {
+            pk: (path, depth)
+            for pk, path, depth in (
+                manager.filter(pk__in=ids).values_list('pk', 'path', 'depth') if ids else []
+            )
+        }
+        return stored.get(self.pk, ('', 0)), stored.get(self.parent_group_id, ('', -1))
+
+    def check_parent(self, old_path, parent_path):
+        """
+        ValidationError, если перенос к родителю создаёт цикл
+        или превышает допустимую глубину вложенности.
+        """
+        if self.parent_group_id is None:
+            return
+        if old_path and parent_path.startswith(old_path):
+            raise ValidationError(
+                {'parent_group': "Группа не может быть вложена в саму себя или в свою подгруппу."}
+            )
+        if len(parent_path) + PATH_STEP + 1 > PATH_MAX_LENGTH:
+            raise ValidationError({'parent_group': "Превышена допустимая глубина вложенности групп."})
+
+    def clean(self):
+        super().clean()
+        (old_path, _), (parent_path, _) = self.stored_paths()
+        self.check_parent(old_path, parent_path)
+
+    def save(self, *args, **kwargs):
+        manager = self.__class__._default_manager
+        with transaction.atomic(using=kwargs.get('using') or manager.db):
+            (old_path, old_depth), (parent_path, parent_depth) = self.stored_paths(manager)
+            # Формы проверяют то же в clean(); здесь — защита от записи
+            # в обход валидации (API, скрипты)
+            self.check_parent(old_path, parent_path)
+
+            super().save(*args, **kwargs)
+            self.set_path(parent_path, parent_depth)
+            if self.path == old_path:
+                return
+
+            manager.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+            if old_path:
+                # Группа перенесена: заменяем префикс пути у всех потомков
+                manager.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(
+                        models.Value(self.path),
+                        Substr('path', len(old_path) + 1),
+                        output_field=models.CharField()
+                    ),
+                    depth=models.F('depth') + (self.depth - old_depth)
+                )
+
 
 # ====== Основная модель отчёта ====== #
 class ReportTemplate(models.Model):
@@ -60,10 +366,9 @@ class TableTemplate(AutoOrderMixin):
     description = models.TextField(blank=True, null=True, verbose_name="Описание")
     is_active = models.BooleanField(default=True, verbose_name="Активность")
 
-    def save(self, *args, **kwargs):
-        # Автоназначение order (если ==0) в рамках одного отчёта
-        self.assign_order(filter_kwargs={'report': self.report})
-        super().save(*args, **kwargs)
+    # Автоназначение order (если ==0) в рамках одного отчёта
+    order_scope = ('report',)
+    order_template_field = 'pk'
 
     def __str__(self):
         return f"{self.title} (Отчет: {self.report.title})"
@@ -75,7 +380,7 @@ class TableTemplate(AutoOrderMixin):
 
 
 # ====== Группы строк ====== #
-class RowGroup(AutoOrderMixin):
+class RowGroup(GroupPathMixin, AutoOrderMixin):
     table = models.ForeignKey(
         TableTemplate,
         on_delete=models.CASCADE,
@@ -92,13 +397,8 @@ class RowGroup(AutoOrderMixin):
     )
     title = models.CharField(max_length=255, verbose_name="Название группы")
 
-    def save(self, *args, **kwargs):
-        # Если order == 0, подставляем max+1 в рамках (table, parent_group)
-        self.assign_order(filter_kwargs={
-            'table': self.table,
-            'parent_group': self.parent_group
-        })
-        super().save(*args, **kwargs)
+    # Если order == 0, подставляем max+1 в рамках (table, parent_group)
+    order_scope = ('table', 'parent_group')
 
     def __str__(self):
         parent_info = f" -> {self.parent_group.title}" if self.parent_group else ""
@@ -129,18 +429,9 @@ class RowTemplate(AutoOrderMixin):
     title = models.CharField(max_length=255, verbose_name="Название")
     is_active = models.BooleanField(default=True, verbose_name="Активность")
 
-    def save(self, *args, **kwargs):
-        # Формируем фильтр для assign_order
-        # Если group задана, то ищем max(order) внутри этой группы
-        # Если group нет, то ищем max(order) среди строк без группы
-        filter_kwargs = {'table': self.table}
-        if self.group:
-            filter_kwargs['group'] = self.group
-        else:
-            filter_kwargs['group__isnull'] = True
-
-        self.assign_order(filter_kwargs=filter_kwargs)
-        super().save(*args, **kwargs)
+    # Если group задана, то ищем max(order) внутри этой группы
+    # Если group нет, то ищем max(order) среди строк без группы
+    order_scope = ('table', 'group')
 
     def __str__(self):
         g = self.group.title if self.group else "Без группы"
@@ -153,7 +444,7 @@ class RowTemplate(AutoOrderMixin):
 
 
 # ====== Группы столбцов ====== #
-class ColumnGroup(AutoOrderMixin):
+class ColumnGroup(GroupPathMixin, AutoOrderMixin):
     table = models.ForeignKey(
         TableTemplate,
         on_delete=models.CASCADE,
@@ -170,12 +461,7 @@ class ColumnGroup(AutoOrderMixin):
     )
     title = models.CharField(max_length=255, verbose_name="Название группы")
 
-    def save(self, *args, **kwargs):
-        self.assign_order(filter_kwargs={
-            'table': self.table,
-            'parent_group': self.parent_group
-        })
-        super().save(*args, **kwargs)
+    order_scope = ('table', 'parent_group')
 
     def __str__(self):
         parent_info = f" -> {self.parent_group.title}" if self.parent_group else ""
@@ -206,14 +492,7 @@ class ColumnTemplate(AutoOrderMixin):
     title = models.CharField(max_length=255, verbose_name="Название")
     is_active = models.BooleanField(default=True, verbose_name="Активность")
 
-    def save(self, *args, **kwargs):
-        filter_kwargs = {'table': self.table}
-        if self.group:
-            filter_kwargs['group'] = self.group
-        else:
-            filter_kwargs['group__isnull'] = True
-        self.assign_order(filter_kwargs=filter_kwargs)
-        super().save(*args, **kwargs)
+    order_scope = ('table', 'group')
 
     def __str__(self):
         g = self.group.title if self.group else "Без группы"
@@ -0,0 +1,73 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from report_template.cache import bump_template_version_on_commit
+from report_template.models import (
+    ReportTemplate,
+    TableTemplate,
+    RowGroup,
+    RowTemplate,
+    ColumnGroup,
+    ColumnTemplate
+)
+
+
+def bump_once_per_delete(origin, template_id):
+    """
+    Поднимает версию шаблона один раз на вызов delete(): post_delete
+    приходит на каждую удалённую запись, а origin — объект или QuerySet,
+    с которого началось удаление, — общий для всех них.
+    """
+    bumped = origin.__dict__.setdefault('_bumped_template_ids', set())
+    if template_id not in bumped:
+        bumped.add(template_id)
+        bump_template_version_on_commit(template_id)
+
+
+@receiver(post_save, sender=ReportTemplate)
+def report_template_saved(sender, instance, **kwargs):
+    bump_template_version_on_commit(instance.pk)
+
+
+@receiver(post_delete, sender=ReportTemplate)
+def report_template_deleted(sender, instance, origin, **kwargs):
+    bump_once_per_delete(origin, instance.pk)
+
+
+@receiver(post_save, sender=TableTemplate)
+def table_template_saved(sender, instance, **kwargs):
+    bump_template_version_on_commit(instance.report_id)
+
+
+@receiver(post_delete, sender=TableTemplate)
+def table_template_deleted(sender, instance, origin, **kwargs):
+    bump_once_per_delete(origin, instance.report_id)
+
+
+@receiver(post_save, sender=RowGroup)
+@receiver(post_save, sender=RowTemplate)
+@receiver(post_save, sender=ColumnGroup)
+@receiver(post_save, sender=ColumnTemplate)
+def table_structure_saved(sender, instance, **kwargs):
+    bump_template_version_on_commit(instance.table.report_id)
+
+
+@receiver(post_delete, sender=RowGroup)
+@receiver(post_delete, sender=RowTemplate)
+@receiver(post_delete, sender=ColumnGroup)
+@receiver(post_delete, sender=ColumnTemplate)
+def table_structure_deleted(sender, instance, origin, **kwargs):
+    deleted_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if issubclass(deleted_model, (ReportTemplate, TableTemplate)):
+        # Каскадное удаление: версию поднимет сигнал самой таблицы или шаблона
+        return
+    # Шаблон каждой таблицы ищется один раз на вызов delete()
+    templates = origin.__dict__.setdefault('_template_ids_by_table', {})
+    if instance.table_id not in templates:
+        templates[instance.table_id] = (
+            TableTemplate.objects.filter(pk=instance.table_id).values_list('report_id', flat=True).first()
+        )
+    template_id = templates[instance.table_id]
+    if template_id is not None:
+        bump_once_per_delete(origin, template_id)
@@ -1,3 +1,277 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from report_template.cache import get_template_version
+from report_template.models import (
+    MAX_GROUP_DEPTH,
+    PATH_MAX_LENGTH,
+    ReportTemplate,
+    TableTemplate,
+    RowGroup,
+    RowTemplate,
+    ColumnGroup,
+    ColumnTemplate
+)
+
+
+def create_nested_template(title, depth=3, tables=2):
+    """
+    Шаблон с несколькими таблицами и цепочкой вложенных групп строк/столбцов
+    глубиной depth; в каждой группе по одной строке/столбцу.
+    """
+    template = ReportTemplate.objects.create(title=title)
+    for t in range(tables):
+        table = TableTemplate.objects.create(report=template, title=f"Таблица {t}")
+        row_parent = col_parent = None
+        for level in range(depth):
+            row_parent = RowGroup.objects.create(
+                table=table, parent_group=row_parent, title=f"Группа строк {level}"
+            )
+            RowTemplate.objects.create(table=table, group=row_parent, title=f"Строка {level}")
+            col_parent = ColumnGroup.objects.create(
+                table=table, parent_group=col_parent, title=f"Группа столбцов {level}"
+            )
+            ColumnTemplate.objects.create(table=table, group=col_parent, title=f"Столбец {level}")
+        RowTemplate.objects.create(table=table, title="Строка без группы")
+        ColumnTemplate.objects.create(table=table, title="Столбец без группы")
+    return template
+
+
+class ReportTemplateApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_list_query_count_does_not_depend_on_depth(self):
+        # 1 запрос на шаблоны + по одному на таблицы, группы строк, строки,
+        # группы столбцов и столбцы
+        create_nested_template("Мелкий", depth=1)
+        with self.assertNumQueries(6):
+            self.client.get('/api/report_templates/')
+
+        create_nested_template("Глубокий", depth=5, tables=3)
+        with self.assertNumQueries(6):
+            response = self.client.get('/api/report_templates/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_nested_structure(self):
+        template = create_nested_template("Шаблон", depth=3, tables=1)
+        response = self.client.get(f'/api/report_templates/{template.pk}/')
+        self.assertEqual(response.status_code, 200)
+
+        table = response.json()['tables'][0]
+        self.assertEqual(len(table['rows']), 4)
+        self.assertEqual(len(table['row_groups']), 3)
+
+        top = next(g for g in table['row_groups'] if g['title'] == "Группа строк 0")
+        self.assertEqual([r['title'] for r in top['rows']], ["Строка 0"])
+        level1 = top['subgroups'][0]
+        self.assertEqual(level1['title'], "Группа строк 1")
+        level2 = level1['subgroups'][0]
+        self.assertEqual([r['title'] for r in level2['rows']], ["Строка 2"])
+        self.assertEqual(level2['subgroups'], [])
+
+        top_col = next(g for g in table['column_groups'] if g['title'] == "Группа столбцов 0")
+        self.assertEqual(top_col['subgroups'][0]['columns'][0]['title'], "Столбец 1")
+
+
+class AutoOrderTests(TestCase):
+    def setUp(self):
+        template = ReportTemplate.objects.create(title="Шаблон")
+        self.table = TableTemplate.objects.create(report=template, title="Таблица")
+        self.group = RowGroup.objects.create(table=self.table, title="Группа")
+
+    def test_bulk_create_ordered_numbers_each_scope(self):
+        RowTemplate.objects.create(table=self.table, title="Существующая")
+        rows = [
+            RowTemplate(table=self.table, group=self.group if i % 2 else None, title=f"Строка {i}")
+            for i in range(6)
+        ]
+        # Блокировка таблицы, один агрегат на все области и вставка
+        # (плюс SAVEPOINT/RELEASE транзакции)
+        with self.assertNumQueries(5):
+            RowTemplate.objects.bulk_create_ordered(rows)
+
+        ungrouped = RowTemplate.objects.filter(table=self.table, group=None).order_by('order')
+        self.assertEqual(list(ungrouped.values_list('order', flat=True)), [1, 2, 3, 4])
+        grouped = RowTemplate.objects.filter(group=self.group).order_by('order')
+        self.assertEqual(list(grouped.values_list('title', flat=True)), ["Строка 1", "Строка 3", "Строка 5"])
+        self.assertEqual(list(grouped.values_list('order', flat=True)), [1, 2, 3])
+
+    def test_reorder_renumbers_scope(self):
+        rows = RowTemplate.objects.bulk_create_ordered(
+            [RowTemplate(table=self.table, title=f"Строка {i}", order=i * 10) for i in range(1, 4)]
+        )
+        changed = RowTemplate.objects.reorder(ordered_ids=[rows[2].pk], table=self.table, group=None)
+        self.assertEqual(changed, 3)
+        self.assertEqual(
+            list(RowTemplate.objects.filter(table=self.table).order_by('order').values_list('title', 'order')),
+            [("Строка 3", 1), ("Строка 1", 2), ("Строка 2", 3)]
+        )
+
+
+class TemplateTransferTests(TestCase):
+    def test_export_import_round_trip(self):
+        template = create_nested_template("Исходный", depth=3, tables=2)
+        client = APIClient()
+        document = client.get(f'/api/report_templates/{template.pk}/export/').json()
+
+        response = client.post('/api/report_templates/import/?title=Копия', document, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['rows'], 8)
+        self.assertEqual(response.json()['column_groups'], 6)
+
+        copy = ReportTemplate.objects.get(pk=response.json()['id'])
+        self.assertEqual(copy.title, "Копия")
+        copied = client.get(f'/api/report_templates/{copy.pk}/export/').json()
+        self.assertEqual(copied, {**document, 'title': "Копия"})
+
+    def test_group_depth_is_limited(self):
+        def document(depth):
+            group = {'title': f"Группа {depth}"}
+            for level in range(depth - 1, 0, -1):
+                group = {'title': f"Группа {level}", 'subgroups': [group]}
+            return {'title': "Шаблон", 'tables': [{'title': "Таблица", 'row_groups': [group]}]}
+
+        client = APIClient()
+        response = client.post('/api/report_templates/import/', document(MAX_GROUP_DEPTH), format='json')
+        self.assertEqual(response.status_code, 201)
+        deepest = RowGroup.objects.order_by('-depth').first()
+        self.assertEqual(deepest.depth, MAX_GROUP_DEPTH - 1)
+        self.assertLessEqual(len(deepest.path), PATH_MAX_LENGTH)
+
+        response = client.post('/api/report_templates/import/', document(MAX_GROUP_DEPTH + 1), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("глубина вложенности", response.json()['error'])
+        self.assertEqual(ReportTemplate.objects.count(), 1)
+
+    def test_invalid_document_creates_nothing(self):
+        document = {'title': "Шаблон", 'tables': [{'title': "Таблица", 'rows': [{'order': 1}]}]}
+        response = APIClient().post('/api/report_templates/import/', document, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("document.tables[0].rows[0].title", response.json()['error'])
+        self.assertFalse(ReportTemplate.objects.exists())
+
+
+class GroupPathTests(TestCase):
+    def setUp(self):
+        template = ReportTemplate.objects.create(title="Шаблон")
+        self.table = TableTemplate.objects.create(report=template, title="Таблица")
+
+    def test_move_updates_descendants(self):
+        top = RowGroup.objects.create(table=self.table, title="Верхняя")
+        middle = RowGroup.objects.create(table=self.table, parent_group=top, title="Средняя")
+        leaf = RowGroup.objects.create(table=self.table, parent_group=middle, title="Нижняя")
+        other = RowGroup.objects.create(table=self.table, title="Другая")
+
+        self.assertEqual(list(RowGroup.objects.descendants(top)), [middle, leaf])
+        self.assertEqual(list(RowGroup.objects.ancestors(leaf)), [top, middle])
+
+        middle.parent_group = other
+        middle.save()
+        leaf.refresh_from_db()
+        self.assertEqual(leaf.depth, 2)
+        self.assertEqual(list(RowGroup.objects.ancestors(leaf)), [other, middle])
+        self.assertEqual(list(RowGroup.objects.descendants(top)), [])
+        self.assertEqual(
+            [group.title for group in RowGroup.objects.filter(table=self.table).tree()],
+            ["Верхняя", "Другая", "Средняя", "Нижняя"]
+        )
+
+        # Перенос в собственную подгруппу создал бы цикл
+        other.parent_group = leaf
+        with self.assertRaises(ValidationError):
+            other.save()
+
+    def test_cycle_is_a_form_error(self):
+        top = RowGroup.objects.create(table=self.table, title="Верхняя")
+        leaf = RowGroup.objects.create(table=self.table, parent_group=top, title="Нижняя")
+
+        top.parent_group = leaf
+        with self.assertRaises(ValidationError) as raised:
+            top.full_clean()
+        self.assertIn('parent_group', raised.exception.message_dict)
+
+        admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.post(f'/admin/report_template/rowgroup/{top.pk}/change/', {
+            'table': self.table.pk, 'parent_group': leaf.pk, 'title': top.title, 'order': top.order,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('parent_group', response.context['adminform'].form.errors)
+        top.refresh_from_db()
+        self.assertIsNone(top.parent_group_id)
+
+
+class TemplateLayoutTests(TestCase):
+    def test_layout_spans_follow_groups(self):
+        template = create_nested_template("Шаблон", depth=2, tables=1)
+        client = APIClient()
+        with self.assertNumQueries(6):
+            response = client.get(f'/api/report_templates/{template.pk}/layout/')
+        table = response.json()['tables'][0]
+
+        # Угловая ячейка, группа над двумя столбцами, столбец без группы на всю высоту
+        self.assertEqual(
+            [(cell['title'], cell['colspan'], cell['rowspan']) for cell in table['header'][0]],
+            [("", 3, 3), ("Группа столбцов 0", 2, 1), ("Столбец без группы", 1, 3)]
+        )
+        self.assertEqual(len(table['columns']), 3)
+        self.assertEqual(
+            [(cell['title'], cell['colspan'], cell['rowspan']) for cell in table['rows'][0]['stub']],
+            [("Группа строк 0", 1, 2), ("Группа строк 1", 1, 1), ("Строка 1", 1, 1)]
+        )
+
+        # Повторный запрос обслуживается из кэша, изменение структуры сбрасывает его
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                client.get(f'/api/report_templates/{template.pk}/layout/', HTTP_IF_NONE_MATCH=etag).status_code,
+                304
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            ColumnTemplate.objects.create(table_id=table['id'], title="Новый столбец")
+        response = client.get(f'/api/report_templates/{template.pk}/layout/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['tables'][0]['columns']), 4)
+
+    def test_version_is_bumped_after_commit(self):
+        template = create_nested_template("Шаблон", depth=1, tables=1)
+        table = template.tables.get()
+        version = get_template_version(template.pk)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            ColumnTemplate.objects.create(table=table, title="Новый столбец")
+            # До фиксации транзакции читатели видят прежнюю версию
+            self.assertEqual(get_template_version(template.pk), version)
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+        bumped = get_template_version(template.pk)
+        self.assertNotEqual(bumped, version)
+        self.assertGreater(bumped, version)
+
+        # Удаление тоже поднимает версию, и тоже только после фиксации
+        with self.captureOnCommitCallbacks() as callbacks:
+            ColumnTemplate.objects.filter(table=table, title="Новый столбец").delete()
+        self.assertEqual(get_template_version(template.pk), bumped)
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertNotEqual(get_template_version(template.pk), bumped)
+
+    def test_delete_query_count_does_not_depend_on_size(self):
+        counts = []
+        for depth in (1, 6):
+            template = create_nested_template(f"Шаблон {depth}", depth=depth, tables=1)
+            table = template.tables.get()
+            with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks() as callbacks:
+                RowTemplate.objects.filter(table=table).delete()
+                table.delete()
+            counts.append(len(queries))
+            # Одна смена версии на каждый вызов delete(), а не на каждую запись
+            self.assertEqual(len(callbacks), 2)
+        self.assertEqual(counts[0], counts[1])
@@ -0,0 +1,199 @@
+from django.db import transaction
+
+from report_template.models import (
+    MAX_GROUP_DEPTH,
+    ReportTemplate,
+    TableTemplate,
+    RowGroup,
+    RowTemplate,
+    ColumnGroup,
+    ColumnTemplate
+)
+from report_template.utils import template_structure_prefetch, attach_group_tree
+
+# Версия формата документа шаблона
+FORMAT_VERSION = 1
+
+# Размер пачки при массовой вставке элементов шаблона
+IMPORT_BATCH_SIZE = 1000
+
+
+class TemplateImportError(ValueError):
+    """
+    Документ шаблона не соответствует формату.
+    """
+
+
+# ====== Выгрузка ====== #
+def _export_item(item):
+    return {'title': item.title, 'order': item.order, 'is_active': item.is_active}
+
+
+def _export_group(group, items_name):
+    return {
+        'title': group.title,
+        'order': group.order,
+        'subgroups': [_export_group(sub, items_name) for sub in group.subgroups.all()],
+        items_name: [_export_item(item) for item in getattr(group, items_name).all()],
+    }
+
+
+def export_template(template_id):
+    """
+    Выгружает шаблон со всей структурой в один JSON-совместимый документ:
+    таблицы, вложенные группы строк/столбцов, строки и столбцы.
+    Строки и столбцы группы лежат внутри неё, верхние rows/columns таблицы —
+    элементы без группы. Структура загружается по одному запросу на модель.
+    """
+    template = ReportTemplate.objects.prefetch_related(*template_structure_prefetch()).get(pk=template_id)
+    tables = []
+    for table in template.tables.all():
+        attach_group_tree(table)
+        tables.append({
+            'title': table.title,
+            'description': table.description,
+            'is_active': table.is_active,
+            'order': table.order,
+            'row_groups': [
+                _export_group(group, 'rows')
+                for group in table.row_groups.all() if group.parent_group_id is None
+            ],
+            'rows': [_export_item(row) for row in table.rows.all() if row.group_id is None],
+            'column_groups': [
+                _export_group(group, 'columns')
+                for group in table.column_groups.all() if group.parent_group_id is None
+            ],
+            'columns': [_export_item(column) for column in table.columns.all() if column.group_id is None],
+        })
+    return {
+        'format': FORMAT_VERSION,
+        'title': template.title,
+        'description': template.description,
+        'is_active': template.is_active,
+        'tables': tables,
+    }
+
+
+# ====== Проверка документа ====== #
+def _field(data, key, kind, path, default=None, required=False):
+    if not isinstance(data, dict):
+        raise TemplateImportError(f"{path}: ожидается объект.")
+    if key not in data or data[key] is None:
+        if required:
+            raise TemplateImportError(f"{path}.{key}: обязательное поле.")
+        return default
+    value = data[key]
+    # bool — подкласс int, поэтому проверяется отдельно
+    if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+        raise TemplateImportError(f"{path}.{key}: некорректный тип значения.")
+    if kind is int and value < 0:
+        raise TemplateImportError(f"{path}.{key}: значение не может быть отрицательным.")
+    if kind is str and key == 'title' and not 0 < len(value) <= 255:
+        raise TemplateImportError(f"{path}.{key}: длина должна быть от 1 до 255 символов.")
+    return value
+
+
+def _item_kwargs(data, path):
+    return {
+        'title': _field(data, 'title', str, path, required=True),
+        'order': _field(data, 'order', int, path, default=0),
+        'is_active': _field(data, 'is_active', bool, path, default=True),
+    }
+
+
+# ====== Загрузка ====== #
+def _import_tree(tables, groups_key, items_key, group_model, item_model):
+    """
+    Вставляет группы уровнями (сначала корневые всех таблиц, затем их
+    подгруппы и т.д.) — по одному bulk-запросу на уровень, — а затем
+    все строки/столбцы таблиц одним bulk-запросом.
+    Возвращает (число групп, число элементов).
+    """
+    items = []
+    level = []
+    for table, data, path in tables:
+        for i, group_data in enumerate(_field(data, groups_key, list, path, default=[])):
+            level.append((table, None, group_data, f"{path}.{groups_key}[{i}]"))
+        for i, item_data in enumerate(_field(data, items_key, list, path, default=[])):
+            items.append(item_model(table=table, group=None, **_item_kwargs(item_data, f"{path}.{items_key}[{i}]")))
+
+    groups_count = 0
+    depth = 0
+    while level:
+        depth += 1
+        if depth > MAX_GROUP_DEPTH:
+            # Путь такой группы не поместится в поле path
+            raise TemplateImportError(
+                f"{level[0][3]}: превышена допустимая глубина вложенности групп ({MAX_GROUP_DEPTH})."
+            )
+        groups = [
+            group_model(
+                table=table,
+                parent_group=parent,
+                title=_field(group_data, 'title', str, group_path, required=True),
+                order=_field(group_data, 'order', int, group_path, default=0)
+            )
+            for table, parent, group_data, group_path in level
+        ]
+        group_model.objects.bulk_create_ordered(groups, batch_size=IMPORT_BATCH_SIZE)
+        groups_count += len(groups)
+
+        next_level = []
+        for group, (table, _, group_data, group_path) in zip(groups, level):
+            for i, sub_data in enumerate(_field(group_data, 'subgroups', list, group_path, default=[])):
+                next_level.append((table, group, sub_data, f"{group_path}.subgroups[{i}]"))
+            for i, item_data in enumerate(_field(group_data, items_key, list, group_path, default=[])):
+                items.append(item_model(
+                    table=table, group=group, **_item_kwargs(item_data, f"{group_path}.{items_key}[{i}]")
+                ))
+        level = next_level
+
+    item_model.objects.bulk_create_ordered(items, batch_size=IMPORT_BATCH_SIZE)
+    return groups_count, len(items)
+
+
+def import_template(document, title=None):
+    """
+    Создаёт новый шаблон из документа export_template в одной транзакции.
+    Элементы вставляются пачками в порядке зависимостей: таблицы, группы
+    по уровням вложенности, затем строки и столбцы. Элементы без order
+    (или с order = 0) нумеруются по порядку следования в документе.
+    title переопределяет название шаблона из документа.
+    Возвращает (шаблон, {'tables', 'row_groups', 'rows', 'column_groups', 'columns'}).
+    Ошибки формата — TemplateImportError; при ошибке ничего не сохраняется.
+    """
+    fmt = _field(document, 'format', int, 'document', default=FORMAT_VERSION)
+    if fmt != FORMAT_VERSION:
+        raise TemplateImportError(f"document.format: неподдерживаемая версия формата {fmt}.")
+    tables_data = _field(document, 'tables', list, 'document', default=[])
+
+    with transaction.atomic():
+        template = ReportTemplate.objects.create(
+            title=title or _field(document, 'title', str, 'document', required=True),
+            description=_field(document, 'description', str, 'document'),
+            is_active=_field(document, 'is_active', bool, 'document', default=True)
+        )
+
+        tables = []
+        for i, data in enumerate(tables_data):
+            path = f"document.tables[{i}]"
+            table = TableTemplate(
+                report=template,
+                title=_field(data, 'title', str, path, required=True),
+                description=_field(data, 'description', str, path),
+                is_active=_field(data, 'is_active', bool, path, default=True),
+                order=_field(data, 'order', int, path, default=0)
+            )
+            tables.append((table, data, path))
+        TableTemplate.objects.bulk_create_ordered([table for table, _, _ in tables])
+
+        row_groups, rows = _import_tree(tables, 'row_groups', 'rows', RowGroup, RowTemplate)
+        column_groups, columns = _import_tree(tables, 'column_groups', 'columns', ColumnGroup, ColumnTemplate)
+
+    return template, {
+        'tables': len(tables),
+        'row_groups': row_groups,
+        'rows': rows,
+        'column_groups': column_groups,
+        'columns': columns,
+    }
@@ -0,0 +1,93 @@
+def template_structure_prefetch(prefix=''):
+    """
+    Набор prefetch_related для загрузки всей структуры шаблона
+    (таблицы, группы строк/столбцов, строки, столбцы) — по одному запросу на модель.
+    prefix — путь до ReportTemplate, например '' или 'template__'.
+    """
+    return [
+        f'{prefix}tables',
+        f'{prefix}tables__row_groups',
+        f'{prefix}tables__rows',
+        f'{prefix}tables__column_groups',
+        f'{prefix}tables__columns',
+    ]
+
+
+def _set_prefetched(obj, related_name, items):
+    """
+    Кладёт готовый список объектов в кэш prefetch, как это делает
+    prefetch_related, чтобы obj.<related_name>.all() не ходил в базу.
+    """
+    qs = getattr(obj, related_name).all()
+    qs._result_cache = items
+    qs._prefetch_done = True
+    if not hasattr(obj, '_prefetched_objects_cache'):
+        obj._prefetched_objects_cache = {}
+    obj._prefetched_objects_cache[related_name] = qs
+
+
+def _attach_tree(table, groups, items, items_name):
+    groups_by_parent = {}
+    for group in groups:
+        group.table = table
+        groups_by_parent.setdefault(group.parent_group_id, []).append(group)
+
+    items_by_group = {}
+    for item in items:
+        items_by_group.setdefault(item.group_id, []).append(item)
+
+    for group in groups:
+        _set_prefetched(group, 'subgroups', groups_by_parent.get(group.pk, []))
+        _set_prefetched(group, items_name, items_by_group.get(group.pk, []))
+
+
+def attach_group_tree(table):
+    """
+    Собирает иерархию групп строк и столбцов таблицы в памяти
+    (по parent_group_id и group_id), без запросов на каждый уровень вложенности.
+    Если структура таблицы не была загружена через prefetch, выполняет
+    по одному запросу на модель.
+    """
+    _attach_tree(table, list(table.row_groups.all()), list(table.rows.all()), 'rows')
+    _attach_tree(table, list(table.column_groups.all()), list(table.columns.all()), 'columns')
+
+
+def group_tree(groups):
+    """
+    Для каждой группы считает путь названий от корня и ключ сортировки,
+    задающий обход дерева в глубину с учётом order на каждом уровне.
+    groups: список (id, parent_id, order, title).
+    Возвращает словарь id -> (titles, sort_key).
+    """
+    by_id = {pk: (parent_id, order, title) for pk, parent_id, order, title in groups}
+    tree = {}
+
+    def walk(pk):
+        if pk not in tree:
+            parent_id, order, title = by_id[pk]
+            titles, key = walk(parent_id) if parent_id in by_id else ([], ())
+            tree[pk] = (titles + [title], key + ((order, 0, pk),))
+        return tree[pk]
+
+    for pk in by_id:
+        walk(pk)
+    return tree
+
+
+def display_order(items, tree):
+    """
+    Упорядочивает строки/столбцы так, как они выводятся в форме:
+    элементы группы идут подряд, группы и элементы без группы
+    сортируются по order на своём уровне.
+    items: список (id, group_id, order, title).
+    Возвращает список (id, titles групп, title).
+    """
+    def key(item):
+        pk, group_id, order, _ = item
+        _, group_key = tree.get(group_id, ([], ()))
+        return group_key + ((order, 1, pk),)
+
+    return [
+        (pk, tree.get(group_id, ([], ()))[0], title)
+        for pk, group_id, order, title in sorted(items, key=key)
+    ]
@@ -0,0 +1,106 @@
+from functools import reduce
+from operator import or_
+
+from django.db.models import Count, Q, Sum
+
+from talon.models import Ticket, TicketRollup
+
+# Измерения группировки: имя параметра -> путь в запросе
+DIMENSIONS = {
+    'report_year': 'report_year',
+    'report_month': 'report_month',
+    'goal': 'goal_id',
+    'status': 'status_id',
+    'source': 'source_id',
+    'doctor_code': 'doctor_code_id',
+    'department': 'doctor_code__appointment__department_id',
+}
+
+# Показатели: имя в ответе -> агрегат. Аннотации получают суффикс,
+# так как имена показателей совпадают с полями талона
+METRICS = {
+    'tickets': Count('id'),
+    'visits': Sum('visits'),
+    'visits_in_mo': Sum('visits_in_mo'),
+    'visits_at_home': Sum('visits_at_home'),
+    'amount': Sum('amount'),
+    'sanctions': Sum('sanctions'),
+}
+
+# Те же показатели по сводам: число талонов в своде уже посчитано
+ROLLUP_METRICS = {name: Sum(name) for name in METRICS}
+
+
+def rollup_supports(dimensions):
+    """
+    Можно ли посчитать статистику по сводам: все измерения доступны
+    через поля TicketRollup (отделение — через код врача).
+    """
+    fields = {field.attname for field in TicketRollup._meta.fields}
+    fields |= {field.name for field in TicketRollup._meta.fields}
+    return all(DIMENSIONS[name].split('__')[0] in fields for name in dimensions)
+
+
+def _aggregate(rows, metrics, group_by):
+    annotations = {f"{name}_total": metric for name, metric in metrics.items()}
+    if not group_by:
+        totals = rows.aggregate(**annotations)
+        return [{name: totals[f"{name}_total"] or 0 for name in metrics}]
+
+    paths = [DIMENSIONS[name] for name in group_by]
+    groups = rows.values(*paths).annotate(**annotations).order_by(*paths)
+    return [
+        {
+            **{name: group[path] for name, path in zip(group_by, paths)},
+            **{name: group[f"{name}_total"] for name in metrics},
+        }
+        for group in groups
+    ]
+
+
+def _merge(group_by, *results):
+    """
+    Складывает показатели групп с одинаковыми значениями измерений;
+    группы упорядочены по измерениям (пустые значения первыми).
+    """
+    merged = {}
+    for row in (row for result in results for row in result):
+        key = tuple(row[name] for name in group_by)
+        if key in merged:
+            for name in METRICS:
+                merged[key][name] += row[name]
+        else:
+            merged[key] = dict(row)
+    return [
+        merged[key]
+        for key in sorted(merged, key=lambda key: tuple((value is not None, value) for value in key))
+    ]
+
+
+def aggregate_tickets(group_by=(), filters=None, use_rollup=False, live_periods=()):
+    """
+    Сводит талоны одним сгруппированным запросом: число талонов и суммы
+    посещений, сумм и санкций по каждому сочетанию измерений group_by.
+    filters — {измерение: список допустимых значений}.
+    use_rollup — считать по сводам TicketRollup вместо самих талонов;
+    live_periods — периоды (год, месяц), свод которых устарел: они считаются
+    по самим талонам вторым запросом и складываются со сводами.
+    Без group_by возвращается одна строка с итогами.
+    """
+    tickets = Ticket.objects.all()
+    rollups = TicketRollup.objects.all()
+    for name, values in (filters or {}).items():
+        tickets = tickets.filter(**{f"{DIMENSIONS[name]}__in": values})
+        rollups = rollups.filter(**{f"{DIMENSIONS[name]}__in": values})
+
+    if not use_rollup:
+        return _aggregate(tickets, METRICS, group_by)
+    if not live_periods:
+        return _aggregate(rollups, ROLLUP_METRICS, group_by)
+
+    periods = reduce(or_, (Q(report_year=year, report_month=month) for year, month in sorted(live_periods)))
+    return _merge(
+        group_by,
+        _aggregate(rollups.exclude(periods), ROLLUP_METRICS, group_by),
+        _aggregate(tickets.filter(periods), METRICS, group_by)
+    )
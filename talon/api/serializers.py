@@ -0,0 +1,42 @@
+from rest_framework import serializers
+from talon.models import Ticket
+
+
+class TicketSerializer(serializers.ModelSerializer):
+    """
+    Талон; кроме id связанных объектов отдаются их коды и названия.
+    Необязательный аргумент fields ограничивает набор полей в ответе
+    (используется для ?fields= в списке талонов).
+    """
+    source_name = serializers.CharField(source='source.name', read_only=True)
+    status_code = serializers.CharField(source='status.code', read_only=True)
+    goal_code = serializers.CharField(source='goal.code', read_only=True)
+    doctor = serializers.CharField(source='doctor_code.code', read_only=True)
+    patient_name = serializers.StringRelatedField(source='patient')
+
+    # Поля ответа, которые читаются из связанных моделей:
+    # поле -> (связь для select_related, поля для only())
+    RELATED_FIELDS = {
+        'source_name': ('source', ['source__name']),
+        'status_code': ('status', ['status__code']),
+        'goal_code': ('goal', ['goal__code']),
+        'doctor': ('doctor_code', ['doctor_code__code']),
+        'patient_name': ('patient', ['patient__last_name', 'patient__first_name']),
+    }
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    class Meta:
+        model = Ticket
+        fields = [
+            'id', 'number', 'report_year', 'report_month',
+            'source', 'source_name', 'status', 'status_code', 'goal', 'goal_code',
+            'doctor_code', 'doctor', 'patient', 'patient_name',
+            'treatment_start', 'treatment_end', 'visits', 'visits_in_mo', 'visits_at_home',
+            'diagnosis', 'diagnosis_2', 'diagnosis_3', 'diagnosis_4', 'health_group', 'ksg',
+            'amount', 'sanctions', 'formation_date', 'change_date', 'updated', 'blocked',
+        ]
@@ -0,0 +1,10 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from talon.api.views import TicketViewSet
+
+router = DefaultRouter()
+router.register(r'tickets', TicketViewSet, basename='ticket')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
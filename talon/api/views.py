@@ -0,0 +1,188 @@
+import re
+
+from django.db.models import Q
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from talon.aggregation import DIMENSIONS, aggregate_tickets, rollup_supports
+from talon.models import Ticket, TicketDiagnosis
+from talon.rollup import last_run, outdated_periods
+from talon.api.pagination import TicketKeysetPagination
+from talon.api.serializers import TicketSerializer
+
+
+def parse_id_list(raw):
+    """
+    Разбирает список чисел через запятую ("1,2,3"); None — если формат неверный.
+    """
+    values = [value.strip() for value in raw.split(',') if value.strip()]
+    if not values or not all(value.isdigit() for value in values):
+        return None
+    return [int(value) for value in values]
+
+
+# Код МКБ-10 или его начало: буква, до двух цифр, подрубрика после точки
+ICD_CODE_RE = re.compile(r'^[A-Z](\d{1,2}(\.\d{0,2})?)?$')
+
+
+def parse_icd_filter(raw):
+    """
+    Разбирает фильтр по кодам МКБ-10: через запятую префиксы ("J0")
+    и диапазоны ("J00-J99", границы включают подрубрики).
+    Возвращает Q по TicketDiagnosis.icd_code; None — если формат неверный.
+    Каждое условие — интервал [начало, конец) по коду, поэтому
+    отбор идёт по индексу кода, а не сканированием.
+    """
+    def after(prefix):
+        # Наименьшая строка, большая всех строк с этим префиксом
+        return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+    condition = Q()
+    terms = [term.strip().upper() for term in raw.split(',') if term.strip()]
+    if not terms:
+        return None
+    for term in terms:
+        low, _, high = term.partition('-')
+        low, high = low.strip(), (high.strip() or low.strip())
+        if not ICD_CODE_RE.match(low) or not ICD_CODE_RE.match(high) or low > high:
+            return None
+        condition |= Q(icd_code__gte=low, icd_code__lt=after(high))
+    return condition
+
+
+# Фильтры списка талонов по связанным объектам: параметр -> поле
+TICKET_ID_FILTERS = {
+    'report_year': 'report_year',
+    'report_month': 'report_month',
+    'status': 'status_id',
+    'goal': 'goal_id',
+    'source': 'source_id',
+    'doctor_code': 'doctor_code_id',
+}
+
+
+class TicketViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Эндпоинт для чтения талонов.
+    Связанные объекты загружаются тем же запросом (select_related).
+    """
+    queryset = Ticket.objects.all()
+    serializer_class = TicketSerializer
+    permission_classes = [AllowAny]
+    pagination_class = TicketKeysetPagination
+
+    def get_queryset(self):
+        relations = [relation for relation, _ in TicketSerializer.RELATED_FIELDS.values()]
+        return super().get_queryset().select_related(*relations)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список талонов по ключу (report_year, report_month, id): {"next", "results"}.
+        Следующая страница — по ссылке next (?cursor=...), размер — ?page_size=.
+        Фильтры: ?report_year=&report_month=&status=&goal=&source=&doctor_code=
+        (id или числа через запятую), ?diagnosis=<префикс основного диагноза>,
+        ?icd=J00-J99,I10 — коды МКБ-10 в любом из диагнозов талона (диапазоны
+        и префиксы через запятую), ?blocked=true|false.
+        ?fields=id,number,status_code — вернуть только перечисленные поля;
+        из базы читаются только нужные для них столбцы.
+        """
+        queryset = Ticket.objects.all()
+        params = request.query_params
+
+        for name, field in TICKET_ID_FILTERS.items():
+            raw = params.get(name)
+            if raw:
+                values = parse_id_list(raw)
+                if values is None:
+                    return Response({"error": f"Некорректное значение параметра {name}."}, status=400)
+                queryset = queryset.filter(**{f"{field}__in": values})
+
+        diagnosis = params.get('diagnosis', '').strip().upper()
+        if diagnosis:
+            queryset = queryset.filter(diagnosis__startswith=diagnosis)
+
+        icd = params.get('icd')
+        if icd:
+            condition = parse_icd_filter(icd)
+            if condition is None:
+                return Response({"error": "Некорректный фильтр по кодам МКБ-10."}, status=400)
+            queryset = queryset.filter(id__in=TicketDiagnosis.objects.filter(condition).values('ticket_id'))
+
+        blocked = params.get('blocked')
+        if blocked is not None:
+            if blocked.lower() not in ['true', '1', 'false', '0']:
+                return Response({"error": "Параметр blocked должен быть true или false."}, status=400)
+            queryset = queryset.filter(blocked=blocked.lower() in ['true', '1'])
+
+        fields = None
+        relations = TicketSerializer.RELATED_FIELDS
+        if params.get('fields'):
+            fields = [name.strip() for name in params['fields'].split(',') if name.strip()]
+            unknown = set(fields) - set(TicketSerializer.Meta.fields)
+            if unknown:
+                return Response({"error": f"Неизвестные поля: {', '.join(sorted(unknown))}."}, status=400)
+            relations = {name: relations[name] for name in fields if name in relations}
+            columns = [column for name, (_, related) in relations.items() for column in related]
+            # Поля ключа нужны для курсора пагинации
+            queryset = queryset.only(
+                *TicketKeysetPagination.ordering,
+                *(name for name in fields if name not in TicketSerializer.RELATED_FIELDS),
+                *columns
+            )
+        if relations:
+            # select_related() без аргументов подтянул бы все связи
+            queryset = queryset.select_related(*{relation for relation, _ in relations.values()})
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True, fields=fields)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='stats')
+    def stats(self, request):
+        """
+        Сводная статистика по талонам. URL: /api/tickets/stats/?group_by=report_month,goal&report_year=2024
+        group_by — измерения группировки через запятую: report_year, report_month,
+        goal, status, source, doctor_code, department.
+        Фильтры — те же измерения, значения (id или числа) через запятую.
+        Для каждой группы возвращаются tickets, visits, visits_in_mo,
+        visits_at_home, amount, sanctions; всё считается одним запросом в базе.
+
+        Если своды талонов уже рассчитаны (refresh_ticket_rollups), статистика
+        читается из них; rollup_refreshed_at — время последнего пересчёта.
+        Периоды, изменённые после пересчёта (загрузка, правка или удаление
+        талонов), считаются по самим талонам и перечислены в live_periods.
+        ?live=true — считать всё по самим талонам.
+        """
+        params = request.query_params
+
+        group_by = [name.strip() for name in params.get('group_by', '').split(',') if name.strip()]
+        unknown = set(group_by) - set(DIMENSIONS)
+        if unknown:
+            return Response({"error": f"Неизвестные измерения: {', '.join(sorted(unknown))}."}, status=400)
+        if len(set(group_by)) != len(group_by):
+            return Response({"error": "Измерения группировки не должны повторяться."}, status=400)
+
+        filters = {}
+        for name in DIMENSIONS:
+            raw = params.get(name)
+            if raw:
+                values = parse_id_list(raw)
+                if values is None:
+                    return Response({"error": f"Некорректное значение параметра {name}."}, status=400)
+                filters[name] = values
+
+        run = None
+        live_periods = set()
+        if params.get('live', '').lower() not in ['true', '1'] and rollup_supports([*group_by, *filters]):
+            run = last_run()
+            if run is not None:
+                live_periods = outdated_periods(run)
+
+        return Response({
+            "group_by": group_by,
+            "rollup_refreshed_at": run.finished_at if run else None,
+            "live_periods": [{"report_year": year, "report_month": month} for year, month in sorted(live_periods)],
+            "results": aggregate_tickets(group_by, filters, use_rollup=run is not None, live_periods=live_periods),
+        })
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class TalonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'talon'
+
+    def ready(self):
+        # Пометка периодов сводов талонов для пересчёта
+        from talon import signals  # noqa: F401
@@ -0,0 +1,302 @@
+import csv
+import datetime
+import functools
+import os
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from kadry.models import DoctorCode
+from person.models import InsurancePolicy, PhysicalPerson
+from talon.models import Source, TicketStatus, Goal, Ticket, TicketDiagnosis
+from talon.rollup import mark_stale
+
+# Сколько талонов записывать одним INSERT ... ON CONFLICT
+LOAD_BATCH_SIZE = 2000
+
+# Поля, которые обновляются у существующего талона с тем же номером
+UPDATE_FIELDS = [
+    'source', 'status', 'report_month', 'report_year', 'goal', 'patient',
+    'treatment_start', 'treatment_end', 'visits', 'visits_in_mo', 'visits_at_home',
+    'diagnosis', 'diagnosis_2', 'diagnosis_3', 'diagnosis_4', 'health_group', 'ksg',
+    'amount', 'sanctions', 'doctor_code', 'formation_date', 'change_date', 'updated',
+]
+
+# Колонки выгрузки для справочников и пациента: поле -> допустимые заголовки
+LOOKUP_COLUMNS = {
+    'source': ('source', 'источник'),
+    'status': ('status', 'статус', 'статус талона'),
+    'goal': ('goal', 'цель'),
+    'doctor_code': ('doctor_code', 'код врача'),
+    'enp': ('enp', 'енп'),
+    'snils': ('snils', 'снилс'),
+}
+
+
+class RowError(ValueError):
+    """
+    Строка выгрузки не может быть загружена.
+    """
+
+
+def _column_aliases():
+    """
+    Заголовок колонки (в нижнем регистре) -> имя поля.
+    Для полей талона допускаются имя поля и его verbose_name.
+    """
+    aliases = {}
+    for field in Ticket._meta.concrete_fields:
+        if field.name in UPDATE_FIELDS or field.name == 'number':
+            aliases[field.name] = field.name
+            aliases[str(field.verbose_name).lower()] = field.name
+    for name, headers in LOOKUP_COLUMNS.items():
+        for header in headers:
+            aliases[header] = name
+    return aliases
+
+
+# ====== Чтение выгрузок ====== #
+def iter_csv_rows(path, delimiter=';', encoding='utf-8-sig'):
+    """
+    Построчное чтение CSV: (номер строки, словарь поле -> значение).
+    """
+    aliases = _column_aliases()
+    with open(path, newline='', encoding=encoding) as source:
+        reader = csv.reader(source, delimiter=delimiter)
+        header = next(reader, None)
+        if header is None:
+            return
+        fields = [aliases.get(title.strip().lower()) for title in header]
+        for line_no, values in enumerate(reader, start=2):
+            yield line_no, {name: value for name, value in zip(fields, values) if name}
+
+
+def iter_xlsx_rows(path):
+    """
+    Построчное чтение первого листа XLSX в режиме read_only (без загрузки книги в память).
+    """
+    from openpyxl import load_workbook
+
+    aliases = _column_aliases()
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        fields = [aliases.get(str(title or '').strip().lower()) for title in header]
+        for line_no, values in enumerate(rows, start=2):
+            yield line_no, {name: value for name, value in zip(fields, values) if name}
+    finally:
+        workbook.close()
+
+
+def iter_export_rows(path, **options):
+    if os.path.splitext(path)[1].lower() in ('.xlsx', '.xlsm'):
+        return iter_xlsx_rows(path)
+    return iter_csv_rows(path, **options)
+
+
+# ====== Разбор значений ====== #
+def _text(row, name, required=False):
+    value = row.get(name)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = '' if value is None else str(value).strip()
+    if not value:
+        if required:
+            raise RowError(f"не заполнено поле {name}")
+        return None
+    return value
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date(text):
+    # Даты в выгрузке сильно повторяются, поэтому разбор кэшируется;
+    # strptime не используется — он на порядок медленнее
+    try:
+        if '.' in text:
+            day, month, year = text.split('.')
+            return datetime.date(int(year), int(month), int(day))
+        return datetime.date.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def _date(row, name):
+    value = row.get(name)
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    text = _text(row, name, required=True)
+    date = _parse_date(text)
+    if date is None:
+        raise RowError(f"некорректная дата в поле {name}: {text}")
+    return date
+
+
+def _int(row, name, low=0, high=None):
+    text = _text(row, name, required=True)
+    try:
+        value = int(text)
+    except ValueError:
+        raise RowError(f"некорректное число в поле {name}: {text}")
+    if value < low or (high is not None and value > high):
+        raise RowError(f"значение поля {name} вне допустимого диапазона: {value}")
+    return value
+
+
+def _decimal(row, name):
+    text = _text(row, name)
+    if text is None:
+        return Decimal(0)
+    try:
+        value = Decimal(text.replace(' ', '').replace(',', '.'))
+    except InvalidOperation:
+        raise RowError(f"некорректная сумма в поле {name}: {text}")
+    if not value.is_finite() or value.adjusted() >= 8:
+        raise RowError(f"сумма в поле {name} вне допустимого диапазона: {text}")
+    return value.quantize(Decimal('0.01'))
+
+
+class TicketLoader:
+    """
+    Загрузка талонов из выгрузки реестра.
+
+    Справочники (источники, статусы, цели, коды врачей) загружаются в словари
+    один раз за запуск; пациенты ищутся по ЕНП полиса или СНИЛС одним запросом
+    на пачку, чтобы память не зависела от размера реестра.
+    Талоны записываются пачками через bulk_create(update_conflicts=True):
+    существующий талон с тем же номером обновляется, коды его диагнозов
+    (TicketDiagnosis) перезаписываются. Своды талонов после загрузки
+    обновляются refresh_rollups (по Ticket.updated).
+    """
+
+    def __init__(self, batch_size=LOAD_BATCH_SIZE, on_reject=None):
+        self.batch_size = batch_size
+        self.on_reject = on_reject
+        self.sources = {name.lower(): pk for pk, name in Source.objects.values_list('id', 'name')}
+        self.statuses = dict(TicketStatus.objects.values_list('code', 'id'))
+        self.goals = dict(Goal.objects.values_list('code', 'id'))
+        self.doctor_codes = dict(DoctorCode.objects.values_list('code', 'id'))
+
+    def load(self, rows):
+        """
+        rows — итерируемое (номер строки, словарь поле -> значение).
+        Возвращает {'read', 'loaded', 'rejected', 'seconds', 'rows_per_second'}.
+        """
+        started = time.perf_counter()
+        stats = {'read': 0, 'loaded': 0, 'rejected': 0}
+        batch = []
+        for line_no, row in rows:
+            stats['read'] += 1
+            batch.append((line_no, row))
+            if len(batch) >= self.batch_size:
+                self._flush(batch, stats)
+                batch = []
+        if batch:
+            self._flush(batch, stats)
+
+        seconds = time.perf_counter() - started
+        stats['seconds'] = round(seconds, 2)
+        stats['rows_per_second'] = round(stats['read'] / seconds) if seconds else stats['read']
+        return stats
+
+    def _reject(self, stats, line_no, reason, row):
+        stats['rejected'] += 1
+        if self.on_reject is not None:
+            self.on_reject(line_no, reason, row)
+
+    def _patients(self, batch):
+        enps, snils = set(), set()
+        for _, row in batch:
+            # Оба ключа: пациент с неизвестным ЕНП ищется по СНИЛС
+            enp, number = _text(row, 'enp'), _text(row, 'snils')
+            if enp:
+                enps.add(enp)
+            if number:
+                snils.add(number)
+        by_enp = dict(InsurancePolicy.objects.filter(enp__in=enps).values_list('enp', 'physical_person_id'))
+        by_snils = dict(PhysicalPerson.objects.filter(snils__in=snils).values_list('snils', 'id'))
+        return by_enp, by_snils
+
+    def _lookup(self, mapping, row, name, key=None):
+        value = _text(row, name, required=True)
+        pk = mapping.get(key(value) if key else value)
+        if pk is None:
+            raise RowError(f"не найдено значение справочника {name}: {value}")
+        return pk
+
+    def _build(self, row, by_enp, by_snils, now):
+        enp, snils = _text(row, 'enp'), _text(row, 'snils')
+        patient_id = by_enp.get(enp) or by_snils.get(snils)
+        if patient_id is None:
+            raise RowError(f"не найден пациент (ЕНП {enp or '-'}, СНИЛС {snils or '-'})")
+
+        return Ticket(
+            number=_text(row, 'number', required=True),
+            source_id=self._lookup(self.sources, row, 'source', key=str.lower),
+            status_id=self._lookup(self.statuses, row, 'status'),
+            goal_id=self._lookup(self.goals, row, 'goal'),
+            doctor_code_id=self._lookup(self.doctor_codes, row, 'doctor_code'),
+            patient_id=patient_id,
+            report_month=_int(row, 'report_month', 1, 12),
+            report_year=_int(row, 'report_year', 2020, 2030),
+            treatment_start=_date(row, 'treatment_start'),
+            treatment_end=_date(row, 'treatment_end'),
+            visits=_int(row, 'visits'),
+            visits_in_mo=_int(row, 'visits_in_mo'),
+            visits_at_home=_int(row, 'visits_at_home'),
+            diagnosis=_text(row, 'diagnosis', required=True),
+            diagnosis_2=_text(row, 'diagnosis_2'),
+            diagnosis_3=_text(row, 'diagnosis_3'),
+            diagnosis_4=_text(row, 'diagnosis_4'),
+            health_group=_text(row, 'health_group'),
+            ksg=_text(row, 'ksg'),
+            amount=_decimal(row, 'amount'),
+            sanctions=_decimal(row, 'sanctions'),
+            formation_date=_date(row, 'formation_date'),
+            change_date=_date(row, 'change_date'),
+            updated=now
+        )
+
+    def _flush(self, batch, stats):
+        by_enp, by_snils = self._patients(batch)
+        now = timezone.now()
+        # Повтор номера внутри пачки: побеждает последняя строка
+        tickets = {}
+        for line_no, row in batch:
+            try:
+                ticket = self._build(row, by_enp, by_snils, now)
+            except RowError as e:
+                self._reject(stats, line_no, str(e), row)
+                continue
+            tickets[ticket.number] = ticket
+
+        with transaction.atomic():
+            # Загрузка идёт в обход save(): периоды, из которых талоны
+            # перенесены, помечаются для пересчёта сводов явно
+            moved = {
+                (year, month)
+                for number, year, month in Ticket.objects.filter(number__in=list(tickets)).values_list(
+                    'number', 'report_year', 'report_month')
+                if (tickets[number].report_year, tickets[number].report_month) != (year, month)
+            }
+            if moved:
+                mark_stale(moved)
+            Ticket.objects.bulk_create(
+                list(tickets.values()),
+                update_conflicts=True,
+                unique_fields=['number'],
+                update_fields=UPDATE_FIELDS
+            )
+            # pk после upsert заполняется не на всех базах
+            missing = [number for number, ticket in tickets.items() if ticket.pk is None]
+            if missing:
+                for number, pk in Ticket.objects.filter(number__in=missing).values_list('number', 'id'):
+                    tickets[number].pk = pk
+            TicketDiagnosis.objects.replace_for(tickets.values())
+        stats['loaded'] += len(tickets)
@@ -0,0 +1,67 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from talon.loader import LOAD_BATCH_SIZE, TicketLoader, iter_export_rows
+from talon.rollup import refresh_rollups
+
+# Сколько отклонённых строк выводить, если не задан файл для них
+SHOWN_REJECTS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Загрузка талонов из выгрузки реестра (CSV или XLSX). "
+        "Талоны с существующим номером обновляются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Путь к файлу выгрузки (.csv или .xlsx)")
+        parser.add_argument('--delimiter', default=';', help="Разделитель CSV (по умолчанию «;»)")
+        parser.add_argument('--encoding', default='utf-8-sig', help="Кодировка CSV")
+        parser.add_argument('--batch-size', type=int, default=LOAD_BATCH_SIZE)
+        parser.add_argument('--rejects', help="CSV-файл для отклонённых строк (номер строки, причина)")
+        parser.add_argument('--refresh-rollups', action='store_true', help="Обновить своды талонов после загрузки")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        csv_options = {}
+        if not path.lower().endswith(('.xlsx', '.xlsm')):
+            csv_options = {'delimiter': options['delimiter'], 'encoding': options['encoding']}
+
+        rejects_file = open(options['rejects'], 'w', newline='', encoding='utf-8-sig') if options['rejects'] else None
+        shown = []
+
+        def on_reject(line_no, reason, row):
+            if rejects_file is not None:
+                rejects_writer.writerow([line_no, reason])
+            elif len(shown) < SHOWN_REJECTS:
+                shown.append(f"строка {line_no}: {reason}")
+
+        try:
+            if rejects_file is not None:
+                rejects_writer = csv.writer(rejects_file, delimiter=';')
+                rejects_writer.writerow(["Строка", "Причина"])
+            loader = TicketLoader(batch_size=options['batch_size'], on_reject=on_reject)
+            stats = loader.load(iter_export_rows(path, **csv_options))
+        except (OSError, UnicodeDecodeError) as e:
+            raise CommandError(f"Не удалось прочитать выгрузку: {e}")
+        finally:
+            if rejects_file is not None:
+                rejects_file.close()
+
+        for line in shown:
+            self.stderr.write(line)
+        if stats['rejected'] > len(shown) and rejects_file is None:
+            self.stderr.write(f"... и ещё {stats['rejected'] - len(shown)} (см. --rejects)")
+
+        self.stdout.write(
+            f"Прочитано: {stats['read']}, загружено: {stats['loaded']}, отклонено: {stats['rejected']}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Время: {stats['seconds']} с, {stats['rows_per_second']} строк/с"
+        ))
+
+        if options['refresh_rollups']:
+            run = refresh_rollups()
+            self.stdout.write(f"Своды талонов обновлены, периодов: {run.periods}")
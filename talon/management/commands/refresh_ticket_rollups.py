@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from talon.rollup import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Обновление сводов талонов: пересчитываются периоды, в которых "
+        "талоны изменились с прошлого запуска."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Пересчитать все периоды")
+
+    def handle(self, *args, **options):
+        run = refresh_rollups(full=options['full'])
+        seconds = (run.finished_at - run.started_at).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Полный пересчёт' if run.full else 'Пересчёт'}: периодов {run.periods}, {seconds:.2f} с"
+        ))
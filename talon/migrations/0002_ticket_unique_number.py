@@ -0,0 +1,26 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kadry', '0002_initial'),
+        ('person', '0001_initial'),
+        ('talon', '0001_initial'),
+    ]
+
+    # Уникальный индекс создаётся раньше удаления обычного, чтобы поиск
+    # по номеру не оставался без индекса. Если в таблице есть талоны
+    # с повторяющимися номерами, их нужно объединить до миграции
+    operations = [
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.UniqueConstraint(fields=('number',), name='talon_ticket_unique_number'),
+        ),
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='talon_ticke_number_1353a9_idx',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kadry', '0002_initial'),
+        ('person', '0001_initial'),
+        ('talon', '0002_ticket_unique_number'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['report_year', 'report_month', 'status'], name='talon_ticket_period_status'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['doctor_code', 'report_year', 'report_month'], name='talon_ticket_doctor_period'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kadry', '0002_initial'),
+        ('talon', '0003_ticket_stats_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketRollupRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(verbose_name='Начало')),
+                ('finished_at', models.DateTimeField(verbose_name='Окончание')),
+                ('full', models.BooleanField(default=False, verbose_name='Полный пересчёт')),
+                ('periods', models.PositiveIntegerField(default=0, verbose_name='Пересчитано периодов')),
+            ],
+            options={
+                'verbose_name': 'Пересчёт сводов талонов',
+                'verbose_name_plural': 'Пересчёты сводов талонов',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StaleTicketPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_year', models.PositiveIntegerField(verbose_name='Отчетный год')),
+                ('report_month', models.PositiveIntegerField(verbose_name='Отчетный месяц')),
+            ],
+            options={
+                'verbose_name': 'Устаревший период сводов',
+                'verbose_name_plural': 'Устаревшие периоды сводов',
+                'constraints': [models.UniqueConstraint(fields=('report_year', 'report_month'), name='talon_stale_period_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TicketRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_year', models.PositiveIntegerField(verbose_name='Отчетный год')),
+                ('report_month', models.PositiveIntegerField(verbose_name='Отчетный месяц')),
+                ('tickets', models.PositiveIntegerField(verbose_name='Талонов')),
+                ('visits', models.PositiveIntegerField(verbose_name='Посещения')),
+                ('visits_in_mo', models.PositiveIntegerField(verbose_name='Посещения в МО')),
+                ('visits_at_home', models.PositiveIntegerField(verbose_name='Посещения на дому')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Сумма')),
+                ('sanctions', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Санкции')),
+                ('doctor_code', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='kadry.doctorcode', verbose_name='Код врача')),
+                ('goal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='talon.goal', verbose_name='Цель')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='talon.source', verbose_name='Источник')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='talon.ticketstatus', verbose_name='Статус талона')),
+            ],
+            options={
+                'verbose_name': 'Свод талонов',
+                'verbose_name_plural': 'Своды талонов',
+                'constraints': [models.UniqueConstraint(fields=('report_year', 'report_month', 'goal', 'status', 'doctor_code', 'source'), name='talon_rollup_unique_group')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kadry', '0002_initial'),
+        ('person', '0001_initial'),
+        ('talon', '0004_ticket_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['report_year', 'report_month', 'id'], name='talon_ticket_period_id'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+DIAGNOSIS_FIELDS = ('diagnosis', 'diagnosis_2', 'diagnosis_3', 'diagnosis_4')
+
+
+def backfill_diagnoses(apps, schema_editor):
+    """
+    Заполняет коды диагнозов существующих талонов: талоны читаются
+    порциями, коды вставляются пачками.
+    """
+    Ticket = apps.get_model('talon', 'Ticket')
+    TicketDiagnosis = apps.get_model('talon', 'TicketDiagnosis')
+    batch = []
+    for ticket_id, *values in Ticket.objects.values_list('id', *DIAGNOSIS_FIELDS).iterator(chunk_size=BATCH_SIZE):
+        for slot, value in enumerate(values, start=1):
+            code = (value or '').strip().upper()
+            if code:
+                batch.append(TicketDiagnosis(ticket_id=ticket_id, slot=slot, icd_code=code))
+        if len(batch) >= BATCH_SIZE:
+            TicketDiagnosis.objects.bulk_create(batch)
+            batch = []
+    TicketDiagnosis.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('talon', '0005_ticket_period_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketDiagnosis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField(verbose_name='Позиция диагноза')),
+                ('icd_code', models.CharField(max_length=255, verbose_name='Код МКБ-10')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='diagnoses', to='talon.ticket', verbose_name='Талон')),
+            ],
+            options={
+                'verbose_name': 'Диагноз талона',
+                'verbose_name_plural': 'Диагнозы талонов',
+                'indexes': [models.Index(fields=['icd_code', 'ticket'], name='talon_diagnosis_code_ticket')],
+                'constraints': [models.UniqueConstraint(fields=('ticket', 'slot'), name='talon_diagnosis_unique_slot')],
+            },
+        ),
+        migrations.RunPython(backfill_diagnoses, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-17 01:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kadry', '0002_initial'),
+        ('person', '0001_initial'),
+        ('talon', '0006_ticket_diagnoses'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['updated', 'report_year', 'report_month'], name='talon_ticket_updated'),
+        ),
+    ]
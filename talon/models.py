@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.dispatch import Signal
 from django.utils import timezone
 
 from kadry.models import DoctorCode
@@ -40,6 +41,56 @@ class Goal(models.Model):
     def __str__(self):
         return self.name
 
+
+# Поля диагнозов талона; позиция диагноза — номер поля в этом списке, с 1
+DIAGNOSIS_FIELDS = ('diagnosis', 'diagnosis_2', 'diagnosis_3', 'diagnosis_4')
+
+# Размер пачки при вставке кодов диагнозов
+DIAGNOSIS_BATCH_SIZE = 2000
+
+
+def normalize_icd_code(value):
+    """
+    Код МКБ-10 в каноническом виде: без пробелов по краям, в верхнем регистре.
+    """
+    return (value or '').strip().upper()
+
+
+def ticket_diagnosis_codes(ticket):
+    """
+    Непустые коды диагнозов талона: [(позиция, код), ...].
+    """
+    codes = []
+    for slot, name in enumerate(DIAGNOSIS_FIELDS, start=1):
+        code = normalize_icd_code(getattr(ticket, name))
+        if code:
+            codes.append((slot, code))
+    return codes
+
+
+# Отправляется после удаления талонов вместо post_delete (с ним Django
+# загружает и удаляет талоны по одному); аргумент periods — множество
+# (год, месяц) удалённых талонов
+tickets_deleted = Signal()
+
+
+class TicketQuerySet(models.QuerySet):
+    def delete(self):
+        """
+        Удаление с одним запросом периодов удаляемых талонов
+        и одним сигналом tickets_deleted на всё удаление.
+        """
+        with transaction.atomic(using=self.db):
+            periods = set(self.order_by().values_list('report_year', 'report_month').distinct())
+            result = super().delete()
+            if periods:
+                tickets_deleted.send(sender=self.model, periods=periods)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Ticket(models.Model):
     number = models.CharField("Номер", max_length=255)
     source = models.ForeignKey(
@@ -93,12 +144,160 @@ class Ticket(models.Model):
     updated = models.DateTimeField("Обновлено", default=timezone.now)
     blocked = models.BooleanField("Заблокировано", default=False)
 
+    objects = TicketQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Талон"
         verbose_name_plural = "Талоны"
+        constraints = [
+            # Номер талона уникален: по нему загрузка из реестра обновляет
+            # существующие талоны (уникальный индекс заменяет обычный)
+            models.UniqueConstraint(fields=['number'], name='talon_ticket_unique_number'),
+        ]
         indexes = [
-            models.Index(fields=['number']),
+            # Сводная статистика: отбор по периоду и статусу, по врачу за период
+            models.Index(fields=['report_year', 'report_month', 'status'], name='talon_ticket_period_status'),
+            models.Index(fields=['doctor_code', 'report_year', 'report_month'], name='talon_ticket_doctor_period'),
+            # Постраничный список талонов: ключ пагинации
+            models.Index(fields=['report_year', 'report_month', 'id'], name='talon_ticket_period_id'),
+            # Инкрементальный пересчёт сводов: периоды талонов, изменённых
+            # после прошлого запуска, читаются из индекса без обращения к таблице
+            models.Index(fields=['updated', 'report_year', 'report_month'], name='talon_ticket_updated'),
         ]
 
     def __str__(self):
         return f"Талон {self.number} для пациента {self.patient}"
+
+    def save(self, *args, **kwargs):
+        # По updated сводные таблицы находят изменённые периоды
+        self.updated = timezone.now()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'updated' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'updated']
+        super().save(*args, **kwargs)
+        if update_fields is None or set(update_fields) & set(DIAGNOSIS_FIELDS):
+            TicketDiagnosis.objects.replace_for([self])
+
+    def delete(self, *args, **kwargs):
+        period = (self.report_year, self.report_month)
+        with transaction.atomic(using=kwargs.get('using') or Ticket.objects.db):
+            result = super().delete(*args, **kwargs)
+            tickets_deleted.send(sender=Ticket, periods={period})
+        return result
+
+
+class TicketDiagnosisManager(models.Manager):
+    def replace_for(self, tickets):
+        """
+        Перезаписывает коды диагнозов талонов (у талонов должен быть pk):
+        одно удаление и одна вставка на весь список.
+        """
+        tickets = list(tickets)
+        self.filter(ticket_id__in=[ticket.pk for ticket in tickets]).delete()
+        self.bulk_create([
+            self.model(ticket_id=ticket.pk, slot=slot, icd_code=code)
+            for ticket in tickets
+            for slot, code in ticket_diagnosis_codes(ticket)
+        ], batch_size=DIAGNOSIS_BATCH_SIZE)
+
+
+class TicketDiagnosis(models.Model):
+    """
+    Диагноз талона в отдельной строке: (талон, позиция, код МКБ-10).
+    Поиск по коду во всех четырёх полях диагноза идёт по одному индексу.
+    Заполняется при сохранении талона и при загрузке из реестра.
+    """
+    ticket = models.ForeignKey(
+        Ticket,
+        on_delete=models.CASCADE,
+        related_name='diagnoses',
+        verbose_name="Талон"
+    )
+    slot = models.PositiveSmallIntegerField("Позиция диагноза")
+    icd_code = models.CharField("Код МКБ-10", max_length=255)
+
+    objects = TicketDiagnosisManager()
+
+    class Meta:
+        verbose_name = "Диагноз талона"
+        verbose_name_plural = "Диагнозы талонов"
+        constraints = [
+            models.UniqueConstraint(fields=['ticket', 'slot'], name='talon_diagnosis_unique_slot'),
+        ]
+        indexes = [
+            # Поиск талонов по диапазону/префиксу кода; ticket — чтобы хватило индекса
+            models.Index(fields=['icd_code', 'ticket'], name='talon_diagnosis_code_ticket'),
+        ]
+
+    def __str__(self):
+        return f"{self.icd_code} ({self.slot})"
+
+
+class TicketRollup(models.Model):
+    """
+    Свод талонов за отчётный период в разрезе цели, статуса, кода врача
+    и источника. Пересчитывается целиком по периоду (см. talon.rollup).
+    """
+    report_year = models.PositiveIntegerField("Отчетный год")
+    report_month = models.PositiveIntegerField("Отчетный месяц")
+    goal = models.ForeignKey(Goal, on_delete=models.CASCADE, verbose_name="Цель")
+    status = models.ForeignKey(TicketStatus, on_delete=models.CASCADE, verbose_name="Статус талона")
+    doctor_code = models.ForeignKey(DoctorCode, on_delete=models.CASCADE, verbose_name="Код врача")
+    source = models.ForeignKey(Source, on_delete=models.CASCADE, verbose_name="Источник")
+    tickets = models.PositiveIntegerField("Талонов")
+    visits = models.PositiveIntegerField("Посещения")
+    visits_in_mo = models.PositiveIntegerField("Посещения в МО")
+    visits_at_home = models.PositiveIntegerField("Посещения на дому")
+    amount = models.DecimalField("Сумма", max_digits=14, decimal_places=2)
+    sanctions = models.DecimalField("Санкции", max_digits=14, decimal_places=2)
+
+    class Meta:
+        verbose_name = "Свод талонов"
+        verbose_name_plural = "Своды талонов"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['report_year', 'report_month', 'goal', 'status', 'doctor_code', 'source'],
+                name='talon_rollup_unique_group'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Свод талонов за {self.report_month:02d}.{self.report_year}"
+
+
+class TicketRollupRun(models.Model):
+    """
+    Запуск пересчёта сводов. Время начала последнего запуска — граница,
+    после которой изменённые талоны попадают в следующий пересчёт.
+    """
+    started_at = models.DateTimeField("Начало")
+    finished_at = models.DateTimeField("Окончание")
+    full = models.BooleanField("Полный пересчёт", default=False)
+    periods = models.PositiveIntegerField("Пересчитано периодов", default=0)
+
+    class Meta:
+        verbose_name = "Пересчёт сводов талонов"
+        verbose_name_plural = "Пересчёты сводов талонов"
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Пересчёт сводов {self.started_at:%d.%m.%Y %H:%M}"
+
+
+class StaleTicketPeriod(models.Model):
+    """
+    Период, свод которого нужно пересчитать, хотя изменённых талонов в нём
+    может не остаться: талон удалён или перенесён в другой период.
+    """
+    report_year = models.PositiveIntegerField("Отчетный год")
+    report_month = models.PositiveIntegerField("Отчетный месяц")
+
+    class Meta:
+        verbose_name = "Устаревший период сводов"
+        verbose_name_plural = "Устаревшие периоды сводов"
+        constraints = [
+            models.UniqueConstraint(fields=['report_year', 'report_month'], name='talon_stale_period_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.report_month:02d}.{self.report_year}"
@@ -0,0 +1,115 @@
+import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from talon.models import Ticket, TicketRollup, TicketRollupRun, StaleTicketPeriod
+
+# Измерения свода (в порядке столбцов) и суммируемые поля талона
+ROLLUP_DIMENSIONS = ('report_year', 'report_month', 'goal', 'status', 'doctor_code', 'source')
+ROLLUP_SUMS = ('visits', 'visits_in_mo', 'visits_at_home', 'amount', 'sanctions')
+
+# Запас назад от начала прошлого пересчёта: талон, сохранённый до начала,
+# мог зафиксироваться уже после того, как пересчёт прочитал изменения
+WATERMARK_OVERLAP = datetime.timedelta(minutes=5)
+
+
+def _refresh_sql():
+    qn = connection.ops.quote_name
+
+    def column(model, name):
+        return qn(model._meta.get_field(name).column)
+
+    dimensions = ', '.join(column(Ticket, name) for name in ROLLUP_DIMENSIONS)
+    sums = ', '.join(f"SUM({column(Ticket, name)})" for name in ROLLUP_SUMS)
+    rollup_columns = ', '.join(
+        column(TicketRollup, name) for name in (*ROLLUP_DIMENSIONS, 'tickets', *ROLLUP_SUMS)
+    )
+    return (
+        f"INSERT INTO {qn(TicketRollup._meta.db_table)} ({rollup_columns}) "
+        f"SELECT {dimensions}, COUNT(*), {sums} "
+        f"FROM {qn(Ticket._meta.db_table)} "
+        f"WHERE {column(Ticket, 'report_year')} = %s AND {column(Ticket, 'report_month')} = %s "
+        f"GROUP BY {dimensions}"
+    )
+
+
+def refresh_periods(periods):
+    """
+    Пересчитывает своды за периоды [(год, месяц), ...]: строки свода периода
+    удаляются и вставляются заново одним INSERT ... SELECT ... GROUP BY.
+    """
+    sql = _refresh_sql()
+    with transaction.atomic(), connection.cursor() as cursor:
+        for year, month in sorted(periods):
+            TicketRollup.objects.filter(report_year=year, report_month=month).delete()
+            cursor.execute(sql, [year, month])
+
+
+def mark_stale(periods):
+    """
+    Помечает периоды для пересчёта при следующем запуске refresh_rollups.
+    """
+    StaleTicketPeriod.objects.bulk_create(
+        [StaleTicketPeriod(report_year=year, report_month=month) for year, month in periods],
+        ignore_conflicts=True
+    )
+
+
+def last_run():
+    return TicketRollupRun.objects.order_by('-started_at').first()
+
+
+def changed_periods(since):
+    """
+    Периоды талонов, изменённых начиная с since (с запасом WATERMARK_OVERLAP).
+    Талоны читаются по покрывающему индексу talon_ticket_updated; повторы
+    периодов убираются здесь: с DISTINCT планировщик выбирает полный проход
+    по индексу периода ради порядка.
+    """
+    changed = Ticket.objects.filter(
+        updated__gte=since - WATERMARK_OVERLAP
+    ).order_by().values_list('report_year', 'report_month')
+    return set(changed.iterator())
+
+
+def outdated_periods(run):
+    """
+    Периоды, свод которых мог отстать от талонов после запуска run:
+    помеченные устаревшими и с талонами, изменёнными с его начала.
+    """
+    periods = set(StaleTicketPeriod.objects.values_list('report_year', 'report_month'))
+    return periods | changed_periods(run.started_at)
+
+
+def refresh_rollups(full=False):
+    """
+    Обновляет своды талонов.
+
+    Пересчитываются только периоды, в которых есть талоны, изменённые
+    с начала прошлого пересчёта (по Ticket.updated), и периоды, помеченные
+    устаревшими (удаление талона, перенос в другой период).
+    При full=True или первом запуске пересчитываются все периоды.
+    Возвращает запись TicketRollupRun.
+    """
+    started_at = timezone.now()
+    previous = last_run()
+    full = full or previous is None
+
+    with transaction.atomic():
+        stale = list(StaleTicketPeriod.objects.values_list('id', 'report_year', 'report_month'))
+        periods = {(year, month) for _, year, month in stale}
+        if full:
+            periods |= set(TicketRollup.objects.values_list('report_year', 'report_month').distinct())
+            periods |= set(Ticket.objects.order_by().values_list('report_year', 'report_month').distinct())
+        else:
+            periods |= changed_periods(previous.started_at)
+
+        refresh_periods(periods)
+        StaleTicketPeriod.objects.filter(id__in=[pk for pk, _, _ in stale]).delete()
+        return TicketRollupRun.objects.create(
+            started_at=started_at,
+            finished_at=timezone.now(),
+            full=full,
+            periods=len(periods)
+        )
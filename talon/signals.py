@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from person.models import PhysicalPerson
+from talon.models import Ticket, tickets_deleted
+from talon.rollup import mark_stale, refresh_periods
+
+
+def _period(instance):
+    return instance.__dict__.get('report_year'), instance.__dict__.get('report_month')
+
+
+def _refresh_on_commit(periods):
+    if getattr(settings, 'TALON_ROLLUP_REFRESH_ON_SAVE', False):
+        transaction.on_commit(lambda: refresh_periods(periods))
+
+
+@receiver(post_init, sender=Ticket)
+def remember_ticket_period(sender, instance, **kwargs):
+    # Период на момент загрузки: при переносе талона старый период
+    # тоже нужно пересчитать. Через __dict__, чтобы не загружать отложенные поля
+    instance._loaded_period = _period(instance)
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    periods = {(instance.report_year, instance.report_month)}
+    previous = instance._loaded_period
+    if not created and None not in previous and previous not in periods:
+        mark_stale([previous])
+        periods.add(previous)
+    instance._loaded_period = _period(instance)
+    _refresh_on_commit(periods)
+
+
+@receiver(tickets_deleted, sender=Ticket)
+def tickets_were_deleted(sender, periods, **kwargs):
+    mark_stale(periods)
+    _refresh_on_commit(periods)
+
+
+@receiver(pre_delete, sender=PhysicalPerson)
+def patient_deleting(sender, instance, **kwargs):
+    # Талоны пациента удаляются каскадом в обход Ticket.delete(), а пациент
+    # не входит в измерения свода (источник, цель, статус и код врача входят,
+    # и строки свода удаляются вместе с талонами)
+    periods = set(
+        Ticket.objects.filter(patient=instance).order_by()
+        .values_list('report_year', 'report_month').distinct()
+    )
+    if periods:
+        mark_stale(periods)
+        _refresh_on_commit(periods)
@@ -1,3 +1,362 @@
-from django.test import TestCase
+import datetime
+import os
+import tempfile
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from kadry.models import Employee, Position, Appointment, DoctorCode
+from person.models import Insurance, InsurancePolicy, PhysicalPerson
+from talon.loader import TicketLoader, iter_csv_rows
+from talon.models import Source, TicketStatus, Goal, Ticket, TicketRollup, StaleTicketPeriod
+from talon.rollup import refresh_rollups
+
+CSV_HEADER = (
+    "Номер;Источник;Статус;Отчетный месяц;Отчетный год;Цель;ЕНП;СНИЛС;Начало лечения;Окончание лечения;"
+    "Посещения;Посещения в МО;Посещения на дому;Диагноз;Диагноз 2;Сумма;Санкции;Код врача;"
+    "Дата формирования;Дата изменения"
+)
+
+
+def create_ticket_references():
+    """
+    Справочники для талонов: источник, статус, цель, код врача
+    и пациент с полисом (ЕНП 1234567890123456, СНИЛС 12345678901).
+    """
+    patient = PhysicalPerson.objects.create(
+        last_name="Иванов", first_name="Иван", birth_date=datetime.date(1980, 1, 1),
+        gender="М", snils="12345678901"
+    )
+    insurance = Insurance.objects.create(code=1, name="СМО")
+    InsurancePolicy.objects.create(
+        enp="1234567890123456", start_date=datetime.date(2020, 1, 1),
+        insurance=insurance, physical_person=patient
+    )
+    doctor = PhysicalPerson.objects.create(
+        last_name="Петров", first_name="Пётр", birth_date=datetime.date(1970, 1, 1), gender="М"
+    )
+    appointment = Appointment.objects.create(
+        employee=Employee.objects.create(physical_person=doctor),
+        position=Position.objects.create(code="1", name="Врач"),
+        start_date=datetime.date(2020, 1, 1)
+    )
+    return {
+        'patient': patient,
+        'source': Source.objects.create(name="ОМС"),
+        'status': TicketStatus.objects.create(code="3", name="Оплачен"),
+        'goal': Goal.objects.create(code="1", name="Посещение"),
+        'doctor_code': DoctorCode.objects.create(appointment=appointment, code="D001"),
+    }
+
+
+class TicketLoaderTests(TestCase):
+    def setUp(self):
+        create_ticket_references()
+
+    def load_csv(self, lines):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w', encoding='utf-8-sig') as output:
+            output.write("\n".join([CSV_HEADER, *lines]))
+        self.addCleanup(os.remove, path)
+        rejects = []
+        stats = TicketLoader(
+            batch_size=2, on_reject=lambda line_no, reason, row: rejects.append((line_no, reason))
+        ).load(iter_csv_rows(path))
+        return stats, rejects
+
+    def test_upsert_by_number_and_rejects(self):
+        stats, rejects = self.load_csv([
+            "T1;омс;3;1;2024;1;1234567890123456;;01.01.2024;10.01.2024;2;2;0;J06.9;;1500,50;0;D001;2024-01-15;2024-01-15",
+            "T2;ОМС;3;1;2024;1;;12345678901;2024-01-02;2024-01-03;1;1;0;I10;E11.9;300;0;D001;2024-01-15;2024-01-15",
+            "T3;ОМС;9;1;2024;1;;12345678901;2024-01-02;2024-01-03;1;1;0;I10;;300;0;D001;2024-01-15;2024-01-15",
+        ])
+        self.assertEqual((stats['read'], stats['loaded'], stats['rejected']), (3, 2, 1))
+        self.assertEqual(rejects[0][0], 4)
+        self.assertIn("status", rejects[0][1])
+        self.assertEqual(str(Ticket.objects.get(number="T1").amount), "1500.50")
+
+        # Повторная загрузка обновляет талон с тем же номером
+        stats, rejects = self.load_csv([
+            "T1;ОМС;3;2;2024;1;1234567890123456;;01.01.2024;10.01.2024;3;3;0;J06.9;;2000;0;D001;2024-02-15;2024-02-15",
+        ])
+        self.assertEqual(stats['loaded'], 1)
+        self.assertEqual(Ticket.objects.count(), 2)
+        ticket = Ticket.objects.get(number="T1")
+        self.assertEqual((ticket.report_month, ticket.visits), (2, 3))
+
+    def test_unknown_enp_falls_back_to_snils(self):
+        stats, rejects = self.load_csv([
+            "T1;ОМС;3;1;2024;1;9999999999999999;12345678901;2024-01-02;2024-01-03;1;1;0;I10;;300;0;D001;2024-01-15;2024-01-15",
+            "T2;ОМС;3;1;2024;1;9999999999999999;;2024-01-02;2024-01-03;1;1;0;I10;;300;0;D001;2024-01-15;2024-01-15",
+        ])
+        self.assertEqual((stats['loaded'], stats['rejected']), (1, 1))
+        self.assertEqual(Ticket.objects.get(number="T1").patient.snils, "12345678901")
+        self.assertIn("не найден пациент", rejects[0][1])
+
+
+def create_ticket(refs, number, **fields):
+    """
+    Талон с заполненными обязательными полями; fields переопределяют значения.
+    """
+    values = {
+        'number': number,
+        'source': refs['source'],
+        'status': refs['status'],
+        'goal': refs['goal'],
+        'patient': refs['patient'],
+        'doctor_code': refs['doctor_code'],
+        'report_month': 1,
+        'report_year': 2024,
+        'treatment_start': datetime.date(2024, 1, 1),
+        'treatment_end': datetime.date(2024, 1, 2),
+        'visits': 1,
+        'visits_in_mo': 1,
+        'visits_at_home': 0,
+        'diagnosis': "I10",
+        'amount': Decimal("100.00"),
+        'sanctions': Decimal("0.00"),
+        'formation_date': datetime.date(2024, 1, 15),
+        'change_date': datetime.date(2024, 1, 15),
+    }
+    values.update(fields)
+    return Ticket.objects.create(**values)
+
+
+class TicketStatsTests(TestCase):
+    def setUp(self):
+        self.refs = create_ticket_references()
+        self.other_goal = Goal.objects.create(code="2", name="Обращение")
+        create_ticket(self.refs, "T1", visits=2, amount=Decimal("150.50"))
+        create_ticket(self.refs, "T2", visits=3, visits_at_home=1)
+        create_ticket(self.refs, "T3", goal=self.other_goal, report_month=2, sanctions=Decimal("10.00"))
+
+    def test_grouped_stats_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/tickets/stats/', {'group_by': 'report_month,goal,department', 'live': 'true'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(len(results), 2)
+        first = results[0]
+        self.assertEqual((first['report_month'], first['goal'], first['department']), (1, self.refs['goal'].pk, None))
+        self.assertEqual((first['tickets'], first['visits'], first['visits_at_home']), (2, 5, 1))
+        self.assertEqual(Decimal(str(first['amount'])), Decimal("250.50"))
+
+    def test_filters_and_totals(self):
+        response = self.client.get('/api/tickets/stats/', {'goal': f"{self.other_goal.pk}"})
+        self.assertEqual(response.json()['results'][0]['tickets'], 1)
+        self.assertEqual(Decimal(str(response.json()['results'][0]['sanctions'])), Decimal("10.00"))
+
+        response = self.client.get('/api/tickets/stats/', {'report_year': '2023'})
+        self.assertEqual(response.json()['results'], [
+            {'tickets': 0, 'visits': 0, 'visits_in_mo': 0, 'visits_at_home': 0, 'amount': 0, 'sanctions': 0}
+        ])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/tickets/stats/', {'group_by': 'patient'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/tickets/stats/', {'status': 'paid'}).status_code, 400)
+
+
+class TicketRollupTests(TestCase):
+    def setUp(self):
+        self.refs = create_ticket_references()
+        create_ticket(self.refs, "T1", visits=2, amount=Decimal("150.50"))
+        create_ticket(self.refs, "T2", visits=3)
+        self.moved = create_ticket(self.refs, "T3", report_month=2)
+
+    def stats(self, **params):
+        return self.client.get('/api/tickets/stats/', {'group_by': 'report_month', **params}).json()
+
+    def months(self):
+        return dict(TicketRollup.objects.values_list('report_month', 'tickets'))
+
+    def age_tickets(self):
+        # Талоны изменены задолго до пересчёта: своды за их периоды актуальны
+        Ticket.objects.update(updated=timezone.now() - datetime.timedelta(days=1))
+
+    def test_stats_read_from_rollups(self):
+        self.assertIsNone(self.stats()['rollup_refreshed_at'])
+        self.age_tickets()
+        refresh_rollups()
+
+        stats = self.stats()
+        self.assertIsNotNone(stats['rollup_refreshed_at'])
+        self.assertEqual(stats['live_periods'], [])
+        self.assertEqual(stats['results'], self.stats(live='true')['results'])
+        self.assertEqual(stats['results'][0]['visits'], 5)
+
+    def test_outdated_periods_are_counted_live(self):
+        self.age_tickets()
+        refresh_rollups()
+        # Метка, по которой видно, что февраль по-прежнему читается из свода
+        TicketRollup.objects.filter(report_month=2).update(visits=100)
+
+        # Загрузка в январь и удаление талона за март после пересчёта
+        create_ticket(self.refs, "T4", visits=4)
+        march = create_ticket(self.refs, "T5", report_month=3)
+        Ticket.objects.filter(pk=march.pk).update(updated=timezone.now() - datetime.timedelta(days=1))
+        StaleTicketPeriod.objects.all().delete()
+        march.delete()
+
+        stats = self.stats()
+        self.assertEqual(
+            stats['live_periods'],
+            [{'report_year': 2024, 'report_month': 1}, {'report_year': 2024, 'report_month': 3}]
+        )
+        self.assertEqual(
+            [(row['report_month'], row['tickets'], row['visits']) for row in stats['results']],
+            [(1, 3, 9), (2, 1, 100)]
+        )
+        totals = self.client.get('/api/tickets/stats/').json()['results'][0]
+        self.assertEqual((totals['tickets'], totals['visits']), (4, 109))
+
+    def test_incremental_refresh(self):
+        self.assertTrue(refresh_rollups().full)
+        self.assertEqual(self.months(), {1: 2, 2: 1})
+
+        # Перенос талона в другой период пересчитывает оба периода
+        self.moved.report_month = 3
+        self.moved.save()
+        Ticket.objects.get(number="T1").delete()
+        run = refresh_rollups()
+        self.assertFalse(run.full)
+        self.assertEqual(self.months(), {1: 1, 3: 1})
+        self.assertFalse(StaleTicketPeriod.objects.exists())
+
+    @skipUnless(connection.vendor == 'sqlite', "План запроса проверяется для SQLite")
+    def test_incremental_refresh_reads_updated_index(self):
+        refresh_rollups()
+        with CaptureQueriesContext(connection) as queries:
+            refresh_rollups()
+        sql = next(query['sql'] for query in queries if '"updated" >=' in query['sql'])
+        with connection.cursor() as db:
+            db.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = ' '.join(str(row[-1]) for row in db.fetchall())
+        self.assertIn("SEARCH talon_ticket USING COVERING INDEX talon_ticket_updated", plan)
+
+    def test_bulk_delete_marks_periods_once(self):
+        create_ticket(self.refs, "T4", report_month=2)
+        with CaptureQueriesContext(connection) as small:
+            Ticket.objects.filter(number__in=["T1", "T3"]).delete()
+        self.assertEqual(
+            set(StaleTicketPeriod.objects.values_list('report_year', 'report_month')),
+            {(2024, 1), (2024, 2)}
+        )
+
+        for i in range(10):
+            create_ticket(self.refs, f"N{i}", report_month=1 + i % 3)
+        with CaptureQueriesContext(connection) as large:
+            Ticket.objects.exclude(number="T2").delete()
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(StaleTicketPeriod.objects.count(), 3)
+        self.assertEqual(list(Ticket.objects.values_list('number', flat=True)), ["T2"])
+
+    def test_patient_delete_marks_periods(self):
+        self.refs['patient'].delete()
+        self.assertFalse(Ticket.objects.exists())
+        self.assertEqual(
+            set(StaleTicketPeriod.objects.values_list('report_year', 'report_month')),
+            {(2024, 1), (2024, 2)}
+        )
+
+    @override_settings(TALON_ROLLUP_REFRESH_ON_SAVE=True)
+    def test_refresh_on_save(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.moved.report_month = 3
+            self.moved.save()
+        self.assertEqual(self.months(), {3: 1})
+
+
+class TicketListTests(TestCase):
+    def setUp(self):
+        self.refs = create_ticket_references()
+        for i in range(5):
+            create_ticket(self.refs, f"A{i}", report_month=2, diagnosis="J06.9")
+        for i in range(3):
+            create_ticket(self.refs, f"B{i}", report_month=1, blocked=True)
+
+    def test_keyset_pages(self):
+        numbers = []
+        url, params = '/api/tickets/', {'page_size': 3}
+        while url:
+            with self.assertNumQueries(1):
+                page = self.client.get(url, params).json()
+            numbers += [ticket['number'] for ticket in page['results']]
+            url, params = page['next'], {}
+        self.assertEqual(numbers, ["B0", "B1", "B2", "A0", "A1", "A2", "A3", "A4"])
+        self.assertEqual(self.client.get('/api/tickets/', {'cursor': 'bad'}).status_code, 404)
+
+    @skipUnless(connection.vendor == 'sqlite', "План запроса проверяется для SQLite")
+    def test_next_page_seeks_in_index(self):
+        url = self.client.get('/api/tickets/', {'page_size': 3}).json()['next']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        with connection.cursor() as db:
+            db.execute(f"EXPLAIN QUERY PLAN {queries[0]['sql']}")
+            plan = ' '.join(str(row[-1]) for row in db.fetchall())
+        # Один поиск по индексу в порядке ключа: без полного чтения индекса,
+        # объединения OR по нескольким поискам и сортировки во временном B-дереве
+        self.assertIn("SEARCH talon_ticket USING INDEX talon_ticket_period_id", plan)
+        self.assertNotIn("SCAN talon_ticket", plan)
+        self.assertNotIn("MULTI-INDEX OR", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_filters_and_fields(self):
+        response = self.client.get('/api/tickets/', {'diagnosis': 'j06', 'fields': 'number,status_code'})
+        results = response.json()['results']
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results[0], {'number': "A0", 'status_code': "3"})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/tickets/', {'blocked': 'true', 'fields': 'number'})
+        self.assertNotIn('diagnosis', queries[0]['sql'])
+        self.assertNotIn('JOIN', queries[0]['sql'])
+
+        self.assertEqual(self.client.get('/api/tickets/', {'fields': 'secret'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/tickets/', {'goal': 'x'}).status_code, 400)
+
+
+class TicketDiagnosisTests(TestCase):
+    def setUp(self):
+        self.refs = create_ticket_references()
+        self.j06 = create_ticket(self.refs, "T1", diagnosis="j06.9 ", diagnosis_3="I10")
+        self.i10 = create_ticket(self.refs, "T2", diagnosis="I10", diagnosis_2="J99.8")
+        self.other = create_ticket(self.refs, "T3", diagnosis="K29.7", report_year=2025)
+
+    def numbers(self, **params):
+        response = self.client.get('/api/tickets/', {'fields': 'number', **params})
+        self.assertEqual(response.status_code, 200)
+        return [ticket['number'] for ticket in response.json()['results']]
+
+    def test_codes_follow_save(self):
+        self.assertEqual(
+            list(self.j06.diagnoses.order_by('slot').values_list('slot', 'icd_code')),
+            [(1, "J06.9"), (3, "I10")]
+        )
+        self.j06.diagnosis_3 = None
+        self.j06.save(update_fields=['diagnosis_3'])
+        self.assertEqual(list(self.j06.diagnoses.values_list('icd_code', flat=True)), ["J06.9"])
+
+    def test_icd_filter(self):
+        self.assertEqual(self.numbers(icd='J00-J99'), ["T1", "T2"])
+        self.assertEqual(self.numbers(icd='J0'), ["T1"])
+        self.assertEqual(self.numbers(icd='J99,K'), ["T2", "T3"])
+        self.assertEqual(self.numbers(icd='I10', report_year='2024'), ["T1", "T2"])
+        self.assertEqual(self.client.get('/api/tickets/', {'icd': 'J99-J00'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/tickets/', {'icd': '06'}).status_code, 400)
+
+    def test_loader_replaces_codes(self):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w', encoding='utf-8-sig') as output:
+            output.write("\n".join([
+                CSV_HEADER,
+                "T1;ОМС;3;1;2024;1;;12345678901;2024-01-02;2024-01-03;1;1;0;E11.9;J45;300;0;D001;2024-01-15;2024-01-15",
+            ]))
+        self.addCleanup(os.remove, path)
+        TicketLoader().load(iter_csv_rows(path))
+        self.assertEqual(
+            list(self.j06.diagnoses.order_by('slot').values_list('icd_code', flat=True)), ["E11.9", "J45"]
+        )
@@ -30,55 +30,81 @@ def get_active_templates():
         return []
 
 
-def get_all_reports():
+def get_reports(template_id):
     """
-    Получаем список ВСЕХ созданных отчетов:
-    /api/reports/
-    Возвращает список с полями: id, template, date, ...
+    Получаем отчеты выбранного шаблона (новые первыми):
+    /api/reports/?template=<id>&fields=id,template,date,status
+    Список отдаётся страницами, следующая страница — по ссылке next.
+    Возвращает список с полями: id, template, date, status.
     """
+    params = {"template": template_id, "fields": "id,template,date,status", "page_size": 500}
+    reports = []
+    url = API_REPORTS_BASE
     try:
-        r = requests.get(API_REPORTS_BASE)
-        if r.status_code == 200:
-            return r.json()
-        else:
-            print("Ошибка при запросе отчетов:", r.status_code)
-            return []
+        while url:
+            r = requests.get(url, params=params)
+            if r.status_code != 200:
+                print("Ошибка при запросе отчетов:", r.status_code)
+                return reports
+            page = r.json()
+            reports.extend(page["results"])
+            # Ссылка next уже содержит все параметры запроса
+            url, params = page.get("next"), None
+        return reports
     except Exception as e:
         print("Исключение при запросе отчетов:", e)
-        return []
+        return reports
+
+
+# Локальный кэш раскладок шаблонов: template_id -> (etag, data)
+TEMPLATE_LAYOUT_CACHE = {}
 
 
-def get_template_detail(template_id):
+def get_template_layout(template_id):
     """
-    Получаем структуру конкретного шаблона:
-    /api/report_templates/{template_id}/
-    Возвращает объект с полями: id, title, tables, rows, columns, ...
+    Получаем раскладку таблиц шаблона:
+    /api/report_templates/{template_id}/layout/
+    Для каждой таблицы сервер отдаёт готовые строки шапки и ячейки боковика
+    с colspan/rowspan, а также порядок столбцов.
+    Повторные запросы отправляются с If-None-Match; при ответе 304
+    используется ранее полученная раскладка.
     """
-    url = f"{API_TEMPLATES_BASE}{template_id}/"
+    url = f"{API_TEMPLATES_BASE}{template_id}/layout/"
+    headers = {}
+    cached = TEMPLATE_LAYOUT_CACHE.get(template_id)
+    if cached:
+        headers["If-None-Match"] = cached[0]
     try:
-        r = requests.get(url)
+        r = requests.get(url, headers=headers)
+        if r.status_code == 304 and cached:
+            return cached[1]
         if r.status_code == 200:
-            return r.json()
+            data = r.json()
+            etag = r.headers.get("ETag")
+            if etag:
+                TEMPLATE_LAYOUT_CACHE[template_id] = (etag, data)
+            return data
         else:
-            print("Ошибка при запросе шаблона:", r.status_code)
+            print("Ошибка при запросе раскладки шаблона:", r.status_code)
             return {}
     except Exception as e:
-        print("Исключение при запросе шаблона:", e)
+        print("Исключение при запросе раскладки шаблона:", e)
         return {}
 
 
-def get_report_data(report_id):
+def get_report_matrix(report_id):
     """
-    Получаем данные (ReportData) для конкретного отчета:
-    /api/reports/{report_id}/data/
-    Возвращает список, где каждый элемент содержит:
-      id, report, row, column, value
+    Получаем данные отчета в виде матриц по таблицам:
+    /api/reports/{report_id}/matrix/?versions=true
+    Возвращает список таблиц, где каждый элемент содержит:
+      id, title, rows (id строк), columns (id столбцов),
+      values и versions (двумерные массивы значений и версий ячеек)
     """
-    url = f"{API_REPORTS_BASE}{report_id}/data/"
+    url = f"{API_REPORTS_BASE}{report_id}/matrix/"
     try:
-        r = requests.get(url)
+        r = requests.get(url, params={"versions": "true"})
         if r.status_code == 200:
-            return r.json()
+            return r.json().get("tables", [])
         else:
             print("Ошибка при запросе данных отчета:", r.status_code)
             return []
@@ -145,9 +171,9 @@ app = dash.Dash(
 )
 app.title = "Просмотр/заполнение отчётов"
 
-# Получаем начальные списки (активные шаблоны и все отчеты)
+# Получаем начальный список активных шаблонов; отчеты загружаются
+# при выборе шаблона
 TEMPLATES = get_active_templates()  # [{'id':..., 'title':..., 'is_active':...}, ...]
-REPORTS = get_all_reports()  # [{'id':..., 'template':..., 'date':...}, ...]
 
 # Формируем опции для первого dropdown (выбор шаблона)
 template_options = [
@@ -234,20 +260,30 @@ app.layout = dbc.Container([
     dcc.Store(id="reset-flag", storage_type="memory"),
     dcc.Store(id='templates-store', storage_type='memory'),
     dcc.Store(id='reports-store', storage_type='memory'),
-    dcc.Store(id="changes-store", storage_type="memory")
+    dcc.Store(id="changes-store", storage_type="memory"),
+    # Версии ячеек на момент загрузки отчёта: "row-col" -> version
+    dcc.Store(id="versions-store", storage_type="memory")
 ])
 
 
 # Callback для первоначального заполнения данных при загрузке страницы
 @app.callback(
-    [Output('templates-store', 'data'),
-     Output('reports-store', 'data')],
+    Output('templates-store', 'data'),
     Input('template-dropdown', 'options')  # Любое "фиктивное" Input, чтобы запустить при загрузке
 )
 def load_initial_data(_):
-    templates = get_active_templates()
-    reports = get_all_reports()
-    return templates, reports
+    return get_active_templates()
+
+
+# Callback: загружаем с сервера только отчеты выбранного шаблона
+@app.callback(
+    Output('reports-store', 'data'),
+    Input('template-dropdown', 'value')
+)
+def load_template_reports(selected_template):
+    if not selected_template:
+        return []
+    return get_reports(selected_template)
 
 
 # 1) Callback: обновляем список "сохранённых отчётов" при выборе шаблона
@@ -319,26 +355,25 @@ def update_status_toggle(report_id, reports_data):
 def update_report_dropdown(selected_template, reports_data):
     if not selected_template or not reports_data:
         return []
-    filtered_reports = [r for r in reports_data if r["template"] == selected_template]
-    # Сортируем по id (предполагается, что более высокий id — более новый отчет)
-    filtered_reports.sort(key=lambda r: r["id"], reverse=True)
+    # Сервер уже отфильтровал отчеты по шаблону и отсортировал их по дате (новые первыми)
     return [
         {"label": f"Отчёт {rep['id']} от {rep.get('date', '')} ({status_map.get(rep.get('status', 'draft'), 'Черновик')})",
          "value": rep["id"]}
-        for rep in filtered_reports
+        for rep in reports_data
     ]
 
 
 # 2) Callback: при выборе отчёта строим таблицу, объединив структуру шаблона и данные отчёта
 @app.callback(
-    Output("table-container", "children"),
+    [Output("table-container", "children"),
+     Output("versions-store", "data")],
     [Input("report-dropdown", "value"),
      Input("reports-store", "data")],
     State("template-dropdown", "value")
 )
 def build_report_tables(selected_report_id, reports_data, selected_template_id):
     if not selected_report_id or not selected_template_id:
-        return "Сначала выберите шаблон и отчёт."
+        return "Сначала выберите шаблон и отчёт.", {}
 
     # Определяем текущий статус выбранного отчёта из reports-store
     current_status = "draft"
@@ -350,39 +385,44 @@ def build_report_tables(selected_report_id, reports_data, selected_template_id):
     # Если статус не "draft", редактирование ячеек запрещено
     input_disabled = (current_status != "draft")
 
-    # Получаем структуру шаблона
-    template_detail = get_template_detail(selected_template_id)
-    tables = template_detail.get("tables", [])
+    # Получаем раскладку таблиц шаблона
+    tables = get_template_layout(selected_template_id).get("tables", [])
     if not tables:
-        return "В шаблоне нет таблиц."
+        return "В шаблоне нет таблиц.", {}
 
-    # Получаем данные отчёта
-    data_list = get_report_data(selected_report_id)
+    # Получаем данные отчёта и версии ячеек
     data_map = {}
-    for d in data_list:
-        row_id = d["row"]
-        col_id = d["column"]
-        val = d.get("value", "")
-        data_map[(row_id, col_id)] = val
+    versions = {}
+    for matrix in get_report_matrix(selected_report_id):
+        for row_id, row_values, row_versions in zip(matrix["rows"], matrix["values"], matrix["versions"]):
+            for col_id, val, version in zip(matrix["columns"], row_values, row_versions):
+                data_map[(row_id, col_id)] = val
+                versions[f"{row_id}-{col_id}"] = version
 
     # Строим HTML-таблицы
     all_tables_html = []
     for tbl in tables:
         tbl_title = tbl.get("title", "Без названия")
-        rows = tbl.get("rows", [])
         columns = tbl.get("columns", [])
 
-        header = html.Thead(html.Tr(
-            [html.Th("Строка")] + [html.Th(col["title"]) for col in columns]
-        ))
+        # Многоуровневая шапка: группы столбцов растянуты на свои столбцы
+        header = html.Thead([
+            html.Tr([
+                html.Th(cell["title"], colSpan=cell["colspan"], rowSpan=cell["rowspan"])
+                for cell in line
+            ])
+            for line in tbl.get("header", [])
+        ])
 
         body_rows = []
-        for row_obj in rows:
+        for row_obj in tbl.get("rows", []):
             row_id = row_obj["id"]
-            row_title = row_obj["title"]
-            row_cells = [html.Td(row_title)]
-            for col_obj in columns:
-                col_id = col_obj["id"]
+            # Ячейки боковика: группы строк, которые начинаются в этой строке, и название строки
+            row_cells = [
+                html.Td(cell["title"], colSpan=cell["colspan"], rowSpan=cell["rowspan"])
+                for cell in row_obj["stub"]
+            ]
+            for col_id in columns:
                 cell_value = data_map.get((row_id, col_id), "")
                 input_id = {"type": "cell-input", "index": f"{row_id}-{col_id}"}
                 row_cells.append(
@@ -411,7 +451,7 @@ def build_report_tables(selected_report_id, reports_data, selected_template_id):
             ])
         )
 
-    return all_tables_html
+    return all_tables_html, versions
 
 
 @app.callback(
@@ -436,9 +476,10 @@ def create_report(n_clicks, selected_template, new_report_date, current_reports)
     new_report = {
         "id": new_report_id,
         "template": selected_template,
-        "date": new_report_date
+        "date": new_report_date,
+        "status": "draft"
     }
-    updated_reports = current_reports + [new_report] if current_reports else [new_report]
+    updated_reports = [new_report] + current_reports if current_reports else [new_report]
     return updated_reports, new_report_id, "Отчет успешно создан!", True
 
 
@@ -478,12 +519,15 @@ def enable_reset_interval(reset_flag):
     [Input("save-button", "n_clicks"),
      Input("reset-interval", "n_intervals")],
     [State("changes-store", "data"),
+     State("versions-store", "data"),
      State("report-dropdown", "value"),
      State("report-status-toggle", "value"),
      State("reports-store", "data"),
-     State("reset-flag", "data")]
+     State("reset-flag", "data"),
+     State("template-dropdown", "value")]
 )
-def save_and_reset(n_clicks, n_intervals, changes, report_id, new_status, reports_store, reset_flag):
+def save_and_reset(n_clicks, n_intervals, changes, versions, report_id, new_status, reports_store, reset_flag,
+                   selected_template):
     ctx = dash.callback_context
     if not ctx.triggered:
         return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
@@ -495,17 +539,31 @@ def save_and_reset(n_clicks, n_intervals, changes, report_id, new_status, report
         if not report_id:
             return "Сохранить изменения", dash.no_update, dash.no_update, dash.no_update, dash.no_update
 
-        # Обновляем данные ячеек
-        for key, new_value in changes.items():
-            row_id, col_id = map(int, key.split("-"))
-            url = f"{API_REPORTS_BASE}{report_id}/data/{row_id}/{col_id}/"
-            payload = {"value": new_value}
+        # Обновляем данные ячеек одним пакетным запросом.
+        # Версии ячеек передаются для защиты от перезаписи чужих изменений
+        if changes:
+            url = f"{API_REPORTS_BASE}{report_id}/data/batch/"
+            versions = versions or {}
+            payload = []
+            for key, new_value in changes.items():
+                row_id, col_id = map(int, key.split("-"))
+                payload.append({
+                    "row": row_id,
+                    "column": col_id,
+                    "value": new_value,
+                    "version": versions.get(key)
+                })
             try:
-                r = requests.patch(url, json=payload)
+                r = requests.post(url, json=payload)
+                if r.status_code == 409:
+                    print("Конфликт версий:", r.text)
+                    return ("Сохранить изменения",
+                            "Данные изменены другим пользователем. Выберите отчёт заново и повторите ввод.",
+                            dash.no_update, dash.no_update, dash.no_update)
                 if r.status_code != 200:
-                    print(f"Ошибка при обновлении данных ({row_id}, {col_id}):", r.status_code, r.text)
+                    print("Ошибка при обновлении данных:", r.status_code, r.text)
             except Exception as e:
-                print(f"Исключение при обновлении данных ({row_id}, {col_id}):", e)
+                print("Исключение при обновлении данных:", e)
 
         # Определяем текущий статус отчёта из reports_store
         current_status = None
@@ -528,7 +586,7 @@ def save_and_reset(n_clicks, n_intervals, changes, report_id, new_status, report
                 print("Исключение при обновлении статуса:", e)
 
         # Обновляем список отчетов после сохранения
-        updated_reports = get_all_reports()
+        updated_reports = get_reports(selected_template) if selected_template else dash.no_update
         # Устанавливаем временное сообщение и сигнал для сброса (reset_flag = True)
         return "Изменения сохранены!", "", True, 0, updated_reports
 